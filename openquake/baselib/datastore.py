@@ -18,11 +18,16 @@
 
 import os
 import re
+import sys
+import queue
 import getpass
+import logging
+import threading
 import collections
 import h5py
 
 from openquake.baselib import hdf5, config
+from openquake.baselib.performance import Monitor
 
 
 def get_datadir():
@@ -128,6 +133,93 @@ def read(calc_id, mode='r', datadir=None):
     return dstore
 
 
+class AsyncWriter(object):
+    """
+    A thread performing in order the writes submitted to it, so that
+    the submitter can keep working while the I/O happens. When there are
+    `maxsize` writes pending the submitter is blocked (back-pressure).
+    The time spent blocked and writing is recorded in the monitor.
+
+    >>> writer = AsyncWriter(maxsize=2)
+    >>> out = []
+    >>> for i in range(5):
+    ...     writer.submit(out.append, i)
+    >>> writer.stop()
+    >>> out
+    [0, 1, 2, 3, 4]
+
+    :param maxsize: the maximum number of pending writes
+    :param monitor: a Monitor instance
+    """
+    def __init__(self, maxsize=100, monitor=Monitor()):
+        self.queue = queue.Queue(maxsize)
+        self.wait_mon = monitor('waiting for the datastore writer')
+        self.write_mon = monitor('writing asynchronously')
+        self.max_pending = 0
+        self.exc_info = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:  # stop
+                    break
+                func, args = item
+                if self.exc_info is None:  # skip the writes after an error
+                    with self.write_mon:
+                        func(*args)
+            except Exception:
+                self.exc_info = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+    def _check(self):
+        # raise in the submitter the error happened in the thread, if any
+        if self.exc_info:
+            etype, exc, tb = self.exc_info
+            self.exc_info = None
+            raise exc.with_traceback(tb)
+
+    @property
+    def in_writer(self):
+        """True if called from the writer thread"""
+        return threading.current_thread() is self.thread
+
+    def submit(self, func, *args):
+        """
+        Submit the call `func(*args)`, blocking if the queue is full
+        """
+        self._check()
+        if self.queue.full():
+            with self.wait_mon:
+                self.queue.put((func, args))
+        else:
+            self.queue.put((func, args))
+        self.max_pending = max(self.max_pending, self.queue.qsize())
+
+    def drain(self):
+        """
+        Wait for the pending writes to be performed
+        """
+        if not self.in_writer:
+            self.queue.join()
+            self._check()
+
+    def stop(self):
+        """
+        Perform the pending writes and stop the thread
+        """
+        self.queue.put(None)
+        self.thread.join()
+        logging.debug('%d asynchronous writes in %.1fs, blocked for %.1fs, '
+                      'max %d pending', self.write_mon.counts,
+                      self.write_mon.duration, self.wait_mon.duration,
+                      self.max_pending)
+        self._check()
+
+
 class DataStore(collections.MutableMapping):
     """
     DataStore class to store the inputs/outputs of a calculation on the
@@ -149,7 +241,14 @@ class DataStore(collections.MutableMapping):
     an array and a dictionary, and a method `__fromh5__` taking an array
     and a dictionary and populating the object.
     For an example of use see :class:`openquake.hazardlib.site.SiteCollection`.
+
+    After `.start_writer()` the methods `.extend` and `.__setitem__` return
+    immediately and the writes are performed by an :class:`AsyncWriter`
+    thread; accessing the underlying `.hdf5` file waits for the pending
+    writes, so the reads always see the written data.
     """
+    writer = None
+
     def __init__(self, calc_id=None, datadir=None, params=(), mode=None):
         datadir = datadir or get_datadir()
         calc_id, datadir = extract_calc_id_datadir(calc_id, datadir)
@@ -172,9 +271,50 @@ class DataStore(collections.MutableMapping):
         self.mode = mode or ('r+' if os.path.exists(self.hdf5path) else 'w')
         if self.mode == 'r' and not os.path.exists(self.hdf5path):
             raise IOError('File not found: %s' % self.hdf5path)
-        self.hdf5 = ()  # so that `key in self.hdf5` is valid
+        self._hdf5 = ()  # so that `key in self.hdf5` is valid
         self.open(self.mode)
 
+    @property
+    def hdf5(self):
+        """
+        The underlying hdf5.File, available after the pending writes
+        """
+        if self.writer:
+            self.writer.drain()
+        return self._hdf5
+
+    @hdf5.setter
+    def hdf5(self, value):
+        self._hdf5 = value
+
+    def start_writer(self, maxsize=100, monitor=Monitor()):
+        """
+        Perform the writes of `.extend` and `.__setitem__` asynchronously,
+        until `.stop_writer()` or `.close()` are called.
+
+        :param maxsize: the maximum number of pending writes
+        :param monitor: a Monitor used to record the back-pressure
+        """
+        if self.writer is None:
+            self.writer = AsyncWriter(maxsize, monitor)
+
+    def stop_writer(self):
+        """
+        Perform the pending writes and go back to synchronous writes
+        """
+        if self.writer:
+            writer, self.writer = self.writer, None
+            writer.stop()
+
+    def submit(self, func, *args):
+        """
+        Call `func(*args)` in the writer thread, if started, or immediately
+        """
+        if self.writer and not self.writer.in_writer:
+            self.writer.submit(func, *args)
+        else:
+            func(*args)
+
     def open(self, mode):
         """
         Open the underlying .hdf5 file and the parent, if any
@@ -280,7 +420,14 @@ class DataStore(collections.MutableMapping):
         :param key: name of the dataset
         :param array: array to store
         :param attrs: a dictionary of attributes
+        :returns: the dataset, or None if the write is asynchronous
         """
+        if self.writer and not self.writer.in_writer:
+            self.writer.submit(self._extend, key, array, attrs)
+        else:
+            return self._extend(key, array, attrs)
+
+    def _extend(self, key, array, attrs):
         try:
             dset = self.hdf5[key]
         except KeyError:
@@ -336,7 +483,7 @@ class DataStore(collections.MutableMapping):
         return self.export_path(fname, export_dir)
 
     def flush(self):
-        """Flush the underlying hdf5 file"""
+        """Flush the underlying hdf5 file, after the pending writes"""
         if self.parent != ():
             self.parent.flush()
         if self.hdf5:  # is open
@@ -344,6 +491,7 @@ class DataStore(collections.MutableMapping):
 
     def close(self):
         """Close the underlying hdf5 file"""
+        self.stop_writer()
         if self.parent != ():
             self.parent.flush()
             self.parent.close()
@@ -394,6 +542,9 @@ class DataStore(collections.MutableMapping):
         return val
 
     def __setitem__(self, key, val):
+        self.submit(self._setitem, key, val)
+
+    def _setitem(self, key, val):
         if key in self.hdf5:
             # there is a bug in the current version of HDF5 for composite
             # arrays: is impossible to save twice the same key; so we remove
@@ -424,7 +575,7 @@ class DataStore(collections.MutableMapping):
         return dict(mode='r',
                     parent=self.parent,
                     calc_id=self.calc_id,
-                    hdf5=(),
+                    _hdf5=(),
                     hdf5path=self.hdf5path)
 
     def __iter__(self):
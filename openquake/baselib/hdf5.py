@@ -21,6 +21,7 @@ import sys
 import ast
 import logging
 import operator
+import fnmatch
 import tempfile
 import importlib
 import itertools
@@ -28,6 +29,7 @@ from urllib.parse import quote_plus, unquote_plus
 import collections
 import numpy
 import h5py
+from openquake.baselib import config
 from openquake.baselib.python3compat import decode
 
 vbytes = h5py.special_dtype(vlen=bytes)
@@ -37,6 +39,149 @@ vfloat32 = h5py.special_dtype(vlen=numpy.float32)
 vfloat64 = h5py.special_dtype(vlen=numpy.float64)
 
 
+# access pattern -> axis along which the dataset is read slice by slice
+ACCESS_AXIS = dict(by_site=0, by_asset=0, by_event=0, by_rlz=1)
+
+
+class Layout(object):
+    """
+    Storage layout of a kind of dataset, determined by the way the dataset
+    is read back. The chunks contain whole slices along the access axis,
+    so that reading a site (or an asset, or an event, or a realization)
+    touches as few chunks as possible.
+
+    >>> Layout('by_site', chunk_kb=64).get_chunks((1000, 20, 4), 8)
+    (102, 20, 4)
+    >>> Layout('by_rlz', chunk_kb=64).get_chunks((1000, 5, 4), 4)
+    (1000, 4, 4)
+    >>> Layout('by_event', chunk_kb=64).get_chunks((None,), 20)
+    (3276,)
+
+    :param access: 'by_site', 'by_asset', 'by_event' or 'by_rlz'
+    :param compression: None, 'gzip' or 'lzf'
+    :param shuffle: if True, apply the shuffle filter before compressing
+    :param chunk_kb: target size of the chunks in kilobytes
+    """
+    def __init__(self, access, compression=None, shuffle=False,
+                 chunk_kb=None):
+        if access not in ACCESS_AXIS:
+            raise ValueError('Unknown access pattern %r' % access)
+        self.access = access
+        self.compression = compression
+        self.shuffle = shuffle
+        self.chunk_kb = chunk_kb
+
+    @property
+    def axis(self):
+        return ACCESS_AXIS[self.access]
+
+    def get_chunks(self, shape, itemsize):
+        """
+        :param shape: shape of the dataset, with None for extendable axes
+        :param itemsize: size in bytes of a dataset element
+        :returns: a chunk shape or None if the dataset cannot be chunked
+        """
+        if not shape or 0 in shape:
+            return None
+        axis = self.axis if self.axis < len(shape) else 0
+        target = max(int(self.chunk_kb or config.hdf5.chunk_kb) * 1024 //
+                     itemsize, 1)  # number of elements per chunk
+        chunks = [1 if n is None else n for n in shape]
+        chunks[axis] = 1
+        others = [i for i in range(len(shape)) if i != axis]
+        while numpy.prod(chunks) > target and any(
+                chunks[i] > 1 for i in others):
+            i = max(others, key=lambda i: chunks[i])
+            chunks[i] = (chunks[i] + 1) // 2
+        nslices = max(target // int(numpy.prod(chunks)), 1)
+        if shape[axis] is not None:
+            nslices = min(nslices, shape[axis])
+        chunks[axis] = nslices
+        return tuple(chunks)
+
+    def get_kwargs(self, shape, dtype, compression=None):
+        """
+        :param shape: shape of the dataset, with None for extendable axes
+        :param dtype: dtype of the dataset
+        :param compression: if given, overrides the compression of the layout
+        :returns: a dictionary of keyword arguments for .create_dataset
+        """
+        dtype = numpy.dtype(dtype)
+        chunks = self.get_chunks(shape, dtype.itemsize)
+        if chunks is None:
+            return dict(compression=compression)
+        kw = dict(chunks=chunks, compression=compression or self.compression)
+        if dtype.hasobject:  # the filters would not compress the vlen data
+            kw['compression'] = compression
+        elif kw['compression'] and self.shuffle:
+            kw['shuffle'] = True
+        return kw
+
+    def __repr__(self):
+        opts = [self.access, self.compression, self.shuffle and 'shuffle']
+        return '<%s %s>' % (self.__class__.__name__,
+                            ' '.join(opt for opt in opts if opt))
+
+
+# layouts of the datasets which are large in big calculations
+LAYOUTS = [
+    ('gmf_data/data', Layout('by_site')),  # read via gmf_data/indices
+    ('events', Layout('by_event')),
+    ('poes/*/array', Layout('by_site')),
+    ('hcurves/*', Layout('by_site')),
+    ('avg_losses-rlzs', Layout('by_asset')),
+    ('curves-rlzs', Layout('by_asset')),
+    ('curves-stats', Layout('by_asset')),
+    ('loss_maps-rlzs', Layout('by_asset')),
+    ('loss_maps-stats', Layout('by_asset')),
+    ('losses_by_event', Layout('by_event')),
+    ('ruptures', Layout('by_event')),
+    ('rupgeoms', Layout('by_event', 'lzf', shuffle=True)),  # read in bulk
+]
+
+
+def parse_layouts(string):
+    """
+    Parse a string of layouts in the format used in openquake.cfg,
+    i.e. comma-separated items "<key pattern>: <access> [<filters>]":
+
+    >>> parse_layouts('gmf_data/data: by_site lzf shuffle, hcurves/*: by_rlz')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [('gmf_data/data', <Layout by_site lzf shuffle>),
+     ('hcurves/*', <Layout by_rlz>)]
+    """
+    layouts = []
+    for item in string.split(','):
+        if not item.strip():
+            continue
+        pattern, spec = item.split(':')
+        access, *filters = spec.split()
+        compression = None
+        for filt in filters:
+            if filt in ('gzip', 'lzf'):
+                compression = filt
+            elif filt != 'shuffle':
+                raise ValueError('Unknown filter %r in %r' % (filt, item))
+        layouts.append((pattern.strip(), Layout(
+            access, compression, 'shuffle' in filters)))
+    return layouts
+
+
+def get_layout(key):
+    """
+    :param key: the name of a dataset
+    :returns: the Layout associated to the key or None
+
+    The layouts in the section [hdf5] of openquake.cfg have the precedence
+    over the builtin ones.
+    """
+    key = key.lstrip('/')
+    layouts = parse_layouts(config.hdf5.layouts) + LAYOUTS
+    for pattern, layout in layouts:
+        if fnmatch.fnmatchcase(key, pattern):
+            return layout
+
+
 def create(hdf5, name, dtype, shape=(None,), compression=None,
            fillvalue=0, attrs=None):
     """
@@ -47,14 +192,22 @@ def create(hdf5, name, dtype, shape=(None,), compression=None,
     :param compression: None or 'gzip' are recommended
     :param attrs: dictionary of attributes of the dataset
     :returns: a HDF5 dataset
+
+    The chunks and the filters are chosen by the layout associated to the
+    name, if any; an explicit compression overrides the one of the layout.
     """
+    layout = get_layout(name)
+    if layout:
+        kw = layout.get_kwargs(shape, dtype, compression)
+    else:
+        kw = dict(compression=compression)
     if shape[0] is None:  # extendable dataset
+        kw.setdefault('chunks', True)
         dset = hdf5.create_dataset(
-            name, (0,) + shape[1:], dtype, chunks=True, maxshape=shape,
-            compression=compression)
+            name, (0,) + shape[1:], dtype, maxshape=shape, **kw)
     else:  # fixed-shape dataset
         dset = hdf5.create_dataset(name, shape, dtype, fillvalue=fillvalue,
-                                   compression=compression)
+                                   **kw)
     if attrs:
         for k, v in attrs.items():
             dset.attrs[k] = v
@@ -324,7 +477,13 @@ class File(h5py.File):
         elif isinstance(obj, list) and isinstance(obj[0], numpy.ndarray):
             self.save_vlen(path, obj)
         else:
-            super().__setitem__(path, obj)
+            layout = (get_layout(path) if isinstance(obj, numpy.ndarray)
+                      else None)
+            if layout:
+                kw = layout.get_kwargs(obj.shape, obj.dtype)
+                self.create_dataset(path, data=obj, **kw)
+            else:
+                super().__setitem__(path, obj)
         if pyclass:
             self.flush()  # make sure it is fully saved
             self.save_attrs(path, attrs, __pyclass__=pyclass)
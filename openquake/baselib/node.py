@@ -144,6 +144,7 @@ import io
 import sys
 import copy
 import types
+import collections
 import warnings
 import pprint as pp
 import configparser
@@ -771,7 +772,8 @@ def context(fname, node):
 class ValidatingXmlParser(object):
     """
     Validating XML Parser based on Expat. It has two methods `.parse_file`
-    and `.parse_bytes` returning a validated :class:`Node` object.
+    and `.parse_bytes` returning a validated :class:`Node` object and a
+    method `.iterparse` yielding validated nodes while reading the file.
 
     :param validators: a dictionary of validation functions
     :param stop: the tag where to stop the parsing (if any)
@@ -782,6 +784,7 @@ class ValidatingXmlParser(object):
     def __init__(self, validators, stop=None):
         self.validators = validators
         self.stop = stop
+        self.release = ()  # tags of the nodes yielded by .iterparse
 
     @contextmanager
     def _context(self):
@@ -835,6 +838,33 @@ class ValidatingXmlParser(object):
                     self.p.ParseFile(f)
         return self._root
 
+    def iterparse(self, fname, release, bufsize=1024 ** 2):
+        """
+        Parse a file in chunks of `bufsize` bytes and yield the validated
+        nodes with a tag in `release` as soon as they are closed. Such nodes
+        are not attached to their parent, so that the memory occupation is
+        given by the largest yielded node and not by the size of the file.
+
+        :param fname: the name of an XML file
+        :param release: a set of tags without namespace
+        :param bufsize: the number of bytes read at each step
+        """
+        self.release = release
+        self._released = collections.deque()
+        try:
+            with self._context():
+                self.filename = fname
+                with open(fname, 'rb') as f:
+                    for chunk in iter(lambda: f.read(bufsize), b''):
+                        self.p.Parse(chunk, False)
+                        while self._released:
+                            yield self._released.popleft()
+                    self.p.Parse(b'', True)
+            while self._released:
+                yield self._released.popleft()
+        finally:
+            self.release = ()
+
     def _start_element(self, longname, attrs):
         try:
             xmlns, name = longname.split('}')
@@ -854,7 +884,9 @@ class ValidatingXmlParser(object):
         with context(self.filename, node):
             self._root = self._literalnode(node)
         del self._ancestors[-1]
-        if self._ancestors:
+        if self.release and striptag(node.tag) in self.release:
+            self._released.append(node)
+        elif self._ancestors:
             self._ancestors[-1].append(self._root)
 
     def _char_data(self, data):
@@ -150,8 +150,10 @@ import time
 import socket
 import signal
 import pickle
+import queue
 import inspect
 import logging
+import tempfile
 import operator
 import functools
 import itertools
@@ -171,7 +173,7 @@ from openquake.baselib.zeromq import zmq, Socket
 from openquake.baselib.performance import Monitor, memory_rss, perf_dt
 
 from openquake.baselib.general import (
-    split_in_blocks, block_splitter, AccumDict, humansize)
+    split_in_blocks, block_splitter, AccumDict, humansize, WeightedSequence)
 
 cpu_count = multiprocessing.cpu_count()
 GB = 1024 ** 3
@@ -187,7 +189,10 @@ if OQ_DISTRIBUTE not in ('no', 'processpool', 'threadpool', 'celery', 'zmq',
 task_data_dt = numpy.dtype(
     [('taskno', numpy.uint32), ('weight', numpy.float32),
      ('duration', numpy.float32), ('received', numpy.int64),
-     ('mem_gb', numpy.float32)])
+     ('mem_gb', numpy.float32), ('parent', numpy.uint32)])
+
+# number of blocks in which a task is split when running with a maxtime
+NUM_BLOCKS = 4
 
 
 def oq_distribute(task=None):
@@ -301,6 +306,119 @@ def pickle_sequence(objects):
     return out
 
 
+class SharedArray(object):
+    """
+    A reference to a numpy array saved in a .npy file inside a directory
+    visible to the workers (typically /dev/shm). It is pickled by filename
+    and unpickled as a read-only memory-mapped array, so that the
+    workers can attach the data without copying it.
+
+    :param fname: path to the .npy file
+    :param shape: shape of the underlying array
+    :param dtype: dtype of the underlying array
+    """
+    def __init__(self, fname, shape, dtype):
+        self.fname = fname
+        self.shape = shape
+        self.dtype = dtype
+
+    def __reduce__(self):
+        return attach_shared, (self.fname,)
+
+    def __repr__(self):
+        return '<%s %s%s>' % (self.__class__.__name__, self.fname, self.shape)
+
+
+def attach_shared(fname):
+    """
+    :param fname: path to a .npy file
+    :returns: a read-only array sharing the memory with the file
+    """
+    return numpy.load(fname, mmap_mode='r').view(numpy.ndarray)
+
+
+class SharedArrays(object):
+    """
+    Publish numpy arrays as .npy files in the given directory.
+    The arrays are memoized by identity, so an array referenced by many
+    tasks is saved only once. The files are removed by `.cleanup()`.
+
+    :param dirname: directory visible to the workers
+    :param min_nbytes: arrays smaller than this are not published
+    """
+    current = None  # instance used by `share` while pickling the arguments
+
+    def __init__(self, dirname, min_nbytes=1024 ** 2):
+        self.dirname = dirname
+        self.min_nbytes = min_nbytes
+        self.published = {}  # id(array) -> (array, SharedArray or array)
+
+    def publish(self, array):
+        """
+        :param array: a numpy array
+        :returns: a SharedArray or the array itself, if it cannot be shared
+        """
+        try:
+            return self.published[id(array)][1]
+        except KeyError:
+            pass
+        if array.nbytes < self.min_nbytes or array.dtype.hasobject:
+            shared = array
+        else:
+            fd, fname = tempfile.mkstemp('.npy', 'oq-shared-', self.dirname)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    numpy.save(f, array)
+            except OSError as exc:  # for instance /dev/shm is full
+                logging.debug('Could not share %s: %s', array.shape, exc)
+                os.remove(fname)
+                shared = array
+            else:
+                shared = SharedArray(fname, array.shape, array.dtype)
+        # keep a reference to the array, so that its id is not reused
+        self.published[id(array)] = array, shared
+        return shared
+
+    def cleanup(self):
+        """
+        Remove the published files
+        """
+        for _array, shared in self.published.values():
+            if isinstance(shared, SharedArray):
+                try:
+                    os.remove(shared.fname)
+                except FileNotFoundError:
+                    pass
+        self.published.clear()
+
+
+def share(array):
+    """
+    To be called in the `__getstate__` method of objects containing large
+    read-only arrays, like the SiteCollection. While the Starmap is pickling
+    the task arguments it returns a SharedArray, otherwise the array itself.
+
+    :param array: a numpy array
+    """
+    shared = SharedArrays.current
+    if shared is None:
+        return array
+    return shared.publish(array)
+
+
+def get_shared_dir(distribute):
+    """
+    :param distribute: the distribution mechanism
+    :returns: a directory for the shared arrays or None
+    """
+    if distribute == 'processpool':
+        shm = '/dev/shm'
+        return shm if os.path.isdir(shm) else tempfile.gettempdir()
+    elif distribute in ('celery', 'zmq'):
+        # the workers may be on other machines
+        return config.directory.shared_dir or None
+
+
 class Result(object):
     """
     :param val: value to return or exception instance
@@ -341,7 +459,8 @@ def safely_call(func, args):
     """
     with Monitor('total ' + func.__name__, measuremem=True) as child:
         if args and hasattr(args[0], 'unpickle'):
-            # args is a list of Pickled objects
+            # args is a list of Pickled objects; the SharedArrays
+            # inside them are attached here without copying the data
             args = [a.unpickle() for a in args]
         if args and isinstance(args[-1], Monitor):
             mon = args[-1]
@@ -350,7 +469,10 @@ def safely_call(func, args):
         else:  # in the DbServer
             mon = child
         try:
-            res = Result(func(*args), mon)
+            if getattr(mon, 'maxtime', None):
+                res = call_in_blocks(func, args, mon)
+            else:
+                res = Result(func(*args), mon)
         except Exception:
             _etype, exc, tb = sys.exc_info()
             res = Result(exc, mon, ''.join(traceback.format_tb(tb)))
@@ -372,6 +494,33 @@ def safely_call(func, args):
     return zsocket.num_sent
 
 
+def call_in_blocks(func, args, mon):
+    """
+    Split the first argument in blocks and call the function on each block,
+    stopping when more than `mon.maxtime` seconds have passed.
+
+    :param func: the function to call
+    :param args: the arguments, with a list of elements as first argument
+    :param mon: the task monitor, with an attribute .maxtime
+    :returns: a Result with a list of partial results and an attribute
+              .remaining with the blocks which were not processed
+    """
+    t0 = time.time()
+    if isinstance(args[0], (list, WeightedSequence)) and len(args[0]) > 1:
+        blocks = list(split_in_blocks(
+            args[0], NUM_BLOCKS, lambda el: getattr(el, 'weight', 1)))
+    else:  # cannot split
+        blocks = [args[0]]
+    vals = []
+    for i, block in enumerate(blocks, 1):
+        vals.append(func(block, *args[1:]))
+        if time.time() - t0 > mon.maxtime:
+            break
+    res = Result(vals, mon)
+    res.remaining = blocks[i:]
+    return res
+
+
 if OQ_DISTRIBUTE.startswith('celery'):
     from celery.result import ResultSet
     from celery import Celery
@@ -447,6 +596,8 @@ class IterResult(object):
                 self.received.append(len(result.pik))
             else:  # this should never happen
                 raise ValueError(result)
+            # tasks split by the dynamic scheduler
+            self.num_tasks += getattr(result, 'new_tasks', 0)
             if OQ_DISTRIBUTE == 'processpool':
                 mem_gb = memory_rss(os.getpid()) + sum(
                     memory_rss(pid) for pid in Starmap.pids) / GB
@@ -455,7 +606,10 @@ class IterResult(object):
             next(self.log_percent)
             if not self.name.startswith('_'):  # no info for private tasks
                 self.save_task_info(result.mon, mem_gb)
-            yield val
+            if hasattr(result, 'remaining'):  # list of partial results
+                yield from val
+            else:
+                yield val
 
         if self.received:
             tot = sum(self.received)
@@ -467,7 +621,8 @@ class IterResult(object):
         if self.hdf5:
             mon.hdf5 = self.hdf5
             duration = mon.children[0].duration  # the task is the first child
-            t = (mon.task_no, mon.weight, duration, self.received[-1], mem_gb)
+            t = (mon.task_no, mon.weight, duration, self.received[-1], mem_gb,
+                 getattr(mon, 'parent', 0))
             data = numpy.array([t], task_data_dt)
             hdf5.extend(self.hdf5['task_info/' + self.name], data,
                         argnames=self.argnames, sent=self.sent)
@@ -499,6 +654,17 @@ class IterResult(object):
         return res
 
 
+def zmq_num_cores():
+    """
+    :returns: the number of cores of the zmq workers, as in openquake.cfg
+    """
+    num_cores = 0
+    for host_cores in config.zworkers.host_cores.split(','):
+        _host, cores = host_cores.split()
+        num_cores += cpu_count if cores == '-1' else int(cores)
+    return num_cores
+
+
 def init_workers():
     """Waiting function, used to wake up the process pool"""
     setproctitle('oq-worker')
@@ -561,7 +727,7 @@ class Starmap(object):
     def apply(cls, task, args, concurrent_tasks=cpu_count * 3,
               maxweight=None, weight=lambda item: 1,
               key=lambda item: 'Unspecified', name=None,
-              distribute=None, progress=logging.info):
+              distribute=None, progress=logging.info, maxtime=None):
         """
         Apply a task to a tuple of the form (sequence, \*other_args)
         by first splitting the sequence in chunks, according to the weight
@@ -577,6 +743,7 @@ class Starmap(object):
         :param name: name of the task to be used in the log
         :param distribute: if not given, inferred from OQ_DISTRIBUTE
         :param progress: logging function to use (default logging.info)
+        :param maxtime: if not None, use the dynamic scheduler
         :returns: an :class:`IterResult` object
         """
         arg0 = args[0]  # this is assumed to be a sequence
@@ -586,9 +753,11 @@ class Starmap(object):
         else:
             chunks = split_in_blocks(arg0, concurrent_tasks or 1, weight, key)
         task_args = [(ch,) + args for ch in chunks]
-        return cls(task, task_args, name, distribute).submit_all(progress)
+        return cls(task, task_args, name, distribute,
+                   maxtime).submit_all(progress)
 
-    def __init__(self, task_func, task_args, name=None, distribute=None):
+    def __init__(self, task_func, task_args, name=None, distribute=None,
+                 maxtime=None):
         self.__class__.init(distribute=distribute or OQ_DISTRIBUTE)
         self.task_func = task_func
         self.name = name or task_func.__name__
@@ -604,6 +773,14 @@ class Starmap(object):
         self.receiver = 'tcp://%s:%s' % (
             config.dbserver.listen, config.dbserver.receiver_ports)
         self.sent = numpy.zeros(len(self.argnames))
+        self.shared = None  # SharedArrays instance, set by submit_all
+        # the dynamic scheduler is implemented only for some backends
+        self.maxtime = maxtime if self.distribute in (
+            'processpool', 'threadpool', 'zmq') else None
+        # task_no -> pickled arguments of the running tasks; they are
+        # kept only if there is a maxtime, to split the slow tasks
+        self.task_piks = {}
+        self.max_task_no = 0
 
     @property
     def num_tasks(self):
@@ -638,12 +815,74 @@ class Starmap(object):
             mon.task_no = task_no
             mon.weight = getattr(args[0], 'weight', 1.)
             mon.backurl = backurl
+            mon.parent = 0
+            mon.maxtime = self.maxtime if pickle else None
+            self.monitor = mon
             self.calc_id = getattr(mon, 'calc_id', None)
             if pickle:
-                args = pickle_sequence(args)
+                # large arrays are pickled by reference, if possible
+                SharedArrays.current = self.shared
+                try:
+                    args = pickle_sequence(args)
+                finally:
+                    SharedArrays.current = None
                 self.sent += numpy.array([len(p) for p in args])
+                if self.maxtime:
+                    self.task_piks[task_no] = args
+            self.max_task_no = task_no
             yield args
 
+    def _split_task(self, mon, blocks):
+        # build the pickled arguments of the tasks for the given blocks
+        piks = self.task_piks.pop(mon.task_no)
+        newargs = []
+        for block in blocks:
+            self.max_task_no += 1
+            task_no = self.max_task_no
+            newmon = self.monitor.new(
+                self.monitor.operation, task_no=task_no, parent=mon.task_no,
+                weight=getattr(block, 'weight', 1.))
+            args = [Pickled(block)] + piks[1:-1] + [Pickled(newmon)]
+            self.sent[0] += len(args[0])
+            self.task_piks[task_no] = args
+            newargs.append(args)
+        return newargs
+
+    def _iter_dynamic(self, allargs, submit, iresults, num_cores):
+        """
+        Submit the tasks on demand, so that at most 2 * num_cores tasks
+        are running or waiting in the workers. The blocks not processed
+        by the tasks that exceeded .maxtime are submitted again as new
+        tasks, before the tasks which are still to be submitted.
+
+        :param allargs: the pickled arguments of the tasks
+        :param submit: a function submitting a task
+        :param iresults: an iterator over the Result objects
+        :param num_cores: the number of cores available
+        """
+        todo = collections.deque(allargs)
+        yield len(todo)
+        running = 0
+        while todo and running < 2 * num_cores:
+            submit(todo.popleft())
+            running += 1
+        for res in iresults:
+            running -= 1
+            if getattr(res, 'remaining', None):
+                newargs = self._split_task(res.mon, res.remaining)
+                todo.extendleft(reversed(newargs))
+                res.new_tasks = len(newargs)
+                logging.debug('Task #%d exceeded %ss, splitting it in %d',
+                              res.mon.task_no, self.maxtime, len(newargs))
+            elif hasattr(res, 'mon'):  # the arguments are not needed anymore
+                self.task_piks.pop(res.mon.task_no, None)
+            while todo and running < 2 * num_cores:
+                submit(todo.popleft())
+                running += 1
+            yield res
+            if not running:
+                break
+
     def submit_all(self, progress=logging.info):
         """
         :returns: an IterResult object
@@ -651,11 +890,22 @@ class Starmap(object):
         if self.num_tasks == 1 or self.distribute == 'no':
             it = self._iter_sequential()
         else:
-            it = getattr(self, '_iter_' + self.distribute)()
+            shared_dir = get_shared_dir(self.distribute)
+            if shared_dir:
+                self.shared = SharedArrays(shared_dir)
+            it = self._cleanup(getattr(self, '_iter_' + self.distribute)())
         num_tasks = next(it)
         return IterResult(it, self.name, self.argnames, num_tasks,
                           self.sent, progress, self.hdf5)
 
+    def _cleanup(self, it):
+        # remove the shared arrays when all the results have been received
+        try:
+            yield from it
+        finally:
+            if self.shared:
+                self.shared.cleanup()
+
     def reduce(self, agg=operator.add, acc=None, progress=logging.info):
         """
         Submit all tasks and reduce the results
@@ -674,6 +924,15 @@ class Starmap(object):
     def _iter_processpool(self):
         safefunc = functools.partial(safely_call, self.task_func)
         allargs = list(self._genargs())
+        if self.maxtime:
+            results = queue.Queue()
+
+            def submit(args):
+                self.pool.apply_async(safefunc, (args,), callback=results.put,
+                                      error_callback=results.put)
+            yield from self._iter_dynamic(
+                allargs, submit, iter(results.get, None), self.pool._processes)
+            return
         yield len(allargs)
         for res in self.pool.imap_unordered(safefunc, allargs):
             yield res
@@ -715,6 +974,13 @@ class Starmap(object):
             task_in_url = 'tcp://%s:%s' % (config.dbserver.host,
                                            config.zworkers.task_in_port)
             with Socket(task_in_url, zmq.PUSH, 'connect') as sender:
+                if self.maxtime:
+                    yield from self._iter_dynamic(
+                        list(self._genargs(backurl)),
+                        lambda args: sender.send((self.task_func, args)),
+                        self.loop(itertools.repeat(None), iter(socket)),
+                        zmq_num_cores())
+                    return
                 num_results = 0
                 for args in self._genargs(backurl):
                     sender.send((self.task_func, args))
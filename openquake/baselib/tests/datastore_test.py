@@ -60,6 +60,23 @@ class DataStoreTestCase(unittest.TestCase):
         self.dstore['a/b'] = 42
         self.assertTrue('a/b' in self.dstore)
 
+    def test_writer(self):
+        self.dstore.start_writer(maxsize=2)
+        for i in range(10):
+            self.assertIsNone(
+                self.dstore.extend('dset', numpy.arange(i, i + 1)))
+        self.dstore['key'] = numpy.array([1, 2])
+        # reading waits for the pending writes
+        numpy.testing.assert_equal(self.dstore['dset'].value, range(10))
+        numpy.testing.assert_equal(self.dstore['key'].value, [1, 2])
+
+        # an error in the writer thread is raised by the next read
+        self.dstore.extend('dset', numpy.array(['a']))
+        with self.assertRaises(TypeError):
+            self.dstore.flush()
+        self.dstore.stop_writer()
+        self.assertIsNotNone(self.dstore.extend('dset', numpy.arange(1)))
+
     def test_export_path(self):
         path = self.dstore.export_path('hello.txt', tempfile.mkdtemp())
         mo = re.search('hello_\d+', path)
@@ -43,5 +43,19 @@ class Hdf5TestCase(unittest.TestCase):
         with hdf5.File(self.tmp, 'r') as f:
             print(f['dset'].value)
 
+    def test_layout(self):
+        # the chunks of poes/grp-XX/array contain whole sites
+        poes = numpy.random.random((100, 20, 3))
+        with hdf5.File(self.tmp, 'w') as f:
+            f['poes/grp-00'] = dict(array=poes, sids=numpy.arange(100))
+            f['other'] = poes
+            dset = hdf5.create(f, 'losses_by_event', numpy.float32,
+                               (None, 4), compression='gzip')
+            self.assertEqual(f['poes/grp-00/array'].chunks[1:], (20, 3))
+            self.assertIsNone(f['other'].chunks)
+            self.assertEqual(dset.chunks, (4096, 4))
+            self.assertEqual(dset.compression, 'gzip')
+            numpy.testing.assert_equal(f['poes/grp-00/array'][()], poes)
+
     def tearDown(self):
         os.remove(self.tmp)
@@ -18,6 +18,9 @@
 
 import os
 import mock
+import time
+import pickle
+import tempfile
 import unittest
 import numpy
 from openquake.baselib import parallel
@@ -32,6 +35,24 @@ def get_length(data, monitor):
     return {'n': len(data)}
 
 
+def sleep_and_count(elements, monitor):
+    time.sleep(.02 * len(elements))
+    return {'n': len(elements), 'tasks': [monitor.task_no]}
+
+
+class ArrayHolder(object):
+    def __init__(self, array):
+        self.array = array
+
+    def __getstate__(self):
+        return dict(array=parallel.share(self.array))
+
+
+def get_sum(holder, monitor):
+    return {'sum': holder.array.sum(),
+            'writeable': holder.array.flags.writeable}
+
+
 class StarmapTestCase(unittest.TestCase):
     monitor = parallel.Monitor()
 
@@ -75,11 +96,49 @@ class StarmapTestCase(unittest.TestCase):
             res[key] = val.reduce()
         self.assertEqual(res, {'a': {'n': 10}, 'c': {'n': 15}, 'b': {'n': 20}})
 
+    @unittest.skipUnless(parallel.oq_distribute() == 'processpool',
+                         'the arrays are shared only with a process pool')
+    def test_shared_array(self):
+        holder = ArrayHolder(numpy.arange(200000, dtype=float))  # 1.6 MB
+        smap = parallel.Starmap(get_sum, [(holder, self.monitor)] * 3)
+        for res in smap:
+            self.assertEqual(res['sum'], holder.array.sum())
+            self.assertFalse(res['writeable'])  # attached read-only
+        self.assertLess(smap.sent[0], 1000)  # pickled by reference
+        self.assertEqual(smap.shared.published, {})  # files removed
+        self.assertTrue(holder.array.flags.writeable)  # original untouched
+
+    @unittest.skipUnless(parallel.oq_distribute() == 'processpool',
+                         'the test requires a process pool')
+    def test_maxtime(self):
+        # the tasks exceeding the maxtime are split in more tasks
+        allargs = [(list(range(20)), self.monitor), ([0], self.monitor)]
+        smap = parallel.Starmap(sleep_and_count, allargs, maxtime=.05)
+        res = smap.reduce()
+        self.assertEqual(res['n'], 21)
+        self.assertGreater(len(set(res['tasks'])), 2)
+        self.assertEqual(smap.max_task_no, len(set(res['tasks'])))
+        self.assertEqual(smap.task_piks, {})  # all the arguments released
+
     @classmethod
     def tearDownClass(cls):
         parallel.Starmap.shutdown()
 
 
+class SharedArraysTestCase(unittest.TestCase):
+    def test_publish(self):
+        shared = parallel.SharedArrays(tempfile.gettempdir(), min_nbytes=80)
+        small, big = numpy.arange(5.), numpy.arange(10.)
+        self.assertIs(shared.publish(small), small)
+        ref = shared.publish(big)
+        self.assertIs(shared.publish(big), ref)  # memoized
+        array = pickle.loads(pickle.dumps(ref))
+        numpy.testing.assert_equal(array, big)
+        self.assertFalse(array.flags.writeable)
+        shared.cleanup()
+        self.assertFalse(os.path.exists(ref.fname))
+
+
 class ThreadPoolTestCase(unittest.TestCase):
     def test(self):
         monitor = parallel.Monitor()
@@ -759,7 +759,7 @@ class RiskCalculator(HazardCalculator):
         :param kind:
             kind of hazard getter, can be 'poe' or 'gmf'
         :param eps:
-            a matrix of epsilons (or None)
+            a matrix of epsilons, a lazy EpsilonMatrix0 or None
         :param num_events:
             how many events there are
         :returns:
@@ -807,12 +807,16 @@ class RiskCalculator(HazardCalculator):
                 sid_weight, num_tasks, weight=operator.itemgetter(1)):
             sids = numpy.array([sid for sid, _weight in block])
             reduced_assets = assets_by_site[sids]
-            # dictionary of epsilons for the reduced assets
-            reduced_eps = {}
-            for assets in reduced_assets:
-                for ass in assets:
-                    if eps is not None and len(eps):
-                        reduced_eps[ass.ordinal] = eps[ass.ordinal]
+            if isinstance(eps, riskinput.EpsilonMatrix0):
+                # lazy epsilons, generated in the workers
+                reduced_eps = eps
+            else:
+                # dictionary of epsilons for the reduced assets
+                reduced_eps = {}
+                for assets in reduced_assets:
+                    for ass in assets:
+                        if eps is not None and len(eps):
+                            reduced_eps[ass.ordinal] = eps[ass.ordinal]
             # build the riskinputs
             if kind == 'poe':  # hcurves, shape (R, N)
                 getter = PmapGetter(dstore, self.rlzs_assoc, sids)
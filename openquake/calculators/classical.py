@@ -15,6 +15,8 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
+import copy
 import math
 import time
 import logging
@@ -24,9 +26,12 @@ import numpy
 from openquake.baselib import parallel, hdf5, datastore
 from openquake.baselib.python3compat import encode
 from openquake.baselib.general import AccumDict, block_splitter, groupby
-from openquake.hazardlib.calc.hazard_curve import classical, ProbabilityMap
-from openquake.hazardlib.stats import compute_pmap_stats
+from openquake.hazardlib.calc.hazard_curve import classical
+from openquake.hazardlib.probability_map import DenseProbabilityMap
+from openquake.hazardlib.stats import StreamingStats, get_stats_nbytes
+from openquake.hazardlib.sourcewriter import obj_to_node
 from openquake.hazardlib import source
+from openquake.commonlib.calc import PmapCache, get_site_hashes
 from openquake.calculators import getters
 from openquake.calculators import base
 
@@ -70,8 +75,9 @@ def saving_sources_by_task(iterargs, dstore):
         for src in args[0]:  # collect source data
             data.append((i, src.nsites, src.num_ruptures, src.weight))
         yield args
-    dstore['task_sources'] = encode(source_ids)
-    dstore.extend('source_data', numpy.array(data, source_data_dt))
+    if source_ids:  # there are no tasks if all the curves are cached
+        dstore['task_sources'] = encode(source_ids)
+        dstore.extend('source_data', numpy.array(data, source_data_dt))
 
 
 @base.calculators.add('classical')
@@ -91,7 +97,9 @@ class ClassicalCalculator(base.HazardCalculator):
         with self.monitor('aggregate curves', autoflush=True):
             acc.eff_ruptures += pmap_by_grp.eff_ruptures
             for grp_id in pmap_by_grp:
-                if pmap_by_grp[grp_id]:
+                if hasattr(pmap_by_grp, 'by_source'):
+                    pass  # the curves are aggregated by .save_cache
+                elif pmap_by_grp[grp_id]:
                     acc[grp_id] |= pmap_by_grp[grp_id]
                 self.nsites.append(len(pmap_by_grp[grp_id]))
             for srcid, (srcweight, nsites, calc_time, split) in \
@@ -100,18 +108,21 @@ class ClassicalCalculator(base.HazardCalculator):
                 info.num_sites += nsites
                 info.calc_time += calc_time
                 info.num_split += split
+        if hasattr(pmap_by_grp, 'by_source'):
+            with self.monitor('saving pmap cache', autoflush=True):
+                self.save_cache(acc, pmap_by_grp.by_source)
         return acc
 
     def zerodict(self):
         """
-        Initial accumulator, a dict grp_id -> ProbabilityMap(L, G)
+        Initial accumulator, a dict grp_id -> DenseProbabilityMap(L, G)
         """
         csm_info = self.csm.info
         zd = AccumDict()
         num_levels = len(self.oqparam.imtls.array)
         for grp in self.csm.src_groups:
             num_gsims = len(csm_info.gsim_lt.get_gsims(grp.trt))
-            zd[grp.id] = ProbabilityMap(num_levels, num_gsims)
+            zd[grp.id] = DenseProbabilityMap(num_levels, num_gsims)
         zd.eff_ruptures = AccumDict()  # grp_id -> eff_ruptures
         return zd
 
@@ -128,6 +139,16 @@ class ClassicalCalculator(base.HazardCalculator):
             self.calc_stats(parent)  # post-processing
             return {}
         self.csm_info = self.datastore['csm_info']
+        oq = self.oqparam
+        self.cached_pmaps = self.zerodict()
+        if oq.pmap_cache_size and self.core_task.__func__ is classical:
+            self.pmap_cache = PmapCache(
+                os.path.join(datastore.get_datadir(), 'pmap_cache.hdf5'),
+                oq.pmap_cache_size)
+            self.site_hashes = get_site_hashes(self.sitecol.complete)
+            self.cache_keys = {}  # (src_id, grp_id) -> info for save_cache
+        else:
+            self.pmap_cache = None
         with self.monitor('managing sources', autoflush=True):
             allargs = self.gen_args(self.monitor('classical'))
             iterargs = saving_sources_by_task(allargs, self.datastore)
@@ -138,12 +159,20 @@ class ClassicalCalculator(base.HazardCalculator):
                 # argument tuple and it will run in core the task
                 iterargs = list(iterargs)
             ires = parallel.Starmap(
-                self.core_task.__func__, iterargs).submit_all()
+                self.core_task.__func__, iterargs,
+                maxtime=self.oqparam.max_task_duration).submit_all()
         self.nsites = []
         acc = ires.reduce(self.agg_dicts, self.zerodict())
-        if not self.nsites:
+        if self.pmap_cache:
+            self.pmap_cache.close()
+            for grp_id, pmap in self.cached_pmaps.items():
+                acc[grp_id] |= pmap
+            acc.eff_ruptures += self.cached_pmaps.eff_ruptures
+        if not self.nsites and not any(self.cached_pmaps.values()):
             raise RuntimeError('All sources were filtered out!')
-        logging.info('Effective sites per task: %d', numpy.mean(self.nsites))
+        if self.nsites:
+            logging.info('Effective sites per task: %d',
+                         numpy.mean(self.nsites))
         with self.monitor('store source_info', autoflush=True):
             self.store_source_info(self.csm.infos, acc)
         return acc
@@ -158,7 +187,11 @@ class ClassicalCalculator(base.HazardCalculator):
         oq = self.oqparam
         opt = self.oqparam.optimize_same_id_sources
         param = dict(truncation_level=oq.truncation_level, imtls=oq.imtls,
-                     filter_distance=oq.filter_distance, reqv=oq.get_reqv())
+                     filter_distance=oq.filter_distance, reqv=oq.get_reqv(),
+                     vectorize_ruptures=oq.vectorize_ruptures,
+                     sf_accuracy=oq.sf_accuracy,
+                     pointsource_collapse_factor=(
+                         oq.pointsource_collapse_factor))
         minweight = source.MINWEIGHT * math.sqrt(len(self.sitecol))
         num_tasks = 0
         num_sources = 0
@@ -182,25 +215,144 @@ class ClassicalCalculator(base.HazardCalculator):
         # NB: csm.get_sources_by_trt discards the mutex sources
         for trt, sources in csm.sources_by_trt.items():
             gsims = self.csm.info.gsim_lt.get_gsims(trt)
-            for block in block_splitter(sources, maxweight, weight):
-                yield block, src_filter, gsims, param, monitor
-                num_tasks += 1
-                num_sources += len(block)
+            if self.pmap_cache:
+                pairs = self.read_cache(trt, sources, gsims, src_filter)
+                par = dict(param, pmap_by_source=True)
+            else:
+                pairs = [(gsims, sources)]
+                par = param
+            for gsims_, sources_ in pairs:
+                for block in block_splitter(sources_, maxweight, weight):
+                    yield block, src_filter, gsims_, par, monitor
+                    num_tasks += 1
+                    num_sources += len(block)
         logging.info('Sent %d sources in %d tasks', num_sources, num_tasks)
         self.csm.info.tot_weight = csm.info.tot_weight
 
+    def read_cache(self, trt, sources, gsims, src_filter):
+        """
+        Accumulate in .cached_pmaps the hazard curves found in the PmapCache
+        and determine the GSIMs and the sites still to compute.
+
+        :param trt: tectonic region type of the sources
+        :param sources: sources already prefiltered
+        :param gsims: the GSIMs associated to the tectonic region type
+        :param src_filter: a SourceFilter instance
+        :returns: a list of pairs (gsims, sources) to send to the workers
+        """
+        oq = self.oqparam
+        L, G = len(oq.imtls.array), len(gsims)
+        # the serialized sources do not contain the temporal occurrence
+        # model nor the parameters of the converter, so they are in the key
+        params = (trt, [(imt, oq.imtls[imt].tolist()) for imt in oq.imtls],
+                  oq.truncation_level, oq.filter_distance, oq.sf_accuracy,
+                  oq.pointsource_collapse_factor, oq.inputs.get('reqv'),
+                  sorted(src_filter.integration_distance.dic.items()),
+                  oq.investigation_time, oq.rupture_mesh_spacing,
+                  oq.complex_fault_mesh_spacing, oq.width_of_mfd_bin,
+                  oq.area_source_discretization)
+        all_sids = self.sitecol.complete.sids
+        by_gsims = AccumDict(accum=[])  # gsim indices -> sources
+        num_cached = 0
+        for src in sources:
+            sids = getattr(src, 'indices', all_sids)
+            hashes = self.site_hashes[sids]
+            try:
+                srcrepr = obj_to_node(src).to_str()
+            except KeyError:  # the source cannot be serialized, no caching
+                self.cache_keys[src.source_id, src.src_group_ids[0]] = (
+                    src.src_group_ids, list(range(G)), sids, hashes, None)
+                by_gsims[tuple(range(G))].append(src)
+                continue
+            keys = [self.pmap_cache.get_key(srcrepr, str(gsim),
+                                            gsim.minimum_distance, params)
+                    for gsim in gsims]
+            entries = [self.pmap_cache.get(key) for key in keys]
+            found = [numpy.in1d(hashes, entry[0]) if entry
+                     else numpy.zeros(len(sids), bool) for entry in entries]
+            missing = [g for g in range(G) if not found[g].all()]
+            recompute = numpy.zeros(len(sids), bool)
+            for g in missing:
+                recompute |= ~found[g]
+            array = numpy.zeros((len(sids), L, G))
+            for g, entry in enumerate(entries):
+                if entry is None:
+                    continue
+                ok = found[g] & ~recompute if g in missing else found[g]
+                order = numpy.argsort(entry[0])
+                idx = order[numpy.searchsorted(entry[0], hashes[ok],
+                                               sorter=order)]
+                array[ok, :, g] = entry[1][idx]
+            nonzero = array.any(axis=(1, 2))
+            if nonzero.any():
+                pmap = DenseProbabilityMap(
+                    L, G, sids[nonzero], array[nonzero])
+                for grp_id in src.src_group_ids:
+                    self.cached_pmaps[grp_id] |= pmap
+            if not missing:
+                num_cached += 1
+                self.cached_pmaps.eff_ruptures += {
+                    grp_id: entries[0][2] for grp_id in src.src_group_ids}
+                continue
+            new = copy.copy(src)
+            new.indices = sids[recompute]
+            self.cache_keys[src.source_id, src.src_group_ids[0]] = (
+                src.src_group_ids, missing, new.indices, hashes[recompute],
+                [keys[g] for g in missing])
+            by_gsims[tuple(missing)].append(new)
+        logging.info('Found %d/%d %s sources in the pmap cache',
+                     num_cached, len(sources), trt)
+        return [([gsims[g] for g in missing], srcs)
+                for missing, srcs in by_gsims.items()]
+
+    def save_cache(self, acc, pmap_by_source):
+        """
+        Store in the PmapCache the hazard curves computed by a task and
+        aggregate them in the accumulator.
+
+        :param acc: accumulator dictionary
+        :param pmap_by_source: dictionary (src_id, grp_id) -> ProbabilityMap
+        """
+        for srckey, poemap in pmap_by_source.items():
+            grp_ids, gidxs, sids, hashes, keys = self.cache_keys[srckey]
+            L, G = acc[grp_ids[0]].shape_y, acc[grp_ids[0]].shape_z
+            array = numpy.zeros((len(sids), L, G))
+            if poemap:
+                idx = numpy.searchsorted(sids, list(poemap))
+                array[idx[:, None], :, gidxs] = numpy.array(
+                    [poemap[sid].array for sid in poemap]).transpose(0, 2, 1)
+            nonzero = array.any(axis=(1, 2))
+            pmap = DenseProbabilityMap(L, G, sids[nonzero], array[nonzero])
+            for grp_id in grp_ids:
+                acc[grp_id] |= pmap
+            if keys is None:  # the source cannot be cached
+                continue
+            eff_ruptures = getattr(poemap, 'eff_ruptures', 0)
+            for key, g in zip(keys, gidxs):
+                self.pmap_cache.update(key, hashes, array[:, :, g],
+                                       eff_ruptures)
+
     def gen_getters(self, parent):
         """
-        :yields: pgetter, hstats, monitor
+        :yields: pgetter, hstats, param, monitor
         """
+        oq = self.oqparam
         monitor = self.monitor('build_hcurves_and_stats')
-        hstats = self.oqparam.hazard_stats()
-        for t in self.sitecol.split_in_tiles(self.oqparam.concurrent_tasks):
+        hstats = oq.hazard_stats()
+        # use enough tiles to keep the statistics below the memory limit
+        nbytes = len(self.sitecol) * len(oq.imtls.array) * get_stats_nbytes(
+            [stat for _, stat in hstats], len(self.rlzs_assoc.realizations),
+            oq.quantile_error)
+        num_tiles = max(oq.concurrent_tasks,
+                        math.ceil(nbytes / oq.stats_memory))
+        param = dict(stats_memory=oq.stats_memory,
+                     quantile_error=oq.quantile_error)
+        for t in self.sitecol.split_in_tiles(num_tiles):
             pgetter = getters.PmapGetter(parent, self.rlzs_assoc, t.sids)
             if parent is self.datastore:  # read now, not in the workers
                 logging.info('Reading PoEs on %d sites', len(t))
                 pgetter.init()
-            yield pgetter, hstats, monitor
+            yield pgetter, hstats, param, monitor
 
     def save_hcurves(self, acc, pmap_by_kind):
         """
@@ -216,8 +368,12 @@ class ClassicalCalculator(base.HazardCalculator):
                 if pmap:
                     key = 'hcurves/%s' % kind
                     dset = self.datastore.getitem(key)
-                    for sid in pmap:
-                        dset[sid] = pmap[sid].array[:, 0]
+                    # update the slice of sites in a single read/write
+                    sids = pmap.sids
+                    start, stop = sids[0], sids[-1] + 1
+                    curves = dset[start:stop]
+                    curves[sids - start] = pmap.array[:, :, 0]
+                    dset[start:stop] = curves
                     # in the datastore we save 4 byte floats, thus we
                     # divide the memory consumption by 2: pmap.nbytes / 2
                     acc += {kind: pmap.nbytes // 2}
@@ -341,32 +497,54 @@ def fix_ones(pmap):
     Here we solve the issue by replacing the unphysical probabilities 1
     with .9999999999999999 (the float64 closest to 1).
     """
+    if isinstance(pmap, DenseProbabilityMap):
+        pmap.array[pmap.array == 1.] = .9999999999999999
+        return
     for sid in pmap:
         array = pmap[sid].array
         array[array == 1.] = .9999999999999999
 
 
-def build_hcurves_and_stats(pgetter, hstats, monitor):
+def build_hcurves_and_stats(pgetter, hstats, param, monitor):
     """
     :param pgetter: an :class:`openquake.commonlib.getters.PmapGetter`
     :param hstats: a list of pairs (statname, statfunc)
+    :param param: a dictionary with keys stats_memory and quantile_error
     :param monitor: instance of Monitor
     :returns: a dictionary kind -> ProbabilityMap
 
     The "kind" is a string of the form 'rlz-XXX' or 'mean' of 'quantile-XXX'
-    used to specify the kind of output.
+    used to specify the kind of output. The realizations are combined
+    and sent to a :class:`StreamingStats` instance in blocks, so that
+    the memory occupation stays below param['stats_memory'].
     """
     with monitor('combine pmaps'):
         pgetter.init()  # if not already initialized
-        try:
-            pmaps = pgetter.get_pmaps(pgetter.sids)
-        except IndexError:  # no data
-            return {}
-        if sum(len(pmap) for pmap in pmaps) == 0:  # no data
+        if not pgetter.pmap_by_grp:  # no data
             return {}
+    sids = pgetter.sids
+    N, L = len(sids), len(pgetter.imtls.array)
+    weights = pgetter.weights
+    sstats = StreamingStats([stat for _, stat in hstats], (N, L),
+                            param['stats_memory'], param['quantile_error'])
+    blocksize = max(1, param['stats_memory'] // (4 * N * L * 8))
+    found = numpy.zeros(N, bool)  # sites with nonzero curves
+    for rlzis in block_splitter(range(len(weights)), blocksize):
+        with monitor('combine pmaps'):
+            curves = numpy.zeros((len(rlzis), N, L))
+            for i, pmap in enumerate(pgetter.get_pmaps(sids, rlzis)):
+                if len(pmap):
+                    idx = numpy.searchsorted(sids, pmap.sids)
+                    curves[i, idx] = pmap.array[:, :, 0]
+                    found[idx] = True
+        with monitor('compute stats'):
+            sstats.update(curves, [weights[rlzi] for rlzi in rlzis])
+    if not found.any():  # no data
+        return {}
+    with monitor('compute stats'):
+        arrays = sstats.get()
     pmap_by_kind = {}
-    for kind, stat in hstats:
-        with monitor('compute ' + kind):
-            pmap = compute_pmap_stats(pmaps, [stat], pgetter.weights)
-        pmap_by_kind[kind] = pmap
+    for (kind, stat), array in zip(hstats, arrays):
+        pmap_by_kind[kind] = DenseProbabilityMap(
+            L, 1, sids[found], array[found].reshape(-1, L, 1))
     return pmap_by_kind
@@ -23,8 +23,9 @@ import logging
 import operator
 import numpy
 
-from openquake.baselib import parallel
-from openquake.baselib.general import AccumDict, groupby, block_splitter
+from openquake.baselib import parallel, hdf5
+from openquake.baselib.general import (
+    AccumDict, groupby, block_splitter, split_in_blocks)
 from openquake.baselib.python3compat import encode
 from openquake.hazardlib.stats import compute_stats
 from openquake.hazardlib.calc import disagg
@@ -38,27 +39,30 @@ DISAGG_RES_FMT = '%(poe)s%(rlz)s-%(imt)s-%(lon)s-%(lat)s/'
 
 
 def _to_matrix(matrices, num_trts):
-    # convert a dict trti -> matrix into a single matrix of shape (T, ...)
+    # convert a dict trti -> SparseMatrix into a single matrix
+    # of shape (T, ...)
     trti = next(iter(matrices))
     mat = numpy.zeros((num_trts,) + matrices[trti].shape)
     for trti in matrices:
-        mat[trti] = matrices[trti]
+        mat[trti] = matrices[trti].todense()
     return mat
 
 
-def compute_disagg(src_filter, sources, cmaker, iml4, trti, bin_edges,
+def compute_disagg(sitecol, sources, cmaker, iml4, trti, bin_edges,
                    oqparam, monitor):
     # see https://bugs.launchpad.net/oq-engine/+bug/1279247 for an explanation
     # of the algorithm used
     """
-    :param src_filter:
-        a :class:`openquake.hazardlib.calc.filter.SourceFilter` instance
+    :param sitecol:
+        a :class:`openquake.hazardlib.site.SiteCollection` instance,
+        possibly a tile
     :param sources:
         list of hazardlib source objects
     :param cmaker:
         a :class:`openquake.hazardlib.gsim.base.ContextMaker` instance
     :param iml4:
-        an array of intensities of shape (N, R, M, P)
+        an array of intensities of shape (N, R, M, P), N being the number
+        of sites in the tile
     :param dict trti:
         tectonic region type index
     :param bin_egdes:
@@ -68,22 +72,17 @@ def compute_disagg(src_filter, sources, cmaker, iml4, trti, bin_edges,
     :param monitor:
         monitor of the currently running job
     :returns:
-        a dictionary of probability arrays, with composite key
-        (sid, rlzi, poe, imt, iml, trti).
+        a dictionary of sparse probability matrices, with composite key
+        (sid, rlzi, poe, imt).
     """
-    result = {'trti': trti, 'num_ruptures': 0}
-    # all the time is spent in collect_bin_data
-    bin_data = disagg.collect_bin_data(
-        sources, src_filter.sitecol, cmaker, iml4,
+    result = {'trti': trti}
+    # all the time is spent in build_sparse_matrices
+    result['num_ruptures'], matrices = disagg.build_sparse_matrices(
+        sources, sitecol, cmaker, iml4, bin_edges,
         oqparam.truncation_level, oqparam.num_epsilon_bins, monitor)
-    if bin_data:  # dictionary poe, imt, rlzi -> pne
-        for sid in src_filter.sitecol.sids:
-            for (poe, imt, rlzi), matrix in disagg.build_disagg_matrix(
-                    bin_data, bin_edges, sid, monitor).items():
-                result[sid, rlzi, poe, imt] = matrix
-        result['cache_info'] = monitor.cache_info
-        result['num_ruptures'] = len(bin_data.mags)
-    return result  # sid, rlzi, poe, imt, iml -> array
+    for (sid, poe, imt, rlzi), matrix in matrices.items():
+        result[sid, rlzi, poe, imt] = matrix
+    return result  # sid, rlzi, poe, imt -> SparseMatrix
 
 
 def agg_probs(*probs):
@@ -142,9 +141,10 @@ producing too small PoEs.'''
         # this is fast
         trti = result.pop('trti')
         self.num_ruptures[trti] += result.pop('num_ruptures')
-        self.cache_info += result.pop('cache_info', 0)
         for key, val in result.items():
-            acc[key][trti] = agg_probs(acc[key].get(trti, 0), val)
+            if trti not in acc[key]:
+                acc[key][trti] = disagg.SparseMatrix(val.shape)
+            acc[key][trti].agg(val)
         return acc
 
     def get_curves(self, sid):
@@ -280,6 +280,14 @@ producing too small PoEs.'''
                     for m, imt in enumerate(oq.imtls):
                         self.imldict[s, r, poe, imt] = iml4[s, r, m, p]
 
+        # the sites are split in tiles, independently from the sources
+        num_tiles = numpy.ceil(len(self.sitecol) / oq.sites_per_tile)
+        tiles, iml4s = [], []
+        for idxs in split_in_blocks(range(len(self.sitecol)), num_tiles):
+            idxs = numpy.array(idxs)
+            tiles.append(self.sitecol.filtered(idxs))
+            iml4s.append(hdf5.ArrayWrapper(iml4.array[idxs], dict(
+                poes_disagg=iml4.poes_disagg, imts=iml4.imts)))
         for smodel in csm.source_models:
             sm_id = smodel.ordinal
             for trt, groups in groupby(
@@ -291,14 +299,16 @@ producing too small PoEs.'''
                     rlzs_by_gsim, src_filter.integration_distance,
                     {'filter_distance': oq.filter_distance})
                 for block in block_splitter(sources, maxweight, weight):
-                    all_args.append(
-                        (src_filter, block, cmaker, iml4, trti, self.bin_edges,
-                         oq, mon))
+                    for tile, iml4_ in zip(tiles, iml4s):
+                        all_args.append(
+                            (tile, block, cmaker, iml4_, trti,
+                             self.bin_edges, oq, mon))
 
         self.num_ruptures = [0] * len(self.trts)
-        self.cache_info = numpy.zeros(3)  # operations, cache_hits, num_zeros
         results = parallel.Starmap(compute_disagg, all_args).reduce(
             self.agg_result, AccumDict(accum={}))
+        for trti in range(len(self.trts)):  # counted once per tile
+            self.num_ruptures[trti] //= len(tiles)
 
         # set eff_ruptures
         trti = csm.info.trt2i()
@@ -306,10 +316,6 @@ producing too small PoEs.'''
             for sg in smodel.src_groups:
                 sg.eff_ruptures = self.num_ruptures[trti[sg.trt]]
         self.datastore['csm_info'] = csm.info
-
-        ops, hits, num_zeros = self.cache_info
-        logging.info('Cache speedup %s', ops / (ops - hits))
-        logging.info('Discarded zero matrices: %d', num_zeros)
         return results
 
     def save_bin_edges(self):
@@ -330,26 +336,26 @@ producing too small PoEs.'''
 
     def build_stats(self, results, hstats):
         """
-        :param results: dict key -> 6D disagg_matrix
+        :param results: dict key -> trti -> SparseMatrix
         :param hstats: (statname, statfunc) pairs
+        :yields: pairs ((sid, stat, poe, imt), 6D disagg_matrix)
         """
         weights = [rlz.weight for rlz in self.rlzs_assoc.realizations]
         R = len(weights)
         T = len(self.trts)
-        dic = {}  # sid, poe, imt -> disagg_matrix
+        # build the dense matrices of a single (sid, poe, imt) at the time
         for sid in self.sitecol.sids:
             shape = disagg.get_shape(self.bin_edges, sid)
             for poe in self.oqparam.poes_disagg or (None,):
                 for imt in self.oqparam.imtls:
-                    dic[sid, poe, imt] = numpy.zeros((R, T) + shape)
-        for (sid, rlzi, poe, imt), matrix in results.items():
-            dic[sid, poe, imt][rlzi] = matrix
-        res = {}  # sid, stat, poe, imt -> disagg_matrix
-        for (sid, poe, imt), array in dic.items():
-            for stat, func in hstats:
-                matrix = compute_stats(array, [func], weights)[0]
-                res[sid, stat, poe, imt] = matrix
-        return res
+                    array = numpy.zeros((R, T) + shape)
+                    for rlzi in range(R):
+                        matrices = results.get((sid, rlzi, poe, imt))
+                        if matrices:
+                            array[rlzi] = _to_matrix(matrices, T)
+                    for stat, func in hstats:
+                        matrix = compute_stats(array, [func], weights)[0]
+                        yield (sid, stat, poe, imt), matrix
 
     def get_NRPM(self):
         """
@@ -367,17 +373,16 @@ producing too small PoEs.'''
         to save is #sites * #rlzs * #disagg_poes * #IMTs.
 
         :param results:
-            a dictionary (sid, rlzi, poe, imt) -> trti -> disagg matrix
+            a dictionary (sid, rlzi, poe, imt) -> trti -> SparseMatrix
         """
         T = len(self.trts)
-        # build a dictionary (sid, rlzi, poe, imt) -> 6D matrix
-        results = {k: _to_matrix(v, T) for k, v in results.items()}
-
         # get the number of outputs
         shp = self.get_NRPM()
         logging.info('Extracting and saving the PMFs for %d outputs '
                      '(N=%s, R=%d, P=%d, M=%d)', numpy.prod(shp), *shp)
-        self.save_disagg_result('disagg', results)
+        # the 6D matrices are built one at the time, to save memory
+        self.save_disagg_result('disagg', (
+            (key, _to_matrix(results[key], T)) for key in sorted(results)))
 
         hstats = self.oqparam.hazard_stats()
         if len(self.rlzs_assoc.realizations) > 1 and hstats:
@@ -395,9 +400,9 @@ producing too small PoEs.'''
         :param dskey:
             dataset key; can be 'disagg' or 'disagg-stats'
         :param results:
-            a dictionary sid, rlz, poe, imt -> 6D disagg_matrix
+            an iterable over pairs ((sid, rlz, poe, imt), 6D disagg_matrix)
         """
-        for (sid, rlz, poe, imt), matrix in sorted(results.items()):
+        for (sid, rlz, poe, imt), matrix in results:
             self._save_result(dskey, sid, rlz, poe, imt, matrix)
 
     def _save_result(self, dskey, site_id, rlz_id, poe, imt_str, matrix):
@@ -193,7 +193,8 @@ class EventBasedCalculator(base.HazardCalculator):
             truncation_level=oq.truncation_level,
             imtls=oq.imtls, filter_distance=oq.filter_distance,
             seed=oq.ses_seed, maximum_distance=oq.maximum_distance,
-            ses_per_logic_tree_path=oq.ses_per_logic_tree_path)
+            ses_per_logic_tree_path=oq.ses_per_logic_tree_path,
+            vectorized_sampling=oq.vectorized_sampling)
         concurrent_tasks = oq.concurrent_tasks
         if oq.hazard_calculation_id:
             U = len(self.datastore.parent['ruptures'])
@@ -279,7 +280,8 @@ class EventBasedCalculator(base.HazardCalculator):
                 self.datastore.extend('gmf_data/data', data)
                 # it is important to save the number of bytes while the
                 # computation is going, to see the progress
-                update_nbytes(self.datastore, 'gmf_data/data', data)
+                self.datastore.submit(
+                    update_nbytes, self.datastore, 'gmf_data/data', data)
                 for sid, start, stop in result['indices']:
                     self.indices[sid, 0].append(start + self.offset)
                     self.indices[sid, 1].append(stop + self.offset)
@@ -295,7 +297,7 @@ class EventBasedCalculator(base.HazardCalculator):
                 array[:] = 1. - (1. - array) * (1. - poes)
         sav_mon.flush()
         agg_mon.flush()
-        self.datastore.flush()
+        self.datastore.submit(self.datastore.flush)
         return acc
 
     def save_ruptures(self, ruptures_by_grp_id):
@@ -308,10 +310,14 @@ class EventBasedCalculator(base.HazardCalculator):
         with self.monitor('saving ruptures', autoflush=True):
             for grp_id, ebrs in ruptures_by_grp_id.items():
                 if len(ebrs):
-                    events = get_events(ebrs)
-                    dset = self.datastore.extend('events', events)
-                    if self.oqparam.save_ruptures:
-                        self.rupser.save(ebrs, eidx=len(dset)-len(events))
+                    self.datastore.submit(self._save_events, ebrs)
+
+    def _save_events(self, ebrs):
+        # performed in the writer thread, if started
+        events = get_events(ebrs)
+        dset = self.datastore.extend('events', events)
+        if self.oqparam.save_ruptures:
+            self.rupser.save(ebrs, eidx=len(dset)-len(events))
 
     def check_overflow(self):
         """
@@ -358,7 +364,12 @@ class EventBasedCalculator(base.HazardCalculator):
             ires = parallel.Starmap(
                 self.core_task.__func__, iterargs
             ).submit_all()
-        acc = ires.reduce(self.agg_dicts, acc)
+        # save the events and the GMFs while receiving the results
+        self.datastore.start_writer(monitor=self._monitor)
+        try:
+            acc = ires.reduce(self.agg_dicts, acc)
+        finally:
+            self.datastore.stop_writer()
         if self.oqparam.hazard_calculation_id is None:
             with self.monitor('store source_info', autoflush=True):
                 self.store_source_info(self.csm.infos, acc)
@@ -20,7 +20,7 @@ import operator
 import numpy
 
 from openquake.baselib.python3compat import zip, encode
-from openquake.baselib.general import AccumDict, humansize
+from openquake.baselib.general import AccumDict
 from openquake.hazardlib.stats import set_rlzs_stats
 from openquake.risklib import riskinput
 from openquake.calculators import base
@@ -79,55 +79,52 @@ def event_based_risk(riskinput, riskmodel, param, monitor):
     param['lrs_dt'] = numpy.dtype([('rlzi', U16), ('ratios', (F32, (L * I,)))])
     ass = []
     agg = numpy.zeros((E, R, L * I), F32)
-    avg = AccumDict(accum={} if riskinput.by_site or not param['avg_losses']
-                    else numpy.zeros(A, F64))
+    # (li, r) -> array of average losses, aligned with riskinput.aids;
+    # the sums are accumulated in double precision and stored as F32
+    avg = AccumDict(accum=numpy.zeros(A, F64))
     result = dict(assratios=ass, aids=riskinput.aids, avglosses=avg)
     if 'builder' in param:
         builder = param['builder']
-        A = len(riskinput.aids)
         R = len(builder.weights)
         P = len(builder.return_periods)
         all_curves = numpy.zeros((A, R, P), builder.loss_dt)
-        aid2idx = {aid: idx for idx, aid in enumerate(riskinput.aids)}
+    eids = numpy.asarray(eids)
+    esorter = numpy.argsort(eids)
+    asorter = numpy.argsort(riskinput.aids)
     # update the result dictionary and the agg array with each output
     for out in riskmodel.gen_outputs(riskinput, monitor):
         if len(out.eids) == 0:  # this happens for sites with no events
             continue
         r = out.rlzi
-        eid2idx = riskinput.hazard_getter.eid2idx
+        # indices of the events in eids and of the assets in riskinput.aids
+        eidx = esorter[numpy.searchsorted(eids, out.eids, sorter=esorter)]
+        aidx = asorter[numpy.searchsorted(
+            riskinput.aids, [asset.ordinal for asset in out.assets],
+            sorter=asorter)]
         for l, loss_ratios in enumerate(out):
             if loss_ratios is None:  # for GMFs below the minimum_intensity
                 continue
+            # loss_ratios is a matrix of shape (assets, events, I)
             loss_type = riskmodel.loss_types[l]
-            indices = numpy.array([eid2idx[eid] for eid in out.eids])
-            for a, asset in enumerate(out.assets):
-                ratios = loss_ratios[a]  # shape (E, I)
-                aid = asset.ordinal
-                aval = asset.value(loss_type)
-                losses = aval * ratios
-                if 'builder' in param:
-                    idx = aid2idx[aid]
+            lis = l + L * numpy.arange(I)
+            avals = numpy.array(
+                [asset.value(loss_type) for asset in out.assets], F32)
+            if 'builder' in param:
+                for a, aval in enumerate(avals):
                     for i in range(I):
                         lt = loss_type + '_ins' * i
-                        all_curves[idx, r][lt] = builder.build_curve(
-                            aval, ratios[:, i], r)
+                        all_curves[aidx[a], r][lt] = builder.build_curve(
+                            aval, loss_ratios[a, :, i], r)
 
-                # average losses
-                if param['avg_losses']:
-                    rat = ratios.sum(axis=0) * param['ses_ratio']
-                    for i in range(I):
-                        lba = avg[l + L * i, r]
-                        try:
-                            lba[aid] += rat[i]
-                        except KeyError:
-                            lba[aid] = rat[i]
+            # average losses
+            if param['avg_losses']:
+                rat = loss_ratios.sum(axis=1) * param['ses_ratio']
+                for i, li in enumerate(lis):
+                    numpy.add.at(avg[li, r], aidx, rat[:, i])
 
-                # agglosses
-                for i in range(I):
-                    li = l + L * i
-                    # this is the critical loop: it is important to keep it
-                    # vectorized in terms of the event indices
-                    agg[indices, r, li] += losses[:, i]
+            # agglosses, summed over the assets of the output
+            losses = numpy.einsum('a,aei->ei', avals, loss_ratios)
+            numpy.add.at(agg, (eidx[:, None], r, lis), losses)
 
     idx = agg.nonzero()  # return only the nonzero values
     result['agglosses'] = (idx, agg[idx])
@@ -182,9 +179,6 @@ class EbrCalculator(base.RiskCalculator):
         # order (i.e. consistent with the one used in ebr from ruptures)
         self.E = len(self.eids)
         eps = self.epsilon_getter()()
-        if not oq.ignore_covs:
-            logging.info('Generating %s of epsilons',
-                         humansize(self.A * self.E * 4))
         self.riskinputs = self.build_riskinputs('gmf', eps, self.E)
         self.param['insured_losses'] = oq.insured_losses
         self.param['avg_losses'] = oq.avg_losses
@@ -260,16 +254,19 @@ class EbrCalculator(base.RiskCalculator):
 
         if not hasattr(self, 'vals'):
             self.vals = self.assetcol.values()
+        # the writes are performed in the writer thread, if started
+        self.datastore.submit(self._save_avg_losses, avglosses, aids)
+        self.datastore.submit(self._save_curves, dic, aids)
+        self.datastore.submit(self._save_maps, dic, aids)
+
+        self.taskno += 1
+
+    def _save_avg_losses(self, avglosses, aids):
         with self.monitor('saving avg_losses-rlzs'):
             for (li, r), ratios in avglosses.items():
                 l = li if li < self.L else li - self.L
                 vs = self.vals[self.riskmodel.loss_types[l]]
-                self.dset[aids, r, li] += numpy.array(
-                    [ratios.get(aid, 0) * vs[aid] for aid in aids])
-        self._save_curves(dic, aids)
-        self._save_maps(dic, aids)
-
-        self.taskno += 1
+                self.dset[aids, r, li] += ratios * vs[aids]
 
     def _save_curves(self, dic, aids):
         for key in ('curves-rlzs', 'curves-stats'):
@@ -288,6 +285,16 @@ class EbrCalculator(base.RiskCalculator):
                 for aid, arr in zip(aids, loss_maps):
                     self.datastore[key][aid] = arr
 
+    def execute(self):
+        """
+        Run the tasks and save their losses while receiving the results
+        """
+        self.datastore.start_writer(monitor=self._monitor)
+        try:
+            return super().execute()
+        finally:
+            self.datastore.stop_writer()
+
     def combine(self, dummy, res):
         """
         :param dummy: unused parameter
@@ -19,6 +19,7 @@
 import re
 import os
 import logging
+import functools
 import operator
 import collections
 
@@ -33,7 +34,8 @@ from openquake.calculators.views import view
 from openquake.calculators.extract import extract, get_mesh
 from openquake.calculators.export import export
 from openquake.calculators.getters import (
-    GmfGetter, PmapGetter, RuptureGetter, get_ruptures_by_grp)
+    GmfGetter, PmapGetter, RuptureGetter, DatasetView, get_ruptures_by_grp,
+    read_rows)
 from openquake.commonlib import writers, hazard_writers, calc, util, source
 
 F32 = numpy.float32
@@ -298,20 +300,33 @@ def export_hcurves_by_imt_csv(
         lst = [('lon', F32), ('lat', F32), ('depth', F32)]
         for iml in imls:
             lst.append(('poe-%s' % iml, F32))
-        hcurves = numpy.zeros(nsites, lst)
-        for sid, lon, lat, dep in zip(
-                range(nsites), sitecol.lons, sitecol.lats, sitecol.depths):
-            if isinstance(array, dict):  # is a pmap, for old versions
+        if isinstance(array, dict):  # is a pmap, for old versions
+            hcurves = numpy.zeros(nsites, lst)
+            for sid, lon, lat, dep in zip(
+                    range(nsites), sitecol.lons, sitecol.lats,
+                    sitecol.depths):
                 poes = array.setdefault(sid, 0).array[slc]
-            else:  # is an array for recent versions of the engine
-                poes = array[sid, slc]
-            hcurves[sid] = (lon, lat, dep) + tuple(poes)
+                hcurves[sid] = (lon, lat, dep) + tuple(poes)
+        else:  # an array or a dataset for recent versions of the engine
+            hcurves = DatasetView(array, lst, functools.partial(
+                _build_hcurves, sitecol, slc, lst))
         fnames.append(writers.write_csv(dest, hcurves, comment=_comment(
             rlzs_assoc, kind, oq.investigation_time) + ', imt="%s"' % imt,
                                         header=[name for (name, dt) in lst]))
     return fnames
 
 
+def _build_hcurves(sitecol, slc, dtlist, array, sids):
+    # build the records (lon, lat, depth, poe-<iml>...) for the given sites
+    hcurves = numpy.zeros(len(sids), dtlist)
+    hcurves['lon'] = sitecol.lons[sids]
+    hcurves['lat'] = sitecol.lats[sids]
+    hcurves['depth'] = sitecol.depths[sids]
+    for (name, _dt), poes in zip(dtlist[3:], array[:, slc].T):
+        hcurves[name] = poes
+    return hcurves
+
+
 def hazard_curve_name(dstore, ekey, kind, rlzs_assoc):
     """
     :param calc_id: the calculation ID
@@ -381,7 +396,9 @@ def export_hcurves_csv(ekey, dstore):
     fnames = []
     if oq.poes:
         pdic = DictArray({imt: oq.poes for imt in oq.imtls})
-    for kind, hcurves in PmapGetter(dstore, rlzs_assoc).items(kind):
+    # the statistical curves are read lazily only when exporting hcurves
+    pgetter = PmapGetter(dstore, rlzs_assoc)
+    for kind, hcurves in pgetter.items(kind, lazy=key == 'hcurves'):
         fname = hazard_curve_name(dstore, (key, fmt), kind, rlzs_assoc)
         comment = _comment(rlzs_assoc, kind, oq.investigation_time)
         if key == 'uhs' and oq.poes and oq.uniform_hazard_spectra:
@@ -623,18 +640,21 @@ def export_gmf_data_csv(ekey, dstore):
     imts = list(oq.imtls)
     sitemesh = get_mesh(dstore['sitecol'])
     eid = int(ekey[0].split('/')[1]) if '/' in ekey[0] else None
-    gmfa = dstore['gmf_data']['data'].value
+    dset = dstore['gmf_data/data']
     if eid is None:  # we cannot use extract here
         f = dstore.build_fname('sitemesh', '', 'csv')
         sids = numpy.arange(len(sitemesh), dtype=U32)
         sites = util.compose_arrays(sids, sitemesh, 'site_id')
         writers.write_csv(f, sites)
         fname = dstore.build_fname('gmf', 'data', 'csv')
-        gmfa.sort(order=['rlzi', 'sid', 'eid'])
-        writers.write_csv(fname, _expand_gmv(gmfa, imts))
+        # only the ordering fields are read in memory, the GMFs are
+        # streamed from the dataset by the writer
+        order = numpy.lexsort([dset[f] for f in ('eid', 'sid', 'rlzi')])
+        writers.write_csv(fname, DatasetView(
+            dset, _expand_gmv(dset.dtype, imts), order=order))
         return [fname, f]
     # old format for single eid
-    gmfa = gmfa[gmfa['eid'] == eid]
+    gmfa = read_rows(dset, numpy.flatnonzero(dset['eid'] == eid))
     fnames = []
     for rlzi, array in group_array(gmfa, 'rlzi').items():
         rlz = rlzs_assoc.realizations[rlzi]
@@ -647,9 +667,8 @@ def export_gmf_data_csv(ekey, dstore):
     return fnames
 
 
-def _expand_gmv(array, imts):
+def _expand_gmv(dtype, imts):
     # the array-field gmv becomes a set of scalar fields gmv_<imt>
-    dtype = array.dtype
     assert dtype['gmv'].shape[0] == len(imts)
     dtlist = []
     for name in dtype.names:
@@ -659,7 +678,7 @@ def _expand_gmv(array, imts):
                 dtlist.append(('gmv_' + imt, F32))
         else:
             dtlist.append((name, dt))
-    return array.view(dtlist)
+    return numpy.dtype(dtlist)
 
 
 def _build_csv_data(array, rlz, sitecol, imts, investigation_time):
@@ -711,11 +730,10 @@ def export_gmf_scenario_csv(ekey, dstore):
     mesh['lat'] = sitecol.lats[sids]
     writer = writers.CsvWriter(fmt='%.5f')
     for rlzi in range(len(rlzs)):
-        hazard = hazardr[rlzi]
         for imti, imt in enumerate(imts):
             gmfs = numpy.zeros(len(sids), dt)
             for s, sid in enumerate(sids):
-                for rec in hazard[sid]:
+                for rec in hazardr[sid].get(rlzi, ()):
                     event = 'eid-%03d' % rec['eid']
                     gmfs[s][event] = rec['gmv'][imti]
             dest = dstore.build_fname(
@@ -146,7 +146,7 @@ def export_losses_by_event(ekey, dstore):
     dtlist = [('eid', U64), ('rlzi', U16)] + dstore['oqparam'].loss_dt_list()
     writer = writers.CsvWriter(fmt=writers.FIVEDIGITS)
     dest = dstore.build_fname('losses_by_event', '', 'csv')
-    writer.save(dstore['losses_by_event'].value.view(dtlist), dest)
+    writer.save(getters.DatasetView(dstore['losses_by_event'], dtlist), dest)
     return writer.getsaved()
 
 
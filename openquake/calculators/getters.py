@@ -16,7 +16,6 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import collections
-import itertools
 import operator
 import logging
 import numpy
@@ -38,6 +37,82 @@ U64 = numpy.uint64
 BaseRupture.init()  # initialize rupture codes
 
 
+def read_rows(dset, indices, maxgap=1):
+    """
+    Read the given rows of a dataset, one block of contiguous rows at the
+    time, so that sparse indices do not require reading all the rows in
+    between. Blocks separated by less than `maxgap` rows are read together.
+
+    :param dset: a HDF5 dataset
+    :param indices: an ordered array of row indices
+    :param maxgap: the maximum gap between the rows read in a single block
+    :returns: an array with len(indices) rows
+
+    >>> read_rows(numpy.arange(10) * 10, numpy.array([1, 2, 3, 7, 9]))
+    array([10, 20, 30, 70, 90])
+    >>> read_rows(numpy.arange(10) * 10, numpy.array([1, 2, 3, 7, 9]), 3)
+    array([10, 20, 30, 70, 90])
+    """
+    if len(indices) == 0:
+        return numpy.zeros((0,) + dset.shape[1:], dset.dtype)
+    blocks = numpy.split(
+        indices, numpy.where(numpy.diff(indices) > maxgap)[0] + 1)
+    if maxgap == 1:
+        return numpy.concatenate([dset[blk[0]:blk[-1] + 1] for blk in blocks])
+    return numpy.concatenate([dset[blk[0]:blk[-1] + 1][blk - blk[0]]
+                              for blk in blocks])
+
+
+class DatasetView(object):
+    """
+    A read-only view over the rows of a dataset, possibly reordered and
+    converted. It is read by slices of rows and never loaded entirely in
+    memory, so it can be passed to
+    :func:`openquake.commonlib.writers.write_csv`.
+
+    :param dset: a HDF5 dataset (or an array)
+    :param dtype: the dtype of the rows of the view
+    :param convert: a function (rows, indices) -> array of the given dtype;
+                    if None, the rows are simply viewed with the given dtype
+    :param order: an array of row indices; if None, all rows in order
+
+    >>> arr = numpy.array([(1, 2), (3, 4), (5, 6)], [('a', int), ('b', int)])
+    >>> view = DatasetView(arr, [('x', int), ('y', int)], order=[2, 0])
+    >>> view[:]
+    array([(5, 6), (1, 2)], dtype=[('x', '<i8'), ('y', '<i8')])
+    """
+    maxgap = 5000  # reading 5000 more rows is faster than a new HDF5 read
+
+    def __init__(self, dset, dtype, convert=None, order=None):
+        self.dset = dset
+        self.dtype = numpy.dtype(dtype)
+        self.convert = convert
+        self.order = None if order is None else numpy.asarray(order)
+
+    def __len__(self):
+        return len(self.dset) if self.order is None else len(self.order)
+
+    @property
+    def shape(self):
+        if self.convert is None:
+            return (len(self),) + self.dset.shape[1:]
+        return (len(self),)  # the converted rows are records
+
+    def __getitem__(self, slc):
+        if self.order is None:
+            indices = numpy.arange(*slc.indices(len(self)))
+            rows = self.dset[slc]
+        else:
+            indices = self.order[slc]
+            srt = numpy.argsort(indices, kind='mergesort')
+            rows = numpy.empty((len(indices),) + self.dset.shape[1:],
+                               self.dset.dtype)
+            rows[srt] = read_rows(self.dset, indices[srt], self.maxgap)
+        if self.convert is None:
+            return rows.view(self.dtype)
+        return self.convert(rows, indices)
+
+
 class PmapGetter(object):
     """
     Read hazard curves from the datastore for all realizations or for a
@@ -95,14 +170,12 @@ class PmapGetter(object):
         self._pmap_by_grp = {}
         if 'poes' in self.dstore:
             # build probability maps restricted to the given sids
-            ok_sids = set(self.sids)
             for grp, dset in self.dstore['poes'].items():
                 ds = dset['array']
-                L, I = ds.shape[1:]
-                pmap = probability_map.ProbabilityMap(L, I)
-                for idx, sid in enumerate(dset['sids'].value):
-                    if sid in ok_sids:
-                        pmap[sid] = probability_map.ProbabilityCurve(ds[idx])
+                sids = dset['sids'].value
+                ok, = numpy.where(numpy.isin(sids, self.sids))
+                pmap = probability_map.DenseProbabilityMap.from_array(
+                    read_rows(ds, ok), sids[ok])
                 self._pmap_by_grp[grp] = pmap
                 self.nbytes += pmap.nbytes
         return self._pmap_by_grp
@@ -133,12 +206,13 @@ class PmapGetter(object):
                         break
         return pmap
 
-    def get_pmaps(self, sids):  # used in classical
+    def get_pmaps(self, sids, rlzis=None):  # used in classical
         """
         :param sids: an array of S site IDs
+        :param rlzis: the indices of the realizations (default all)
         :returns: a list of R probability maps
         """
-        return self.rlzs_assoc.combine_pmaps(self.pmap_by_grp)
+        return self.rlzs_assoc.combine_pmaps(self.pmap_by_grp, rlzis)
 
     def get_hcurves(self, imtls=None):
         """
@@ -152,7 +226,7 @@ class PmapGetter(object):
                  for pmap in self.get_pmaps(self.sids)]
         return numpy.array(pmaps)
 
-    def items(self, kind=''):
+    def items(self, kind='', lazy=False):
         """
         Extract probability maps from the datastore, possibly generating
         on the fly the ones corresponding to the individual realizations.
@@ -161,12 +235,15 @@ class PmapGetter(object):
         :param kind:
             the kind of PoEs to extract; if not given, returns the realization
             if there is only one or the statistics otherwise.
+        :param lazy:
+            if True, the statistics are returned as HDF5 datasets, without
+            reading them in memory
         """
         num_rlzs = len(self.weights)
         if not kind:  # use default
             if 'hcurves' in self.dstore:
                 for k in sorted(self.dstore['hcurves']):
-                    yield k, self.dstore['hcurves/' + k].value
+                    yield k, self._get_stats(k, lazy)
             elif num_rlzs == 1:
                 yield 'mean', self.get(0)
             return
@@ -178,7 +255,11 @@ class PmapGetter(object):
             yield kind, self.get(int(kind[4:]))
         if 'hcurves' in self.dstore and kind in ('stats', 'all'):
             for k in sorted(self.dstore['hcurves']):
-                yield k, self.dstore['hcurves/' + k].value
+                yield k, self._get_stats(k, lazy)
+
+    def _get_stats(self, kind, lazy):
+        dset = self.dstore['hcurves/' + kind]
+        return dset if lazy else dset.value
 
     def get_mean(self, grp=None):
         """
@@ -259,10 +340,38 @@ class GmfDataGetter(collections.Mapping):
         return len(self.sids)
 
 
+class GmfBySite(object):
+    """
+    Columnar GMFs sorted by site, realization and event, with an index of
+    the offsets of the sites. Indexing by site ID returns a dictionary
+    rlzi -> array of GMFs, where the arrays are slices of the original one.
+
+    :param gmfdata: an array of dtype gmf_data_dt sorted by (sid, rlzi, eid)
+    :param num_sites: the total number of sites
+    """
+    def __init__(self, gmfdata, num_sites):
+        self.gmfdata = gmfdata
+        self.offsets = numpy.searchsorted(
+            gmfdata['sid'], numpy.arange(num_sites + 1))
+
+    def __getitem__(self, sid):
+        data = self.gmfdata[self.offsets[sid]:self.offsets[sid + 1]]
+        rlzis = numpy.unique(data['rlzi'])
+        starts = numpy.searchsorted(data['rlzi'], rlzis)
+        stops = numpy.searchsorted(data['rlzi'], rlzis, 'right')
+        return {int(rlzi): data[start:stop]
+                for rlzi, start, stop in zip(rlzis, starts, stops)}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
 class GmfGetter(object):
     """
-    An hazard getter with methods .gen_gmv and .get_hazard returning
-    ground motion values.
+    An hazard getter computing the ground motion fields as columnar
+    arrays of dtype gmf_data_dt: .gen_gmfdata yields them one per GSIM and
+    rupture, .get_gmfdata concatenates them sorted by (sid, rlzi, eid) and
+    .get_hazard wraps them in a :class:`GmfBySite` object.
     """
     def __init__(self, rlzs_by_gsim, ebruptures, sitecol, oqparam,
                  min_iml, samples=1):
@@ -277,8 +386,6 @@ class GmfGetter(object):
         self.I = len(oqparam.imtls)
         self.gmv_dt = numpy.dtype(
             [('sid', U32), ('eid', U64), ('gmv', (F32, (self.I,)))])
-        self.gmv_eid_dt = numpy.dtype(
-            [('gmv', (F32, (self.I,))), ('eid', U64)])
         self.cmaker = ContextMaker(
             rlzs_by_gsim,
             calc.filters.IntegrationDistance(oqparam.maximum_distance)
@@ -322,11 +429,13 @@ class GmfGetter(object):
         # dictionary eid -> index
         self.eid2idx = dict(zip(self.eids, range(len(self.eids))))
 
-    def gen_gmv(self):
+    def gen_gmfdata(self):
         """
         Compute the GMFs for the given realization and populate the .gmdata
-        array. Yields tuples of the form (sid, eid, imti, gmv).
+        array. Yields arrays of dtype gmf_data_dt, one per GSIM and rupture,
+        containing only the nonzero ground motion values.
         """
+        dt = self.oqparam.gmf_data_dt()
         sample = 0  # in case of sampling the realizations have a corresponding
         # sample number from 0 to the number of samples of the given src model
         for gs in self.rlzs_by_gsim:  # OrderedDict
@@ -344,51 +453,58 @@ class GmfGetter(object):
                 # NB: the trick for performance is to keep the call to
                 # compute.compute outside of the loop over the realizations
                 # it is better to have few calls producing big arrays
-                array = computer.compute(gs, num_events).transpose(1, 0, 2)
-                # shape (N, I, E)
+                array = computer.compute(gs, num_events).transpose(1, 2, 0)
+                # shape (N, E, I)
                 for i, miniml in enumerate(self.min_iml):  # gmv < minimum
-                    arr = array[:, i, :]
+                    arr = array[:, :, i]
                     arr[arr < miniml] = 0
+                tots = array.sum(axis=0)  # shape (E, I)
                 n = 0
                 for r, rlzi in enumerate(rlzs):
                     e = len(all_eids[r])
                     gmdata = self.gmdata[rlzi]
                     gmdata[-1] += e  # increase number of events
-                    for ei, eid in enumerate(all_eids[r]):
-                        gmf = array[:, :, n + ei]  # shape (N, I)
-                        tot = gmf.sum(axis=0)  # shape (I,)
-                        if not tot.sum():
-                            continue
-                        for i, val in enumerate(tot):
-                            gmdata[i] += val
-                        for sid, gmv in zip(sids, gmf):
-                            if gmv.sum():
-                                yield rlzi, sid, eid, gmv
+                    for tot in tots[n:n + e]:
+                        gmdata[:-1] += tot
                     n += e
+                # discard the sites with zero GMVs for all IMTs
+                sidx, eidx = (array.sum(axis=2) != 0).nonzero()
+                data = numpy.zeros(len(sidx), dt)
+                data['rlzi'] = numpy.repeat(
+                    rlzs, [len(eids) for eids in all_eids])[eidx]
+                data['sid'] = sids[sidx]
+                data['eid'] = numpy.concatenate(all_eids)[eidx]
+                data['gmv'] = array[sidx, eidx]
+                yield data
             sample += len(rlzs)
 
+    def get_gmfdata(self):
+        """
+        :returns: an array of dtype gmf_data_dt sorted by (sid, rlzi, eid)
+        """
+        data = list(self.gen_gmfdata())
+        if data:
+            gmfdata = numpy.concatenate(data)
+        else:
+            gmfdata = numpy.zeros(0, self.oqparam.gmf_data_dt())
+        gmfdata.sort(order=('sid', 'rlzi', 'eid'))
+        return gmfdata
+
     def get_hazard(self, data=None):
         """
-        :param data: if given, an iterator of records of dtype gmf_data_dt
-        :returns: an array (rlzi, sid, imti) -> array(gmv, eid)
+        :param data:
+            if given, an array of dtype gmf_data_dt sorted by (sid, rlzi, eid)
+        :returns: a GmfBySite object sid -> rlzi -> array of records
         """
         if data is None:
-            data = self.gen_gmv()
-        hazard = numpy.array([collections.defaultdict(list)
-                              for _ in range(self.N)])
-        for rlzi, sid, eid, gmv in data:
-            hazard[sid][rlzi].append((gmv, eid))
-        for haz in hazard:
-            for rlzi in haz:
-                haz[rlzi] = numpy.array(haz[rlzi], self.gmv_eid_dt)
-        return hazard
+            data = self.get_gmfdata()
+        return GmfBySite(data, self.N)
 
     def compute_gmfs_curves(self, monitor):
         """
         :returns: a dict with keys gmdata, gmfdata, indices, hcurves
         """
         oq = self.oqparam
-        dt = oq.gmf_data_dt()
         with monitor('GmfGetter.init', measuremem=True):
             self.init()
         hcurves = {}  # key -> poes
@@ -396,12 +512,10 @@ class GmfGetter(object):
             hc_mon = monitor('building hazard curves', measuremem=False)
             duration = oq.investigation_time * oq.ses_per_logic_tree_path
             with monitor('building hazard', measuremem=True):
-                gmfdata = numpy.fromiter(self.gen_gmv(), dt)
+                gmfdata = self.get_gmfdata()
                 hazard = self.get_hazard(data=gmfdata)
-            for sid, hazardr in zip(self.sids, hazard):
-                for rlzi, array in hazardr.items():
-                    if len(array) == 0:  # no data
-                        continue
+            for sid in self.sids:
+                for rlzi, array in hazard[sid].items():
                     with hc_mon:
                         gmvs = array['gmv']
                         for imti, imt in enumerate(oq.imtls):
@@ -411,19 +525,14 @@ class GmfGetter(object):
                             hcurves[rsi2str(rlzi, sid, imt)] = poes
         elif oq.ground_motion_fields:  # fast lane
             with monitor('building hazard', measuremem=True):
-                gmfdata = numpy.fromiter(self.gen_gmv(), dt)
+                gmfdata = self.get_gmfdata()
         else:
             return {}
-        indices = []
-        gmfdata.sort(order=('sid', 'rlzi', 'eid'))
-        start = stop = 0
-        for sid, rows in itertools.groupby(gmfdata['sid']):
-            for row in rows:
-                stop += 1
-            indices.append((sid, start, stop))
-            start = stop
+        sids = numpy.unique(gmfdata['sid'])
+        starts = numpy.searchsorted(gmfdata['sid'], sids)
+        stops = numpy.searchsorted(gmfdata['sid'], sids, 'right')
         res = dict(gmfdata=gmfdata, hcurves=hcurves, gmdata=self.gmdata,
-                   indices=numpy.array(indices, (U32, 3)))
+                   indices=numpy.array([sids, starts, stops], U32).T)
         return res
 
 
@@ -515,22 +624,22 @@ class RuptureGetter(object):
             if key.startswith('code_'):
                 code2cls[int(key[5:])] = [classes[v] for v in val.split()]
         grp_trt = self.dstore['csm_info'].grp_by("trt")
-        events = self.dstore['events']
         ruptures = self.dstore['ruptures'][self.mask]
-        rupgeoms = self.dstore['rupgeoms'][self.mask]
-        # NB: ruptures.sort(order='serial') causes sometimes a SystemError:
-        # <ufunc 'greater'> returned a result with an error set
-        # this is way I am sorting with Python and not with numpy below
-        data = sorted((serial, ridx) for ridx, serial in enumerate(
-            ruptures['serial']))
-        for serial, ridx in data:
+        if self.grp_id is not None:
+            ruptures = ruptures[ruptures['grp_id'] == self.grp_id]
+        if len(ruptures) == 0:
+            return
+        # read the events and the geometries of all the ruptures at once
+        e1, e2 = ruptures['eidx1'].min(), ruptures['eidx2'].max()
+        events = self.dstore['events'][e1:e2]
+        g1, g2 = ruptures['gidx1'].min(), ruptures['gidx2'].max()
+        rupgeoms = self.dstore['rupgeoms'][g1:g2]
+        for ridx in numpy.argsort(ruptures['serial'], kind='mergesort'):
             rec = ruptures[ridx]
-            evs = events[rec['eidx1']:rec['eidx2']]
-            if self.grp_id is not None and self.grp_id != rec['grp_id']:
-                continue
-            mesh = numpy.zeros((3, rec['sy'], rec['sz']), F32)
-            for i, arr in enumerate(rupgeoms[ridx]):  # i = 0, 1, 2
-                mesh[i] = arr.reshape(rec['sy'], rec['sz'])
+            serial = rec['serial']
+            evs = events[rec['eidx1'] - e1:rec['eidx2'] - e1]
+            mesh = rupgeoms[rec['gidx1'] - g1:rec['gidx2'] - g1].T.reshape(
+                3, rec['sy'], rec['sz'])
             rupture_cls, surface_cls = code2cls[rec['code']]
             rupture = object.__new__(rupture_cls)
             rupture.serial = serial
@@ -255,6 +255,34 @@ hazard_uhs-mean.csv
         export(('hmaps', 'npz'), self.calc.datastore)
         export(('uhs', 'npz'), self.calc.datastore)
 
+    @attr('qa', 'hazard', 'classical')
+    def test_case_1_pmap_cache(self):
+        # changing the investigation_time the cached curves are not reused
+        def get_poes(**kw):
+            self.run_calc(case_1.__file__, 'job.ini',
+                          pmap_cache_size='100000000', **kw)
+            return self.calc.datastore['poes/grp-00/array'].value
+
+        poes1 = get_poes(investigation_time='1')
+        poes2 = get_poes(investigation_time='10')
+        self.run_calc(case_1.__file__, 'job.ini', investigation_time='10')
+        expected = self.calc.datastore['poes/grp-00/array'].value
+        numpy.testing.assert_allclose(poes2, expected)
+        self.assertGreater(poes2.sum(), poes1.sum())
+
+    @attr('qa', 'hazard', 'classical')
+    def test_case_15_pmap_cache(self):
+        # the second calculation reads the hazard curves from the PmapCache
+        for _ in range(2):
+            self.assert_curves_ok('''\
+hazard_curve-max-PGA.csv,
+hazard_curve-max-SA(0.1).csv
+hazard_curve-mean-PGA.csv
+hazard_curve-mean-SA(0.1).csv
+hazard_uhs-max.csv
+hazard_uhs-mean.csv
+'''.split(), case_15.__file__, delta=1E-6, pmap_cache_size='100000000')
+
         # here is the size of assoc_by_grp for a complex logic tree
         # grp_id gsim_idx rlzis
         # 0	0	 {0, 1}
@@ -18,14 +18,17 @@
 import os
 import sys
 import unittest
+import mock
 import numpy
 from nose.plugins.attrib import attr
 
 from openquake.baselib.general import gettemp
+from openquake.baselib.performance import Monitor
 from openquake.calculators.views import view
 from openquake.calculators.tests import CalculatorTestCase, strip_calc_id
 from openquake.calculators.export import export
 from openquake.calculators.extract import extract
+from openquake.calculators.event_based_risk import event_based_risk
 from openquake.qa_tests_data.event_based_risk import (
     case_1, case_2, case_3, case_4, case_4a, case_6c, case_master, case_miriam,
     occupants, case_1g, case_7a)
@@ -146,7 +149,7 @@ class EventBasedRiskTestCase(CalculatorTestCase):
 
         # test the number of bytes saved in the rupture records
         nbytes = self.calc.datastore.get_attr('ruptures', 'nbytes')
-        self.assertEqual(nbytes, 1911)
+        self.assertEqual(nbytes, 2015)
 
         # test postprocessing
         self.calc.datastore.close()
@@ -287,3 +290,97 @@ class EventBasedRiskTestCase(CalculatorTestCase):
                             hazard_calculation_id=hc, concurrent_tasks='0')
         [fname] = out['avg_losses-rlzs', 'csv']
         self.assertEqualFiles('expected/avg_losses.csv', fname, delta=1E-5)
+
+
+class FakeAsset(object):
+    def __init__(self, ordinal, value):
+        self.ordinal = ordinal
+        self._value = value
+
+    def value(self, loss_type):
+        return self._value
+
+
+class FakeOutput(list):
+    # a list of loss ratios of shape (A, E, I), one per loss type
+    def __init__(self, loss_ratios, assets, eids, rlzi):
+        super().__init__(loss_ratios)
+        self.assets = assets
+        self.eids = eids
+        self.rlzi = rlzi
+
+
+class FakeHazardGetter(object):
+    def __init__(self, eids, num_rlzs):
+        self.eids = eids
+        self.num_rlzs = num_rlzs
+        self.eid2idx = {eid: idx for idx, eid in enumerate(eids)}
+
+    def init(self):
+        pass
+
+
+class FakeRiskModel(object):
+    loss_types = ['structural', 'nonstructural']
+    lti = {'structural': 0, 'nonstructural': 1}
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def gen_outputs(self, riskinput, monitor):
+        return iter(self.outputs)
+
+
+class EventBasedRiskKernelTestCase(unittest.TestCase):
+    # compare the vectorized event_based_risk task with a loop on the assets
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.eids = numpy.array([3, 7, 10, 12, 20], numpy.uint64)
+        self.aids = numpy.array([5, 1, 8, 2], numpy.uint32)  # unsorted
+        assets = [FakeAsset(aid, 1000. * (aid + 1)) for aid in self.aids]
+        self.outputs = []
+        for rlzi in range(2):
+            for site_assets in (assets[:3], assets[3:]):
+                eids = numpy.sort(rng.choice(self.eids, 3, replace=False))
+                ratios = [rng.random_sample((len(site_assets), 3, 2))
+                          .astype(numpy.float32) for _ in range(2)]
+                self.outputs.append(
+                    FakeOutput(ratios, site_assets, eids, rlzi))
+        self.riskinput = mock.Mock(
+            aids=self.aids, hazard_getter=FakeHazardGetter(self.eids, 2))
+        self.param = dict(insured_losses=True, avg_losses=True,
+                          ses_ratio=.5)
+
+    def loop(self):
+        # the algorithm used before the vectorization, asset by asset
+        E, R, L, I = len(self.eids), 2, 2, 2
+        agg = numpy.zeros((E, R, L * I), numpy.float32)
+        avg = {}  # (li, r) -> {aid: average loss ratio}
+        eid2idx = self.riskinput.hazard_getter.eid2idx
+        for out in self.outputs:
+            r = out.rlzi
+            indices = numpy.array([eid2idx[eid] for eid in out.eids])
+            for l, loss_ratios in enumerate(out):
+                for a, asset in enumerate(out.assets):
+                    ratios = loss_ratios[a]  # shape (E, I)
+                    losses = asset.value(None) * ratios
+                    rat = ratios.sum(axis=0) * self.param['ses_ratio']
+                    for i in range(I):
+                        lba = avg.setdefault((l + L * i, r), {})
+                        lba[asset.ordinal] = (
+                            lba.get(asset.ordinal, 0) + rat[i])
+                        agg[indices, r, l + L * i] += losses[:, i]
+        return agg, avg
+
+    def test(self):
+        res = event_based_risk(self.riskinput, FakeRiskModel(self.outputs),
+                               self.param, Monitor())
+        agg, avg = self.loop()
+        idx, values = res['agglosses']
+        numpy.testing.assert_equal(idx, agg.nonzero())
+        numpy.testing.assert_allclose(values, agg[idx], rtol=1E-6)
+        self.assertEqual(sorted(res['avglosses']), sorted(avg))
+        for key, array in res['avglosses'].items():
+            self.assertEqual(array.dtype, numpy.float64)
+            expected = [avg[key].get(aid, 0) for aid in self.aids]
+            numpy.testing.assert_allclose(array, expected, rtol=1E-6)
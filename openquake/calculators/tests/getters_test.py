@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2018 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import unittest
+import numpy
+from openquake.baselib import hdf5, general
+from openquake.commonlib import writers
+from openquake.calculators.getters import DatasetView
+
+
+class DatasetViewTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.dt = numpy.dtype([('rlzi', numpy.uint16), ('sid', numpy.uint32),
+                               ('eid', numpy.uint64),
+                               ('gmv', (numpy.float32, 2))])
+        self.array = numpy.zeros(1000, self.dt)
+        self.array['rlzi'] = rng.randint(0, 3, 1000)
+        self.array['sid'] = rng.randint(0, 10, 1000)
+        self.array['eid'] = rng.permutation(1000)
+        self.array['gmv'] = rng.random_sample((1000, 2))
+        self.fname = general.gettemp(suffix='.hdf5')
+        with hdf5.File(self.fname, 'w') as f:
+            f['data'] = self.array
+
+    def test_sorted_view(self):
+        # the rows are read in the order given, block by block
+        expected = numpy.sort(self.array, order=['rlzi', 'sid', 'eid'])
+        exp_dt = numpy.dtype([('rlzi', numpy.uint16), ('sid', numpy.uint32),
+                              ('eid', numpy.uint64),
+                              ('gmv_PGA', numpy.float32),
+                              ('gmv_PGV', numpy.float32)])
+        with hdf5.File(self.fname, 'r') as f:
+            dset = f['data']
+            order = numpy.lexsort([dset[k] for k in ('eid', 'sid', 'rlzi')])
+            for maxgap in (1, 10, 5000):
+                view = DatasetView(dset, exp_dt, order=order)
+                view.maxgap = maxgap
+                self.assertEqual(view.shape, (1000,))
+                numpy.testing.assert_equal(view[:], expected.view(exp_dt))
+                numpy.testing.assert_equal(
+                    view[100:200], expected[100:200].view(exp_dt))
+
+            # the CSV file is the same as the one of the array in memory
+            chunksize = writers.CHUNKSIZE
+            writers.CHUNKSIZE = 100 * self.dt.itemsize
+            try:
+                got = writers.write_csv(io.BytesIO(), view)
+            finally:
+                writers.CHUNKSIZE = chunksize
+        self.assertEqual(got, writers.write_csv(
+            io.BytesIO(), expected.view(exp_dt)))
+
+    def test_converted_view(self):
+        # the rows are converted chunk by chunk
+        def convert(rows, indices):
+            out = numpy.zeros(len(rows), [('idx', numpy.uint32),
+                                          ('tot', numpy.float32)])
+            out['idx'] = indices
+            out['tot'] = rows['gmv'].sum(axis=1)
+            return out
+        with hdf5.File(self.fname, 'r') as f:
+            view = DatasetView(f['data'], [('idx', numpy.uint32),
+                                           ('tot', numpy.float32)], convert)
+            self.assertEqual(view.shape, (1000,))
+            got = view[10:20]
+        numpy.testing.assert_equal(got['idx'], numpy.arange(10, 20))
+        numpy.testing.assert_equal(
+            got['tot'], self.array['gmv'][10:20].sum(axis=1))
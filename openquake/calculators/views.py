@@ -624,12 +624,16 @@ def view_task_hazard(token, dstore):
     data.sort(order='duration')
     rec = data[int(token.split(':')[1])]
     taskno = rec['taskno']
+    # a task split by the dynamic scheduler has the sources of its ancestor
+    parent = dict(zip(data['taskno'], data['parent']))
+    while parent.get(taskno):
+        taskno = parent[taskno]
     arr = get_array(dstore['source_data'].value, taskno=taskno)
     st = [stats('nsites', arr['nsites']), stats('weight', arr['weight'])]
     sources = dstore['task_sources'][taskno - 1].split()
     srcs = set(decode(s).split(':', 1)[0] for s in sources)
     res = 'taskno=%d, weight=%d, duration=%d s, sources="%s"\n\n' % (
-        taskno, rec['weight'], rec['duration'], ' '.join(sorted(srcs)))
+        rec['taskno'], rec['weight'], rec['duration'], ' '.join(sorted(srcs)))
     return res + rst_table(st, header='variable mean stddev min max n'.split())
 
 
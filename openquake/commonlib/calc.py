@@ -15,11 +15,14 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import hashlib
 import warnings
 import numpy
 
 from openquake.baselib import hdf5, general
-from openquake.baselib.python3compat import decode
+from openquake.baselib.python3compat import decode, encode
 from openquake.hazardlib.source.rupture import BaseRupture
 from openquake.hazardlib.geo.mesh import surface_to_array
 from openquake.hazardlib.gsim.base import ContextMaker
@@ -104,39 +107,52 @@ def compute_hazard_maps(curves, imls, poes):
         # `curves` was passed as 1 dimensional array, there is a single site
         curves = curves.reshape((1,) + curves.shape)  # 1 x L
 
-    L = curves.shape[1]  # number of levels
+    N, L = curves.shape  # number of curves and levels
     if L != len(imls):
         raise ValueError('The curves have %d levels, %d were passed' %
                          (L, len(imls)))
-    result = []
+    result = numpy.zeros((N, len(poes)))
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
         # avoid RuntimeWarning: divide by zero encountered in log
         # happening in the classical_tiling tests
         imls = numpy.log(numpy.array(imls[::-1]))
-    for curve in curves:
-        # the hazard curve, having replaced the too small poes with EPSILON
-        curve_cutoff = [max(poe, EPSILON) for poe in curve[::-1]]
-        hmap_val = []
-        for poe in poes:
-            # special case when the interpolation poe is bigger than the
-            # maximum, i.e the iml must be smaller than the minumum
-            if poe > curve_cutoff[-1]:  # the greatest poes in the curve
-                # extrapolate the iml to zero as per
-                # https://bugs.launchpad.net/oq-engine/+bug/1292093
-                # a consequence is that if all poes are zero any poe > 0
-                # is big and the hmap goes automatically to zero
-                hmap_val.append(0)
-            else:
-                # exp-log interpolation, to reduce numerical errors
-                # see https://bugs.launchpad.net/oq-engine/+bug/1252770
-                val = numpy.exp(
-                    numpy.interp(
-                        numpy.log(poe), numpy.log(curve_cutoff), imls))
-                hmap_val.append(val)
-
-        result.append(hmap_val)
-    return numpy.array(result)
+        # the hazard curves, having replaced the too small poes with EPSILON;
+        # the reversed curves are nondecreasing, as required by numpy.interp
+        curves = curves[:, ::-1]
+        small = (curves < EPSILON).any(axis=1)
+        # the logarithms are taken in the precision of the curves, except
+        # for the curves containing the cutoff
+        logcurves = numpy.log(curves).astype(F64)
+        cutoff = numpy.maximum(curves[small].astype(F64), EPSILON)
+        logcurves[small] = numpy.log(cutoff)
+    maxpoes = numpy.maximum(curves[:, -1].astype(F64), EPSILON)
+    rows = numpy.arange(N)
+    for p, poe in enumerate(poes):
+        # when the interpolation poe is bigger than the maximum, i.e. the
+        # iml must be smaller than the minimum, extrapolate the iml to zero
+        # as per https://bugs.launchpad.net/oq-engine/+bug/1292093;
+        # a consequence is that if all poes are zero any poe > 0
+        # is big and the hmap goes automatically to zero
+        ok = poe <= maxpoes
+        if L == 1:
+            result[ok, p] = numpy.exp(imls[0])
+            continue
+        # exp-log interpolation, to reduce numerical errors, see
+        # https://bugs.launchpad.net/oq-engine/+bug/1252770; this is
+        # numpy.interp(log(poe), logcurve, imls) for all curves at once
+        x = numpy.log(poe)
+        j = (logcurves <= x).sum(axis=1) - 1  # logcurve[j] <= x < [j+1]
+        k = numpy.clip(j, 0, L - 2)
+        x0, x1 = logcurves[rows, k], logcurves[rows, k + 1]
+        y0, y1 = imls[k], imls[k + 1]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            val = (y1 - y0) / (x1 - x0) * (x - x0) + y0
+        val[x0 == x] = y0[x0 == x]  # avoid non-finite values
+        val[j == -1] = imls[0]  # poe smaller than the curve
+        val[j == L - 1] = imls[-1]  # poe equal to the maximum of the curve
+        result[ok, p] = numpy.exp(val[ok])
+    return result
 
 
 # #########################  GMF->curves #################################### #
@@ -215,9 +231,7 @@ def make_hmap(pmap, imtls, poes):
                               for sid in pmap.sids])
         data = compute_hazard_maps(curves, imtls[imt], poes)  # array (N, P)
         for sid, value in zip(pmap.sids, data):
-            array = hmap[sid].array
-            for j, val in enumerate(value):
-                array[i * P + j] = val
+            hmap[sid].array[i * P:(i + 1) * P, 0] = value
     return hmap
 
 
@@ -225,7 +239,8 @@ def make_hmap_array(pmap, imtls, poes, nsites):
     """
     :returns: a compound array of hazard maps of shape nsites
     """
-    if isinstance(pmap, probability_map.ProbabilityMap):
+    if isinstance(pmap, (probability_map.ProbabilityMap,
+                         probability_map.DenseProbabilityMap)):
         # this is here for compatibility with the
         # past, it could be removed in the future
         hmap = make_hmap(pmap, imtls, poes)
@@ -239,10 +254,9 @@ def make_hmap_array(pmap, imtls, poes, nsites):
               for imt in imtls for poe in poes]
     array = numpy.zeros(len(pmap), dtlist)
     for imt, imls in imtls.items():
-        curves = hcurves[:, imtls(imt)]
-        for poe in poes:
-            array['%s-%s' % (imt, poe)] = compute_hazard_maps(
-                curves, imls, poe).flat
+        data = compute_hazard_maps(hcurves[:, imtls(imt)], imls, poes)
+        for p, poe in enumerate(poes):
+            array['%s-%s' % (imt, poe)] = data[:, p]
     return array  # array of shape N
 
 
@@ -274,6 +288,118 @@ def make_uhs(hcurves, imtls, poes, nsites):
     return uhs
 
 
+def get_site_hashes(sitecol):
+    """
+    :param sitecol: a SiteCollection
+    :returns: an array of 64 bit hashes of the site parameters, one per site
+    """
+    array = sitecol.array
+    dt = numpy.dtype([(name, array.dtype[name]) for name in array.dtype.names
+                      if name != 'sids'])
+    params = numpy.zeros(len(array), dt)
+    for name in dt.names:
+        params[name] = array[name]
+    return numpy.array([int.from_bytes(hashlib.md5(rec.tobytes()).digest()[:8],
+                                       'little') for rec in params], U64)
+
+
+class PmapCache(object):
+    """
+    A persistent cache of hazard curves, stored in an HDF5 file and keyed
+    by source and GSIM. An entry contains the PoEs of a single source for
+    a single GSIM on the sites it was computed for; the sites are
+    identified by the hashes returned by :func:`get_site_hashes`, so that
+    an entry can be reused when new sites are added to the calculation.
+    When the cached arrays exceed `maxsize` bytes the least recently used
+    entries are discarded.
+
+    :param path: path to the HDF5 file
+    :param maxsize: maximum size of the cache in bytes
+    """
+    @staticmethod
+    def get_key(*objs):
+        """
+        :param objs: objects with a reproducible repr
+        :returns: a string with the MD5 digest of their repr
+        """
+        return hashlib.md5(encode(repr(objs))).hexdigest()
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._hdf5 = None
+
+    @property
+    def hdf5(self):
+        # the file is opened lazily, after the prefiltering, otherwise the
+        # forked processes would inherit the descriptor and keep it locked
+        if self._hdf5 is None:
+            self._hdf5 = hdf5.File(self.path, 'a')
+        return self._hdf5
+
+    def get(self, key):
+        """
+        :param key: a string returned by .get_key
+        :returns: a triple (hashes, poes, eff_ruptures) or None
+        """
+        try:
+            grp = self.hdf5[key]
+        except KeyError:
+            return None
+        grp.attrs['atime'] = time.time()
+        return grp['hashes'][()], grp['poes'][()], grp.attrs['eff_ruptures']
+
+    def update(self, key, hashes, poes, eff_ruptures):
+        """
+        Store the PoEs of the sites with the given hashes, replacing the
+        ones already cached for the same sites.
+
+        :param key: a string returned by .get_key
+        :param hashes: an array of N site hashes
+        :param poes: an array of shape (N, L)
+        :param eff_ruptures: the number of contributing ruptures
+        """
+        old = self.get(key)
+        if old is not None:
+            keep = ~numpy.in1d(old[0], hashes)
+            hashes = numpy.concatenate([old[0][keep], hashes])
+            poes = numpy.concatenate([old[1][keep], poes])
+            eff_ruptures = max(eff_ruptures, old[2])
+            del self.hdf5[key]
+        grp = self.hdf5.create_group(key)
+        grp['hashes'] = hashes
+        grp['poes'] = poes
+        grp.attrs['atime'] = time.time()
+        grp.attrs['eff_ruptures'] = eff_ruptures
+        grp.attrs['nbytes'] = hashes.nbytes + poes.nbytes
+
+    def close(self):
+        """
+        Discard the least recently used entries exceeding the maximum size
+        and close the file
+        """
+        if self._hdf5 is None:  # never opened
+            return
+        entries = sorted(((grp.attrs['atime'], grp.attrs['nbytes'], key)
+                          for key, grp in self.hdf5.items()), reverse=True)
+        size = 0
+        discarded = []
+        for atime, nbytes, key in entries:
+            size += nbytes
+            if size > self.maxsize:
+                discarded.append(key)
+        for key in discarded:
+            del self.hdf5[key]
+        self._hdf5.close()
+        self._hdf5 = None
+        if discarded:  # HDF5 does not reclaim the space of deleted entries
+            tmp = self.path + '.tmp'
+            with hdf5.File(self.path, 'r') as old, hdf5.File(tmp, 'w') as new:
+                for key in old:
+                    old.copy(key, new)
+            os.replace(tmp, self.path)
+
+
 def fix_minimum_intensity(min_iml, imts):
     """
     :param min_iml: a dictionary, possibly with a 'default' key
@@ -349,20 +475,29 @@ class RuptureData(object):
 class RuptureSerializer(object):
     """
     Serialize event based ruptures on an HDF5 files. Populate the datasets
-    `ruptures` and `sids`.
+    `ruptures` and `rupgeoms`. The geometries are stored in a flat array
+    of points (lon, lat, depth) and the rupture with index `ridx` owns the
+    points `rupgeoms[ruptures[ridx]['gidx1']:ruptures[ridx]['gidx2']]`;
+    unlike a variable-length dataset, this can be read in bulk and
+    compressed by the HDF5 filters.
     """
     rupture_dt = numpy.dtype([
         ('serial', U32), ('grp_id', U16), ('code', U8),
         ('eidx1', U32), ('eidx2', U32), ('pmfx', I32), ('seed', U32),
         ('mag', F32), ('rake', F32), ('occurrence_rate', F32),
-        ('hypo', (F32, 3)), ('sy', U16), ('sz', U16)])
+        ('hypo', (F32, 3)), ('sy', U16), ('sz', U16),
+        ('gidx1', U32), ('gidx2', U32)])
 
     pmfs_dt = numpy.dtype([('serial', U32), ('pmf', hdf5.vfloat32)])
 
     @classmethod
-    def get_array_nbytes(cls, ebruptures):
+    def get_array_nbytes(cls, ebruptures, gidx=0):
         """
-        Convert a list of EBRuptures into a numpy composite array
+        Convert a list of EBRuptures into a numpy composite array and
+        an array of points of shape (P, 3)
+
+        :param ebruptures: a list of EBRuptures
+        :param gidx: the number of points already stored
         """
         lst = []
         geom = []
@@ -379,21 +514,24 @@ class RuptureSerializer(object):
             tup = (ebrupture.serial, ebrupture.grp_id, rup.code,
                    ebrupture.eidx1, ebrupture.eidx2,
                    getattr(ebrupture, 'pmfx', -1),
-                   rup.seed, rup.mag, rup.rake, rate, hypo, sy, sz)
+                   rup.seed, rup.mag, rup.rake, rate, hypo, sy, sz,
+                   gidx, gidx + sy * sz)
             lst.append(tup)
-            geom.append(mesh.reshape(3, -1))
+            geom.append(mesh.reshape(3, -1).T)
+            gidx += sy * sz
             nbytes += cls.rupture_dt.itemsize + mesh.nbytes
+        geom = numpy.concatenate(geom) if geom else numpy.zeros((0, 3), F32)
         return numpy.array(lst, cls.rupture_dt), geom, nbytes
 
     def __init__(self, datastore):
         self.datastore = datastore
         self.nbytes = 0
         self.nruptures = 0
+        self.npoints = 0
         if datastore['oqparam'].save_ruptures:
             datastore.create_dset('ruptures', self.rupture_dt, fillvalue=None,
                                   attrs={'nbytes': 0})
-            datastore.create_dset('rupgeoms', hdf5.vfloat32,
-                                  shape=(None, 3), fillvalue=None)
+            datastore.create_dset('rupgeoms', F32, shape=(None, 3))
 
     def save(self, ebruptures, eidx=0):
         """
@@ -417,11 +555,12 @@ class RuptureSerializer(object):
                 pmfbytes += self.pmfs_dt.itemsize + rup.pmf.nbytes
 
         # store the ruptures in a compact format
-        array, geom, nbytes = self.get_array_nbytes(ebruptures)
+        array, geom, nbytes = self.get_array_nbytes(ebruptures, self.npoints)
+        self.npoints += len(geom)
         previous = self.datastore.get_attr('ruptures', 'nbytes', 0)
         dset = self.datastore.extend(
             'ruptures', array, nbytes=previous + nbytes)
-        self.datastore.hdf5.save_vlen('rupgeoms', geom)
+        self.datastore.extend('rupgeoms', geom)
 
         # save nbytes occupied by the PMFs
         if pmfbytes:
@@ -28,13 +28,17 @@ import os
 import re
 import sys
 import copy
+import shutil
+import hashlib
+import logging
 import itertools
 import collections
 import operator
 from collections import namedtuple
 from decimal import Decimal
 import numpy
-from openquake.baselib import hdf5, node, performance, parallel
+from openquake.baselib import (
+    hdf5, node, performance, parallel, __version__)
 from openquake.baselib.general import groupby
 from openquake.baselib.python3compat import raise_
 import openquake.hazardlib.source as ohs
@@ -1472,7 +1476,29 @@ class GsimLogicTree(object):
         return '<%s\n%s>' % (self.__class__.__name__, '\n'.join(lines))
 
 
-def parallel_pickle_source_models(gsim_lt, source_model_lt, converter):
+def get_source_model_key(fname, converter):
+    """
+    :param fname: path to a source model file
+    :param converter:
+        a :class:`openquake.hazardlib.sourceconverter.SourceConverter` instance
+    :returns:
+        the MD5 digest of the content of the file, of the parameters of the
+        converter and of the engine version
+    """
+    params = (__version__, converter.tom.time_span,
+              converter.rupture_mesh_spacing,
+              converter.complex_fault_mesh_spacing,
+              converter.width_of_mfd_bin,
+              converter.area_source_discretization)
+    md5 = hashlib.md5(repr(params).encode('utf8'))
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def parallel_pickle_source_models(gsim_lt, source_model_lt, converter,
+                                  cachedir=None):
     """
     Convert the source model files listed in the logic tree
     into picked files.
@@ -1481,6 +1507,9 @@ def parallel_pickle_source_models(gsim_lt, source_model_lt, converter):
     :param source_model_lt: a :class:`SourceModelLogicTree` instance
     :param converter:
         a :class:`openquake.hazardlib.sourceconverter.SourceConverter` instance
+    :param cachedir:
+        if given, a directory where the pickled files are kept, named after
+        :func:`get_source_model_key`, so that a file is converted only once
     :returns: a dictionary file -> file.pik
     """
     smlt_dir = os.path.dirname(source_model_lt.filename)
@@ -1488,10 +1517,33 @@ def parallel_pickle_source_models(gsim_lt, source_model_lt, converter):
     for sm in source_model_lt.gen_source_models(gsim_lt):
         for name in sm.names.split():
             fnames.add(os.path.abspath(os.path.join(smlt_dir, name)))
+    dic = {}
+    if cachedir:
+        cached = {fname: os.path.join(
+            cachedir, get_source_model_key(fname, converter) + '.pik')
+            for fname in fnames}
+        for fname, pik in cached.items():
+            if os.path.exists(pik):
+                dic[fname] = pik
+        if dic:
+            logging.info('Read %d source model(s) from %s',
+                         len(dic), cachedir)
+        fnames -= set(dic)
+    if not fnames:
+        return dic
     monitor = performance.Monitor('cache source models')
     dist = 'no' if os.environ.get('OQ_DISTRIBUTE') == 'no' else 'processpool'
-    dic = parallel.Starmap.apply(nrml.pickle_source_models,
+    new = parallel.Starmap.apply(nrml.pickle_source_models,
                                  (sorted(fnames), converter, monitor),
                                  distribute=dist).reduce()
     parallel.Starmap.shutdown()  # close the processpool
+    if cachedir:
+        os.makedirs(cachedir, exist_ok=True)
+        for fname, pik in new.items():
+            # copy and rename, so that a concurrent job never reads
+            # a partially written file
+            tmp = cached[fname] + '.%d' % os.getpid()
+            shutil.copy(pik, tmp)
+            os.replace(tmp, cached[fname])
+    dic.update(new)
     return dic
@@ -53,6 +53,7 @@ class OqParam(valid.ParamSet):
     asset_life_expectancy = valid.Param(valid.positivefloat)
     avg_losses = valid.Param(valid.boolean, True)
     base_path = valid.Param(valid.utf8, '.')
+    cache_source_models = valid.Param(valid.boolean, False)
     calculation_mode = valid.Param(valid.Choice(), '')  # -> get_oqparam
     coordinate_bin_width = valid.Param(valid.positivefloat)
     compare_with_classical = valid.Param(valid.boolean, False)
@@ -108,8 +109,12 @@ class OqParam(valid.ParamSet):
     number_of_ground_motion_fields = valid.Param(valid.positiveint)
     number_of_logic_tree_samples = valid.Param(valid.positiveint, 0)
     num_epsilon_bins = valid.Param(valid.positiveint)
+    pmap_cache_size = valid.Param(valid.positiveint, 0)
     poes = valid.Param(valid.probabilities, [])
     poes_disagg = valid.Param(valid.probabilities, [])
+    pointsource_collapse_factor = valid.Param(
+        valid.NoneOr(valid.positivefloat), None)
+    quantile_error = valid.Param(valid.FloatRange(1E-4, .5), .01)
     quantile_hazard_curves = valid.Param(valid.probabilities, [])
     quantile_loss_curves = valid.Param(valid.probabilities, [])
     random_seed = valid.Param(valid.positiveint, 42)
@@ -135,17 +140,25 @@ class OqParam(valid.ParamSet):
     ses_per_logic_tree_path = valid.Param(valid.positiveint, 1)
     ses_seed = valid.Param(valid.positiveint, 42)
     max_site_model_distance = valid.Param(valid.positivefloat, 5)  # by Graeme
+    max_task_duration = valid.Param(valid.NoneOr(valid.positivefloat), None)
     shakemap_id = valid.Param(valid.nice_string, None)
     site_effects = valid.Param(valid.boolean, True)  # shakemap amplification
+    # absolute error on the PoEs, the relative error on the small PoEs
+    # can be very large
+    sf_accuracy = valid.Param(valid.NoneOr(valid.positivefloat), None)
     sites = valid.Param(valid.NoneOr(valid.coordinates), None)
     sites_disagg = valid.Param(valid.NoneOr(valid.coordinates), [])
+    sites_per_tile = valid.Param(valid.positiveint, 100)  # for disagg
     sites_slice = valid.Param(valid.simple_slice, (None, None))
     sm_lt_path = valid.Param(valid.logic_tree_path, None)
     specific_assets = valid.Param(valid.namelist, [])
+    stats_memory = valid.Param(valid.positiveint, 512 * 1024 ** 2)
     taxonomies_from_model = valid.Param(valid.boolean, False)
     time_event = valid.Param(str, None)
     truncation_level = valid.Param(valid.NoneOr(valid.positivefloat), None)
     uniform_hazard_spectra = valid.Param(valid.boolean, False)
+    vectorize_ruptures = valid.Param(valid.boolean, False)
+    vectorized_sampling = valid.Param(valid.boolean, False)
     width_of_mfd_bin = valid.Param(valid.positivefloat, None)
 
     @property
@@ -27,7 +27,7 @@ import configparser
 import collections
 import numpy
 
-from openquake.baselib import hdf5
+from openquake.baselib import hdf5, datastore
 from openquake.baselib.general import (
     AccumDict, DictArray, deprecated, random_filter)
 from openquake.baselib.python3compat import decode, zip
@@ -533,8 +533,10 @@ def get_source_models(oqparam, gsim_lt, source_model_lt, in_memory=True):
         [grp] = nrml.to_python(oqparam.inputs["source_model"], converter)
     elif in_memory:
         logging.info('Pickling the source model(s)')
+        cachedir = (os.path.join(datastore.get_datadir(), 'source_models')
+                    if oqparam.cache_source_models else None)
         pik = logictree.parallel_pickle_source_models(
-            gsim_lt, source_model_lt, converter)
+            gsim_lt, source_model_lt, converter, cachedir)
 
     # consider only the effective realizations
     smlt_dir = os.path.dirname(source_model_lt.filename)
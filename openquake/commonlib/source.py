@@ -30,7 +30,7 @@ from openquake.baselib.python3compat import decode
 from openquake.baselib.general import (
     groupby, group_array, gettemp, AccumDict, random_filter, cached_property)
 from openquake.hazardlib import (
-    source, sourceconverter, probability_map, stats, contexts)
+    source, sourceconverter, stats, contexts)
 from openquake.hazardlib.gsim.gmpe_table import GMPETable
 from openquake.commonlib import logictree
 
@@ -261,22 +261,27 @@ class RlzsAssoc(object):
         """Array with the weight of the realizations"""
         return numpy.array([rlz.weight for rlz in self.realizations])
 
-    def combine_pmaps(self, pmap_by_grp):
+    def combine_pmaps(self, pmap_by_grp, rlzis=None):
         """
         :param pmap_by_grp: dictionary group string -> probability map
+        :param rlzis: the indices of the realizations (default all)
         :returns: a list of probability maps, one per realization
         """
         grp = list(pmap_by_grp)[0]  # pmap_by_grp must be non-empty
         num_levels = pmap_by_grp[grp].shape_y
-        pmaps = [probability_map.ProbabilityMap(num_levels, 1)
-                 for _ in self.realizations]
+        cls = pmap_by_grp[grp].__class__  # dense or dict-based map
+        if rlzis is None:
+            rlzis = range(len(self.realizations))
+        pmaps = {rlzi: cls(num_levels, 1) for rlzi in rlzis}
         array = self.by_grp()
         for grp in pmap_by_grp:
-            for gsim_idx, rlzis in array[grp]:
-                pmap = pmap_by_grp[grp].extract(gsim_idx)
-                for rlzi in rlzis:
+            for gsim_idx, gsim_rlzis in array[grp]:
+                rlzis_ = [rlzi for rlzi in gsim_rlzis if rlzi in pmaps]
+                if rlzis_:
+                    pmap = pmap_by_grp[grp].extract(gsim_idx)
+                for rlzi in rlzis_:
                     pmaps[rlzi] |= pmap
-        return pmaps
+        return [pmaps[rlzi] for rlzi in rlzis]
 
     def compute_pmap_stats(self, pmap_by_grp, statfuncs):
         """
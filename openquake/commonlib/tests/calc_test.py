@@ -1,3 +1,4 @@
+import os
 import unittest
 import numpy
 from openquake.baselib import general
@@ -64,3 +65,50 @@ class HazardMapsTestCase(unittest.TestCase):
         ]
         actual = calc.compute_hazard_maps(numpy.array(curves), imls, poes)
         aaae(expected, actual.T)
+
+    def test_compute_hazard_map_flat(self):
+        # curves with repeated poes and poes equal to the levels of the curves
+        curves = numpy.array([
+            [1., 1., 0.5, 0.5, 0.],
+            [0.5, 0.2, 0.2, 0.2, 0.1],
+            [0., 0., 0., 0., 0.]])
+        imls = [0.1, 0.2, 0.3, 0.4, 0.5]
+        poes = [1., 0.5, 0.2, 0.01]
+        expected = [[0.1, 0.3, 0.4011978, 0.4051388],
+                    [0, 0.1, 0.2, 0.5],
+                    [0, 0, 0, 0]]
+        actual = calc.compute_hazard_maps(curves, imls, poes)
+        aaae(expected, actual)
+        # a single level
+        actual = calc.compute_hazard_maps(curves[:, :1], imls[:1], poes)
+        aaae([[0.1] * 4, [0, 0.1, 0.1, 0.1], [0] * 4], actual)
+
+
+class PmapCacheTestCase(unittest.TestCase):
+
+    def test_update_and_evict(self):
+        path = general.gettemp(suffix='.hdf5')
+        os.remove(path)
+        poes = numpy.array([[.3, .2], [.2, .1], [.1, .05]])
+        cache = calc.PmapCache(path, maxsize=200)
+        key1 = cache.get_key('src1', 'BooreAtkinson2008()')
+        key2 = cache.get_key('src2', 'BooreAtkinson2008()')
+        self.assertIsNone(cache.get(key1))
+        cache.update(key1, numpy.uint64([1, 2]), poes[:2], 10)
+        cache.update(key2, numpy.uint64([1]), poes[:1], 5)
+        # adding a site and recomputing the site 2
+        cache.update(key1, numpy.uint64([2, 3]), poes[1:] / 2, 8)
+        hashes, array, eff_ruptures = cache.get(key1)
+        numpy.testing.assert_equal(hashes, [1, 2, 3])
+        aaae(array, [poes[0], poes[1] / 2, poes[2] / 2])
+        self.assertEqual(eff_ruptures, 10)
+        cache.close()
+
+        # key2 was the least recently used entry and it is discarded
+        cache = calc.PmapCache(path, maxsize=80)
+        cache.get(key1)
+        cache.close()
+        cache = calc.PmapCache(path, maxsize=80)
+        self.assertIsNone(cache.get(key2))
+        self.assertIsNotNone(cache.get(key1))
+        cache.close()
@@ -802,6 +802,24 @@ class GetCompositeSourceModelTestCase(unittest.TestCase):
         srcs = csm.get_sources()  # a single PointSource
         self.assertEqual(len(srcs), 1)
 
+    def test_cache_source_models(self):
+        cachedir = tempfile.mkdtemp()
+        oq = readinput.get_oqparam('job.ini', case_2)
+        oq.cache_source_models = True
+        with mock.patch('openquake.baselib.datastore.get_datadir',
+                        lambda: cachedir):
+            csm1 = readinput.get_composite_source_model(oq)
+            piks = os.listdir(os.path.join(cachedir, 'source_models'))
+            self.assertEqual(len(piks), 1)
+            # the second time the source model is read from the cache
+            with mock.patch('openquake.baselib.parallel.Starmap.apply') as p:
+                csm2 = readinput.get_composite_source_model(oq)
+            self.assertFalse(p.called)
+        shutil.rmtree(cachedir)
+        [src1], [src2] = csm1.get_sources(), csm2.get_sources()
+        self.assertEqual(src1.source_id, src2.source_id)
+        self.assertEqual(src1.num_ruptures, src2.num_ruptures)
+
     def test_reduce_source_model(self):
         case2 = os.path.dirname(case_2.__file__)
         smlt = os.path.join(case2, 'source_model_logic_tree.xml')
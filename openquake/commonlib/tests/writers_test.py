@@ -21,6 +21,8 @@ import unittest
 import tempfile
 from io import BytesIO
 import psutil
+from openquake.baselib import hdf5, general
+from openquake.commonlib import writers
 from openquake.commonlib.writers import write_csv
 from openquake.baselib.performance import memory_rss
 from openquake.baselib.node import Node, tostring, StreamingXMLWriter
@@ -128,3 +130,24 @@ class WriteCsvTestCase(unittest.TestCase):
         self.assert_export(
             a, 'A~PGA:int32:3,A~PGV:int32:4,B~PGA:int32:3,B~PGV:int32:4,'
             'idx:int32\n1 2 3,4 5 6 7,1 2 4,3 5 6 7,8\n')
+
+    def test_hdf5_chunks(self):
+        # a dataset read in chunks of 2 rows, with negative zeros
+        dt = numpy.dtype([('lon', float), ('lat', float),
+                          ('poe', numpy.float32)])
+        a = numpy.array([(0, -0., -0.), (1, 1, .1), (2, 2, -.2)], dt)
+        fname = general.gettemp(suffix='.hdf5')
+        with hdf5.File(fname, 'w') as f:
+            f['a'] = a
+        chunksize = writers.CHUNKSIZE
+        writers.CHUNKSIZE = 2 * dt.itemsize
+        try:
+            with hdf5.File(fname, 'r') as f:
+                self.assert_export(f['a'], '''\
+lon,lat,poe
+0.00000,-0.00000,0.000000E+00
+1.00000,1.00000,1.000000E-01
+2.00000,2.00000,-2.000000E-01
+''')
+        finally:
+            writers.CHUNKSIZE = chunksize
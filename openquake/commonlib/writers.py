@@ -20,14 +20,23 @@ import os
 import re
 import ast
 import logging
+import operator
+import itertools
+import functools
 import tempfile
 import numpy  # this is needed by the doctests, don't remove it
 from openquake.baselib.hdf5 import ArrayWrapper
 from openquake.hazardlib import InvalidFile
-from openquake.baselib.node import scientificformat
+from openquake.baselib.node import scientificformat, zeroset
 from openquake.baselib.python3compat import encode
 
+F32 = numpy.float32
+F64 = numpy.float64
+
 FIVEDIGITS = '%.5E'
+CHUNKSIZE = 1024 ** 2  # bytes of data formatted at once by write_csv
+# formats of floats which can be applied to whole columns in write_csv
+BULKFMT = re.compile(r'%[-+ #0]*\d*(\.\d+)?[eEfFgG]$')
 
 
 class HeaderTranslator(object):
@@ -183,16 +192,71 @@ def extract_from(data, fields):
     return data
 
 
+def _format_column(col, fmt, fixzero=True):
+    # returns a format string for a cell of the column and a list with the
+    # values of each cell, giving the same result as scientificformat
+    # (or as fmt % value if fixzero is False)
+    kind = col.dtype.kind
+    if col.dtype in (F32, F64) and BULKFMT.match(fmt):
+        # scientificformat converts '-0.0000000E+00' into '0.0000000E+00'
+        neg = numpy.signbit(col) & (col > -1) if fixzero else None
+        if neg is not None and neg.any():
+            col = col.copy()
+            for idx in zip(*numpy.where(neg)):
+                fmt_value = fmt % col[idx]
+                if set(fmt_value) <= zeroset:
+                    if fmt % 0. != fmt_value.replace('-', ''):
+                        return _format_column(col.astype(object), fmt)
+                    col[idx] = 0.
+        cellfmt = fmt
+    elif kind in 'iub':
+        cellfmt = '%s'
+    elif kind == 'S':
+        col = numpy.char.decode(col, 'utf8')
+        cellfmt = '%s'
+    elif kind == 'U':
+        cellfmt = '%s'
+    elif fixzero:  # format value by value
+        return '%s', [[scientificformat(val, fmt)] for val in col]
+    else:
+        return '%s', [[fmt % val] for val in col]
+    shape = col.shape[1:]
+    for i, size in enumerate(reversed(shape)):
+        # the outer dimension is separated by spaces, the others by colons
+        cellfmt = (' ' if i == len(shape) - 1 else ':').join([cellfmt] * size)
+    return cellfmt, col.reshape(len(col), -1).tolist()
+
+
+def _write_chunks(dest, data, columns, sep):
+    # write the rows of data, chunk by chunk; `columns` is a list of triples
+    # (extract, fmt, fixzero) where extract is a function chunk -> column
+    rowsize = data.dtype.itemsize * numpy.prod(data.shape[1:], dtype=int)
+    chunksize = max(1, CHUNKSIZE // max(rowsize, 1))
+    for start in range(0, len(data), chunksize):
+        chunk = data[start:start + chunksize]
+        cellfmts, values = [], []
+        for extract, fmt, fixzero in columns:
+            cellfmt, vals = _format_column(extract(chunk), fmt, fixzero)
+            cellfmts.append(cellfmt)
+            values.append(vals)
+        rowfmt = sep.replace('%', '%%').join(cellfmts) + '\n'
+        flat = itertools.chain.from_iterable(
+            itertools.chain.from_iterable(zip(*values)))
+        dest.write(encode((rowfmt * len(chunk)) % tuple(flat)))
+
+
 def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None):
     """
     :param dest: None, file, filename or io.BytesIO instance
-    :param data: array to save
+    :param data: array to save (or a HDF5 dataset, read in chunks)
     :param sep: separator to use (default comma)
     :param fmt: formatting string (default '%12.8E')
     :param header:
        optional list with the names of the columns to display
     :param comment:
        optional first line starting with a # character
+
+    The numpy arrays are formatted a column at the time, by chunks of rows.
     """
     close = True
     if dest is None:  # write on a temporary file
@@ -222,17 +286,19 @@ def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None):
         dest.write(encode(sep.join(htranslator.write(someheader)) + u'\n'))
 
     if autoheader:
-        all_fields = [col.split(':', 1)[0].split('~')
-                      for col in autoheader]
-        for record in data:
-            row = []
-            for fields in all_fields:
-                val = extract_from(record, fields)
-                if fields[0] in ('lon', 'lat', 'depth'):
-                    row.append('%.5f' % val)
-                else:
-                    row.append(scientificformat(val, fmt))
-            dest.write(encode(sep.join(row) + u'\n'))
+        columns = []
+        for col in autoheader:
+            fields = col.split(':', 1)[0].split('~')
+            extract = functools.partial(extract_from, fields=fields)
+            if fields[0] in ('lon', 'lat', 'depth'):
+                columns.append((extract, '%.5f', False))
+            else:
+                columns.append((extract, fmt, True))
+        _write_chunks(dest, data, columns, sep)
+    elif hasattr(data, 'dtype') and len(data.shape) > 1:
+        columns = [(operator.itemgetter((slice(None), i)), fmt, True)
+                   for i in range(data.shape[1])]
+        _write_chunks(dest, data, columns, sep)
     else:
         for row in data:
             dest.write(encode(sep.join(scientificformat(col, fmt)
@@ -69,6 +69,22 @@ def make_iml4(R, iml_disagg, imtls=None, poes_disagg=(None,), curves=()):
     return ArrayWrapper(arr, dict(poes_disagg=poes_disagg, imts=imts))
 
 
+def _gen_bin_data(sources, sitecol, cmaker, iml4, truncnorm, epsilons,
+                  monitor):
+    # yield the bin data of the sources, one source at the time; the
+    # ruptures are streamed, not stored in a list
+    for source in sources:
+        try:
+            yield cmaker.disaggregate(
+                sitecol, source.iter_ruptures(), iml4, truncnorm, epsilons,
+                monitor)
+        except Exception as err:
+            etype, err, tb = sys.exc_info()
+            msg = 'An error occurred with source id=%s. Error: %s'
+            msg %= (source.source_id, err)
+            raise_(etype, msg, tb)
+
+
 def collect_bin_data(sources, sitecol, cmaker, iml4,
                      truncation_level, n_epsilons, monitor=Monitor()):
     """
@@ -85,20 +101,130 @@ def collect_bin_data(sources, sitecol, cmaker, iml4,
     truncnorm = scipy.stats.truncnorm(-truncation_level, truncation_level)
     epsilons = numpy.linspace(truncnorm.a, truncnorm.b, n_epsilons + 1)
     acc = AccumDict(accum=[])
-    for source in sources:
-        with cmaker.ir_mon:
-            ruptures = list(source.iter_ruptures())
-        try:
-            acc += cmaker.disaggregate(
-                sitecol, ruptures, iml4, truncnorm, epsilons, monitor)
-        except Exception as err:
-            etype, err, tb = sys.exc_info()
-            msg = 'An error occurred with source id=%s. Error: %s'
-            msg %= (source.source_id, err)
-            raise_(etype, msg, tb)
+    for bdata in _gen_bin_data(sources, sitecol, cmaker, iml4, truncnorm,
+                               epsilons, monitor):
+        acc += bdata
     return pack(acc, 'mags dists lons lats'.split())
 
 
+def build_sparse_matrices(sources, sitecol, cmaker, iml4, bin_edges,
+                          truncation_level, n_epsilons, monitor=Monitor()):
+    """
+    Stream the ruptures of the given sources and accumulate their
+    probabilities of no exceedence in sparse matrices, one source at the
+    time, without keeping the bin data of all the ruptures in memory.
+    The result is the same as calling :func:`collect_bin_data` and
+    :func:`build_disagg_matrix` on each site.
+
+    :param sources: a list of sources
+    :param sitecol: a SiteCollection instance, possibly a tile
+    :param cmaker: a ContextMaker instance
+    :param iml4: an ArrayWrapper of intensities of shape (N, R, M, P)
+    :param bin_edges: bin edges, with lon and lat edges keyed by site ID
+    :param truncation_level: the truncation level
+    :param n_epsilons: the number of epsilons
+    :param monitor: a Monitor instance
+    :returns: a pair (num_ruptures, dictionary (sid, poe, imt, rlzi) ->
+              :class:`SparseMatrix` of probabilities)
+    """
+    truncnorm = scipy.stats.truncnorm(-truncation_level, truncation_level)
+    epsilons = numpy.linspace(truncnorm.a, truncnorm.b, n_epsilons + 1)
+    pnes = {}  # sid, poe, imt, rlzi -> SparseMatrix of PNEs
+    num_ruptures = 0
+    for acc in _gen_bin_data(sources, sitecol, cmaker, iml4, truncnorm,
+                             epsilons, monitor):
+        if not acc:  # no ruptures
+            continue
+        bdata = pack(acc, 'mags dists lons lats'.split())
+        num_ruptures += len(bdata.mags)
+        with monitor('build_disagg_matrix'):
+            for i, sid in enumerate(sitecol.sids):
+                shape = get_shape(bin_edges, sid)
+                bins = _flat_bins(bdata, bin_edges, i, sid)
+                for k, allpnes in bdata.items():
+                    key = (sid,) + k
+                    if key not in pnes:
+                        pnes[key] = SparseMatrix(shape, fill=1.)
+                    pnes[key].multiply_at(bins, allpnes[:, i, :])
+    # zero matrices (i.e. with all PNEs equal to 1) are discarded
+    return num_ruptures, {key: mat.complement() for key, mat in pnes.items()
+                          if (mat.array != 1).any()}
+
+
+class SparseMatrix(object):
+    """
+    A disaggregation matrix of shape (mag, dist, lon, lat, eps) storing
+    only the (mag, dist, lon, lat) bins hit by some rupture: `.bins` is
+    the sorted array of their flat indices and `.array` the matrix of
+    shape (len(bins), eps) of their values; the other bins contain
+    the value `.fill`.
+
+    :param shape: the shape of the dense matrix
+    :param bins: flat indices of the stored bins
+    :param array: values of the stored bins
+    :param fill: value of the bins not stored
+    """
+    def __init__(self, shape, bins=(), array=None, fill=0.):
+        self.shape = shape
+        self.bins = numpy.array(bins, int)
+        self.array = (numpy.full((len(self.bins), shape[-1]), fill)
+                      if array is None else array)
+        self.fill = fill
+
+    def _extend(self, bins):
+        # add the missing bins and return the indices of the given bins
+        allbins = numpy.union1d(self.bins, bins)
+        if len(allbins) > len(self.bins):
+            array = numpy.full((len(allbins), self.shape[-1]), self.fill)
+            array[numpy.searchsorted(allbins, self.bins)] = self.array
+            self.bins, self.array = allbins, array
+        return numpy.searchsorted(self.bins, bins)
+
+    def multiply_at(self, bins, values):
+        """
+        Multiply the given bins by the given values, in order, like
+        the loop `for b, v in zip(bins, values): matrix[b] *= v`
+
+        :param bins: an array of U flat indices
+        :param values: an array of shape (U, eps)
+        """
+        idx = self._extend(bins)
+        numpy.multiply.at(self.array, idx, values)
+
+    def complement(self):
+        """
+        :returns: a new SparseMatrix with values 1 - values
+        """
+        return self.__class__(self.shape, self.bins, 1. - self.array,
+                              1. - self.fill)
+
+    def agg(self, other):
+        """
+        Aggregate probabilities with the usual formula 1 - (1 - P1)(1 - P2)
+        in place.
+
+        :param other: a SparseMatrix of probabilities with the same shape
+        """
+        assert self.fill == other.fill == 0, (self.fill, other.fill)
+        self._extend(other.bins)
+        acc = 1. - self.array
+        acc[numpy.searchsorted(self.bins, other.bins)] *= 1. - other.array
+        self.array = 1. - acc
+        return self
+
+    def todense(self):
+        """
+        :returns: the dense matrix
+        """
+        dense = numpy.full(self.shape, self.fill)
+        dense.reshape(-1, self.shape[-1])[self.bins] = self.array
+        return dense
+
+    def __repr__(self):
+        return '<%s %s, %d nonzero bins>' % (
+            self.__class__.__name__, self.shape, len(self.bins))
+
+
 def lon_lat_bins(bb, coord_bin_width):
     """
     Define bin edges for disaggregation histograms.
@@ -132,7 +258,39 @@ def get_shape(bin_edges, sid):
             len(lon_bins[sid]) - 1, len(lat_bins[sid]) - 1, len(eps_bins) - 1)
 
 
-# this is fast
+def _flat_bins(bdata, bin_edges, idx, sid):
+    # flat indices of the (mag, dist, lon, lat) bins of the ruptures
+    # for the site of index idx in the bin data and site ID sid
+    mag_bins, dist_bins, lon_bins, lat_bins, eps_bins = bin_edges
+    dim1, dim2, dim3, dim4, dim5 = get_shape(bin_edges, sid)
+
+    # find bin indexes of rupture attributes; bins are assumed closed
+    # on the lower bound, and open on the upper bound, that is [ )
+    # longitude values need an ad-hoc method to take into account
+    # the 'international date line' issue
+    # the 'minus 1' is needed because the digitize method returns the
+    # index of the upper bound of the bin
+    mags_idx = numpy.digitize(bdata.mags, mag_bins) - 1
+    dists_idx = numpy.digitize(bdata.dists[:, idx], dist_bins) - 1
+    lons_idx = _digitize_lons(bdata.lons[:, idx], lon_bins[sid])
+    lats_idx = numpy.digitize(bdata.lats[:, idx], lat_bins[sid]) - 1
+
+    # because of the way numpy.digitize works, values equal to the last bin
+    # edge are associated to an index equal to len(bins) which is not a
+    # valid index for the disaggregation matrix. Such values are assumed
+    # to fall in the last bin
+    mags_idx[mags_idx == dim1] = dim1 - 1
+    dists_idx[dists_idx == dim2] = dim2 - 1
+    lons_idx[lons_idx == dim3] = dim3 - 1
+    lats_idx[lats_idx == dim4] = dim4 - 1
+
+    # NB: an index of -1 (value below the first edge) refers to the last
+    # bin, as in numpy indexing, hence mode='wrap'
+    return numpy.ravel_multi_index(
+        (mags_idx, dists_idx, lons_idx, lats_idx), (dim1, dim2, dim3, dim4),
+        mode='wrap')
+
+
 def build_disagg_matrix(bdata, bin_edges, sid, mon=Monitor):
     """
     :param bdata: a dictionary of probabilities of no exceedence
@@ -142,56 +300,16 @@ def build_disagg_matrix(bdata, bin_edges, sid, mon=Monitor):
     :returns: a dictionary key -> matrix|pmf for each key in bdata
     """
     with mon('build_disagg_matrix'):
-        mag_bins, dist_bins, lon_bins, lat_bins, eps_bins = bin_edges
-        dim1, dim2, dim3, dim4, dim5 = shape = get_shape(bin_edges, sid)
-
-        # find bin indexes of rupture attributes; bins are assumed closed
-        # on the lower bound, and open on the upper bound, that is [ )
-        # longitude values need an ad-hoc method to take into account
-        # the 'international date line' issue
-        # the 'minus 1' is needed because the digitize method returns the
-        # index of the upper bound of the bin
-        mags_idx = numpy.digitize(bdata.mags, mag_bins) - 1
-        dists_idx = numpy.digitize(bdata.dists[:, sid], dist_bins) - 1
-        lons_idx = _digitize_lons(bdata.lons[:, sid], lon_bins[sid])
-        lats_idx = numpy.digitize(bdata.lats[:, sid], lat_bins[sid]) - 1
-
-        # because of the way numpy.digitize works, values equal to the last bin
-        # edge are associated to an index equal to len(bins) which is not a
-        # valid index for the disaggregation matrix. Such values are assumed
-        # to fall in the last bin
-        mags_idx[mags_idx == dim1] = dim1 - 1
-        dists_idx[dists_idx == dim2] = dim2 - 1
-        lons_idx[lons_idx == dim3] = dim3 - 1
-        lats_idx[lats_idx == dim4] = dim4 - 1
-
+        shape = get_shape(bin_edges, sid)
+        bins = _flat_bins(bdata, bin_edges, sid, sid)
         out = {}
-        cache = {}
-        cache_hit = 0
-        num_zeros = 0
         for k, allpnes in bdata.items():
-            pnes = allpnes[:, sid, :]  # shape (U, N, E)
-            cache_key = pnes.sum()
-            if cache_key == pnes.size:  # all pnes are 1
-                num_zeros += 1
+            pnes = allpnes[:, sid, :]  # shape (U, E)
+            if (pnes == 1).all():
                 continue  # zero matrices are not transferred
-            try:
-                matrix = cache[cache_key]
-                cache_hit += 1
-            except KeyError:
-                mat = numpy.ones(shape)
-                for i_mag, i_dist, i_lon, i_lat, pne in zip(
-                        mags_idx, dists_idx, lons_idx, lats_idx, pnes):
-                    mat[i_mag, i_dist, i_lon, i_lat] *= pne
-                matrix = 1. - mat
-                cache[cache_key] = matrix
-            out[k] = matrix
-
-        # operations, hits, num_zeros
-        if hasattr(mon, 'cache_info'):
-            mon.cache_info += numpy.array([len(bdata), cache_hit, num_zeros])
-        else:
-            mon.cache_info = numpy.array([len(bdata), cache_hit, num_zeros])
+            mat = SparseMatrix(shape, fill=1.)
+            mat.multiply_at(bins, pnes)
+            out[k] = 1. - mat.todense()
     return out
 
 
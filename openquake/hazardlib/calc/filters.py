@@ -205,7 +205,7 @@ class SourceFilter(object):
     that filters the sources in parallel and returns a dictionary
     src_group_id -> filtered sources.
     Filter the sources by using `self.sitecol.within_bbox` which is
-    based on numpy.
+    based on the KD-tree of the :class:`openquake.hazardlib.site.SiteIndex`.
     """
     def __init__(self, sitecol, integration_distance, hdf5path=None):
         if sitecol is not None and len(sitecol) < len(sitecol.complete):
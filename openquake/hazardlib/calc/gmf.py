@@ -100,6 +100,7 @@ class GmfComputer(object):
         except AttributeError:
             self.sctx, self.dctx = cmaker.make_contexts(sitecol, rupture)
         self.sids = self.sctx.sids
+        self.dctxs = {}  # minimum_distance -> rounded distances context
         if correlation_model:  # store the filtered sitecol
             self.sites = sitecol.filtered(self.sids)
 
@@ -118,30 +119,50 @@ class GmfComputer(object):
             numpy.random.seed(seed)
         result = numpy.zeros(
             (len(self.imts), len(self.sids), num_events), numpy.float32)
+        if isinstance(gsim, MultiGMPE):
+            for imti, imt in enumerate(self.imts):
+                result[imti] = self._compute(
+                    None, gsim[str(imt)], num_events, imt)
+            return result
+        # regular GMPE, the means and stddevs are computed for all IMTs
+        # at once, before sampling the random numbers in the usual order
+        rctx = getattr(self.rupture, 'rupture', self.rupture)
+        dctx = self.dctx.roundup(gsim.minimum_distance, self.dctxs)
+        mean, stddevs = gsim.get_mean_and_stddevs_multi(
+            self.sctx, rctx, dctx, self.imts, self._stddev_types(gsim))
         for imti, imt in enumerate(self.imts):
-            if isinstance(gsim, MultiGMPE):
-                gs = gsim[str(imt)]  # MultiGMPE
-            else:
-                gs = gsim  # regular GMPE
-            result[imti] = self._compute(None, gs, num_events, imt)
+            result[imti] = self._compute(
+                None, gsim, num_events, imt, (mean[imti], stddevs[:, imti]))
         return result
 
-    def _compute(self, seed, gsim, num_events, imt):
+    def _stddev_types(self, gsim):
+        # the standard deviation types needed to compute the GMFs
+        if self.truncation_level == 0:
+            return []
+        elif gsim.DEFINED_FOR_STANDARD_DEVIATION_TYPES == set([StdDev.TOTAL]):
+            return [StdDev.TOTAL]
+        else:
+            return [StdDev.INTER_EVENT, StdDev.INTRA_EVENT]
+
+    def _compute(self, seed, gsim, num_events, imt, mean_stddevs=None):
         """
         :param seed: a random seed or None if the seed is already set
         :param gsim: a GSIM instance
         :param num_events: the number of seismic events
         :param imt: an IMT instance
+        :param mean_stddevs: the mean and stddevs for the IMT, if known
         :returns: a 32 bit array of shape (num_sites, num_events)
         """
-        rctx = getattr(self.rupture, 'rupture', self.rupture)
         if seed is not None:
             numpy.random.seed(seed)
-        dctx = self.dctx.roundup(gsim.minimum_distance)
+        if mean_stddevs is None:
+            rctx = getattr(self.rupture, 'rupture', self.rupture)
+            dctx = self.dctx.roundup(gsim.minimum_distance, self.dctxs)
+            mean_stddevs = gsim.get_mean_and_stddevs(
+                self.sctx, rctx, dctx, imt, self._stddev_types(gsim))
         if self.truncation_level == 0:
             assert self.correlation_model is None
-            mean, _stddevs = gsim.get_mean_and_stddevs(
-                self.sctx, rctx, dctx, imt, stddev_types=[])
+            mean, _stddevs = mean_stddevs
             mean = gsim.to_imt_unit_values(mean)
             mean.shape += (1, )
             mean = mean.repeat(num_events, axis=1)
@@ -163,8 +184,7 @@ class GmfComputer(object):
                 raise CorrelationButNoInterIntraStdDevs(
                     self.correlation_model, gsim)
 
-            mean, [stddev_total] = gsim.get_mean_and_stddevs(
-                self.sctx, rctx, dctx, imt, [StdDev.TOTAL])
+            mean, [stddev_total] = mean_stddevs
             stddev_total = stddev_total.reshape(stddev_total.shape + (1, ))
             mean = mean.reshape(mean.shape + (1, ))
 
@@ -172,9 +192,7 @@ class GmfComputer(object):
                 size=(len(self.sids), num_events))
             gmf = gsim.to_imt_unit_values(mean + total_residual)
         else:
-            mean, [stddev_inter, stddev_intra] = gsim.get_mean_and_stddevs(
-                self.sctx, rctx, dctx, imt,
-                [StdDev.INTER_EVENT, StdDev.INTRA_EVENT])
+            mean, [stddev_inter, stddev_intra] = mean_stddevs
             stddev_intra = stddev_intra.reshape(stddev_intra.shape + (1, ))
             stddev_inter = stddev_inter.reshape(stddev_inter.shape + (1, ))
             mean = mean.reshape(mean.shape + (1, ))
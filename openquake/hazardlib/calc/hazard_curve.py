@@ -76,7 +76,8 @@ def classical(group, src_filter, gsims, param, monitor=Monitor()):
 
     :returns:
         a dictionary {grp_id: pmap} with attributes .grp_ids, .calc_times,
-        .eff_ruptures
+        .eff_ruptures; if `param['pmap_by_source']` is true, there is also
+        an attribute .by_source, a dictionary {(source_id, grp_id): pmap}
     """
     if getattr(group, 'src_interdep', None) == 'mutex':
         mutex_weight = {src.source_id: weight for src, weight in
@@ -99,6 +100,8 @@ def classical(group, src_filter, gsims, param, monitor=Monitor()):
     # AccumDict of arrays with 4 elements weight, nsites, calc_time, split
     pmap.calc_times = AccumDict(accum=numpy.zeros(4))
     pmap.eff_ruptures = AccumDict()  # grp_id -> num_ruptures
+    if param.get('pmap_by_source'):
+        pmap.by_source = {}  # used by the PmapCache of the engine
     for src, s_sites in src_filter(group):  # filter now
         t0 = time.time()
         indep = group.rup_interdep == 'indep' if mutex_weight else True
@@ -116,6 +119,8 @@ def classical(group, src_filter, gsims, param, monitor=Monitor()):
         elif poemap:
             for grp_id in src.src_group_ids:
                 pmap[grp_id] |= poemap
+        if hasattr(pmap, 'by_source'):
+            pmap.by_source[src.source_id, src.src_group_ids[0]] = poemap
         src_id = src.source_id.split(':', 1)[0]
         pmap.calc_times[src_id] += numpy.array(
             [src.weight, len(s_sites), time.time() - t0, 1])
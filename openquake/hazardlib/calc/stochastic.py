@@ -25,6 +25,7 @@ import time
 import operator
 import collections
 import numpy
+import scipy.stats
 from openquake.baselib.general import AccumDict
 from openquake.baselib.performance import Monitor
 from openquake.baselib.python3compat import raise_
@@ -134,10 +135,12 @@ def sample_ruptures(group, src_filter=filters.source_site_noop_filter,
     eids = numpy.zeros(0)
     cmaker = ContextMaker(gsims, src_filter.integration_distance,
                           param, monitor)
+    sample = (_sample_ruptures_vectorized
+              if param.get('vectorized_sampling') else _sample_ruptures)
     for src, s_sites in src_filter(group):
         t0 = time.time()
         num_ruptures += src.num_ruptures
-        num_occ_by_rup = _sample_ruptures(
+        num_occ_by_rup = sample(
             src, prob[src], param['ses_per_logic_tree_path'], param['samples'],
             param['seed'])
         # NB: the number of occurrences is very low, << 1, so it is
@@ -185,6 +188,91 @@ def _sample_ruptures(src, prob, num_ses, num_samples, seed):
     return num_occ_by_rup
 
 
+def _splitmix64(x):
+    # the finalizer of the SplitMix64 generator, a good 64 bit mixer
+    x = x + U64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> U64(30))) * U64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> U64(27))) * U64(0x94D049BB133111EB)
+    return x ^ (x >> U64(31))
+
+
+def counter_random(seed, *counters):
+    """
+    Counter-based random numbers, uniformly distributed in [0, 1).
+    The result depends only on the seed and on the counters, which are
+    broadcast together, so that the numbers do not depend on the
+    order in which they are generated:
+
+    >>> counter_random(42, [1, 2, 3]) == counter_random(42, [3, 2, 1])[::-1]
+    array([ True,  True,  True])
+
+    :param seed: an integer seed
+    :param counters: integers or arrays of integers
+    :returns: an array of random numbers
+    """
+    with numpy.errstate(over='ignore'):
+        h = _splitmix64(numpy.array(seed, U64))
+        for counter in counters:
+            h = _splitmix64(h ^ numpy.asarray(counter, U64))
+    return (h >> U64(11)) * 2. ** -53
+
+
+def _sample_ruptures_vectorized(src, prob, num_ses, num_samples, seed):
+    """
+    Sample the ruptures contained in the given source, starting from the
+    array of the occurrence rates of the ruptures. The number of
+    occurrences in all the SES is drawn at once for each rupture and
+    sample, then the occurrences are distributed uniformly among the SES.
+    The random numbers depend only on the seed and the rupture serial,
+    so the result does not depend on how the sources are split. Only the
+    ruptures that occur are built. For mutex sources the occurrence rates
+    are multiplied by the probability of the source.
+
+    :param src: a hazardlib source object
+    :param prob: a probability (1 for indep sources, < 1 for mutex sources)
+    :param num_ses: the number of Stochastic Event Sets to generate
+    :param num_samples: how many samples for the given source
+    :param seed: master seed from the job.ini file
+    :returns: a dictionary of dictionaries rupture -> {ses_id: num_occurrences}
+    """
+    tom = getattr(src, 'temporal_occurrence_model', None)
+    if tom is None:  # nonparametric source, the rates are not defined
+        return _sample_ruptures(src, prob, num_ses, num_samples, seed)
+    if hasattr(src, 'get_occurrence_rates'):  # point-like source
+        rates = src.get_occurrence_rates()
+        ruptures = None
+    else:
+        ruptures = list(src.iter_ruptures())
+        rates = numpy.array([rup.occurrence_rate for rup in ruptures])
+    serials = numpy.array(src.serial, U64)[:, None]
+    samples = numpy.arange(num_samples, dtype=U64)[None, :]
+    mean = (rates * (tom.time_span * num_ses * prob))[:, None]
+    rnd = counter_random(seed, serials, samples, 0)
+    ok = rnd > numpy.exp(-mean)  # the ruptures occurring at least once
+    rup_idx, sam_idx = ok.nonzero()
+    num_occ = scipy.stats.poisson.ppf(
+        rnd[ok], mean[rup_idx, 0]).astype(U32)
+
+    # distribute the occurrences among the SES
+    rup_idx = numpy.repeat(rup_idx, num_occ)
+    sam_idx = numpy.repeat(sam_idx, num_occ)
+    occ_idx = numpy.concatenate([numpy.arange(n) for n in num_occ] or [[]])
+    ses_idx = 1 + (counter_random(
+        seed, serials[rup_idx, 0], sam_idx, 1 + occ_idx) * num_ses).astype(U32)
+    occurring = numpy.unique(rup_idx)
+    if ruptures is None:
+        ruptures = dict(zip(occurring, src.get_ruptures(occurring)))
+    num_occ_by_rup = collections.defaultdict(AccumDict)
+    for rup_no, sam, ses in zip(rup_idx, sam_idx, ses_idx):
+        rup = ruptures[rup_no]
+        num_occ_by_rup[rup] += {(int(sam), int(ses)): 1}
+    for rup_no in occurring:
+        rup = ruptures[rup_no]
+        rup.seed = src.serial[rup_no] + seed
+        rup.rup_no = rup_no + 1
+    return num_occ_by_rup
+
+
 def _build_eb_ruptures(
         src, num_occ_by_rup, cmaker, s_sites, random_seed, rup_mon):
     """
@@ -17,14 +17,17 @@
 #  along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import abc
+import logging
 import numpy
 
 from openquake.baselib.general import AccumDict
 from openquake.baselib.performance import Monitor
-from openquake.hazardlib import imt as imt_module
 from openquake.hazardlib.probability_map import ProbabilityMap
 from openquake.hazardlib.geo.surface import PlanarSurface
 
+# below this number of sites ContextMaker.filter does not use the site index
+INDEX_MIN_SITES = 1000
+
 
 def get_distances(rupture, mesh, param):
     """
@@ -57,6 +60,80 @@ def get_distances(rupture, mesh, param):
     return dist
 
 
+def get_pnos(rupture, poes):
+    """
+    :param rupture: a rupture or a :class:`RuptureStack`
+    :param poes: an array of PoEs of shape (N, L)
+    :returns: the probabilities of no exceedence for the given PoEs
+    """
+    if not isinstance(rupture, RuptureStack):
+        return rupture.get_probability_no_exceedance(poes)
+    try:  # Poissonian ruptures, vectorized on the occurrence rates
+        probs = [rup.temporal_occurrence_model.
+                 get_probability_one_or_more_occurrences(rup.occurrence_rate)
+                 for rup in rupture.ruptures]
+    except AttributeError:  # nonparametric ruptures
+        return numpy.concatenate(
+            [rup.get_probability_no_exceedance(poes[slc])
+             for rup, slc in zip(rupture.ruptures, rupture.slices)])
+    return (1. - numpy.repeat(probs, rupture.nsites))[:, None] ** poes
+
+
+class NotStackable(AttributeError):
+    """
+    Raised when accessing an attribute of a :class:`RuptureStack` which
+    is not a rupture parameter shared by the stack
+    """
+
+
+class RuptureStack(object):
+    """
+    A sequence of ruptures with the same rupture parameters, to be used
+    in place of a single rupture when calling the GSIMs on a stack of
+    contexts. The rupture parameters are taken from the first rupture;
+    any other attribute raises :class:`NotStackable`, since it could be
+    different for each rupture.
+
+    :param ruptures: a list of ruptures
+    :param nsites: the number of affected sites for each rupture
+    :param params: the names of the rupture parameters shared by the stack
+    """
+    def __init__(self, ruptures, nsites, params):
+        self.ruptures = ruptures
+        self.nsites = nsites
+        self.params = params
+        stops = numpy.cumsum(nsites)
+        self.slices = [slice(stop - n, stop) for stop, n in zip(stops, nsites)]
+
+    def __getattr__(self, name):
+        # NB: vars(self) is empty when unpickling
+        if name not in vars(self).get('params', ()):
+            raise NotStackable('%s is not a rupture parameter of the stack'
+                               % name)
+        return getattr(self.ruptures[0], name)
+
+    def __len__(self):
+        return len(self.ruptures)
+
+
+def stack_contexts(triples, params):
+    """
+    :param triples: a list of triples (rupture, sctx, dctx)
+    :param params: the names of the rupture parameters shared by the ruptures
+    :returns: a triple (RuptureStack, sctx, dctx) with concatenated contexts
+    """
+    rups, sctxs, dctxs = zip(*triples)
+    sctx = SitesContext(sctxs[0]._slots_)
+    for slot in ('sids',) + tuple(sctx._slots_):
+        setattr(sctx, slot, numpy.concatenate(
+            [getattr(ctx, slot) for ctx in sctxs]))
+    dctx = DistancesContext(
+        (param, numpy.concatenate([getattr(ctx, param) for ctx in dctxs]))
+        for param in vars(dctxs[0]))
+    return RuptureStack(list(rups), [len(ctx.sids) for ctx in sctxs],
+                        params), sctx, dctx
+
+
 class FarAwayRupture(Exception):
     """Raised if the rupture is outside the maximum distance for all sites"""
 
@@ -97,6 +174,11 @@ class ContextMaker(object):
                 filter_distance = 'rrup'
         self.filter_distance = filter_distance
         self.reqv = param.get('reqv')
+        self.vectorize_ruptures = param.get('vectorize_ruptures', False)
+        self.stackable = True  # set to False if a GSIM cannot use stacks
+        self.collapse_factor = param.get('pointsource_collapse_factor')
+        # absolute accuracy of the tabulated survival function, if any
+        self.sf_accuracy = param.get('sf_accuracy')
         self.REQUIRES_DISTANCES.add(self.filter_distance)
         if self.reqv is not None:
             self.REQUIRES_DISTANCES.add('repi')
@@ -122,17 +204,39 @@ class ContextMaker(object):
             :class:`openquake.hazardlib.source.rupture.BaseRupture`
         :returns:
             (filtered sites, distance context)
+
+        If the sites are many, the ones which are certainly too far from
+        the rupture are discarded by using the spatial index of the complete
+        site collection, before computing the distances.
         """
-        distances = get_distances(rupture, sites, self.filter_distance)
         if self.maximum_distance:
-            mask = distances <= self.maximum_distance(
+            maxdist = self.maximum_distance(
                 rupture.tectonic_region_type, rupture.mag)
+            if (len(sites) >= INDEX_MIN_SITES and hasattr(sites, 'complete')
+                    and self.filter_distance in ('rrup', 'rjb')):
+                sites = self._prefilter(sites, rupture, maxdist)
+        distances = get_distances(rupture, sites, self.filter_distance)
+        if self.maximum_distance:
+            mask = distances <= maxdist
             if mask.any():
                 sites, distances = sites.filter(mask), distances[mask]
             else:
                 raise FarAwayRupture(rupture.serial)
         return sites, DistancesContext([(self.filter_distance, distances)])
 
+    def _prefilter(self, sites, rupture, maxdist):
+        # discard the sites outside the ball containing the sites within
+        # maxdist from the rupture, or raise FarAwayRupture if there are none
+        complete = sites.complete
+        idxs = complete.index.within_distance(
+            rupture.surface.mesh, maxdist, self.filter_distance)
+        inside = numpy.zeros(len(complete), bool)
+        inside[idxs] = True
+        mask = inside[sites.sids]
+        if not mask.any():
+            raise FarAwayRupture(rupture.serial)
+        return sites.filter(mask)
+
     def add_rup_params(self, rupture):
         """
         Add .REQUIRES_RUPTURE_PARAMETERS to the rupture
@@ -205,11 +309,17 @@ class ContextMaker(object):
         :param trunclevel: truncation level
         :param rup_indep: True if the ruptures are independent
         :returns: a ProbabilityMap instance
+
+        If the parameter `vectorize_ruptures` is set, the ruptures with
+        the same rupture parameters are stacked and the GSIMs are called
+        once per stack and IMT, instead of once per rupture and IMT.
+
+        If the parameter `pointsource_collapse_factor` is set, the sites
+        farther from a point source than that multiple of its size (the
+        maximum rupture length or the range of the hypocenter depths)
+        see only the ruptures of the collapsed source, i.e. one rupture
+        per magnitude.
         """
-        pmap = ProbabilityMap.build(
-            len(imtls.array), len(self.gsims), sites.sids,
-            initvalue=rup_indep)
-        eff_ruptures = 0
         with self.ir_mon:
             rups = list(src.iter_ruptures())
         # normally len(rups) == src.num_ruptures, but in UCERF .iter_ruptures
@@ -218,6 +328,73 @@ class ContextMaker(object):
             raise ValueError('Expected at max %d ruptures, got %d' % (
                 src.num_ruptures, len(rups)))
         weight = 1. / len(rups)
+        if self.collapse_factor and rup_indep and hasattr(src, 'collapsed'):
+            with self.ir_mon:
+                pairs = self._collapse(src, rups, sites)
+        else:
+            pairs = [(rups, sites)]
+        if self.vectorize_ruptures:
+            pmap = ProbabilityMap(len(imtls.array), len(self.gsims))
+            pmap.eff_ruptures = 0
+            for rups, sites in pairs:
+                array, eff_ruptures = self._make_pne_array(
+                    rups, sites, imtls, trunclevel, rup_indep, weight)
+                pmap.update(~ProbabilityMap.from_array(array, sites.sids))
+                pmap.eff_ruptures += eff_ruptures
+            return pmap
+        pmap = ProbabilityMap.build(
+            len(imtls.array), len(self.gsims), sites.sids,
+            initvalue=rup_indep)
+        eff_ruptures = 0
+        for rups, sites in pairs:
+            for rup in rups:
+                rup.weight = weight
+                try:
+                    with self.ctx_mon:
+                        sctx, dctx = self.make_contexts(sites, rup)
+                except FarAwayRupture:
+                    continue
+                eff_ruptures += 1
+                with self.poe_mon:
+                    pnes = self._make_pnes(rup, sctx, dctx, imtls, trunclevel)
+                    for sid, pne in zip(sctx.sids, pnes):
+                        if rup_indep:
+                            pmap[sid].array *= pne
+                        else:
+                            pmap[sid].array += pne * rup.weight
+        pmap = ~pmap
+        pmap.eff_ruptures = eff_ruptures
+        return pmap
+
+    def _collapse(self, src, rups, sites):
+        # split the sites in close and far from the point source; the
+        # far sites see one rupture per magnitude, since the effect of the
+        # nodal plane and hypocenter distributions is negligible for them
+        if len(rups) == len(src.get_annual_occurrence_rates()):
+            return [(rups, sites)]  # already one rupture per magnitude
+        # the size of the source is the maximum rupture length or the
+        # range of the hypocenter depths, if larger
+        depths = [depth for _prob, depth in src.hypocenter_distribution.data]
+        size = max(2 * src._get_max_rupture_projection_radius(),
+                   max(depths) - min(depths))
+        repi = src.location.distance_to_mesh(sites, with_depths=False)
+        far = repi > self.collapse_factor * size
+        if not far.any():
+            return [(rups, sites)]
+        pairs = [(list(src.collapsed().iter_ruptures()), sites.filter(far))]
+        if not far.all():
+            pairs.insert(0, (rups, sites.filter(~far)))
+        return pairs
+
+    def _make_pne_array(self, rups, sites, imtls, trunclevel, rup_indep,
+                        weight):
+        # the ruptures with the same rupture parameters are stacked
+        # together and the GSIMs are called once per stack; the PNEs are
+        # then scattered on an array of shape (N, L, G) indexed by site
+        shape = (len(sites), len(imtls.array), len(self.gsims))
+        array = numpy.ones(shape) if rup_indep else numpy.zeros(shape)
+        params = sorted(self.REQUIRES_RUPTURE_PARAMETERS)
+        stacks = AccumDict(accum=[])  # rupture params -> triples
         for rup in rups:
             rup.weight = weight
             try:
@@ -225,31 +402,51 @@ class ContextMaker(object):
                     sctx, dctx = self.make_contexts(sites, rup)
             except FarAwayRupture:
                 continue
-            eff_ruptures += 1
-            with self.poe_mon:
-                pnes = self._make_pnes(rup, sctx, dctx, imtls, trunclevel)
-                for sid, pne in zip(sctx.sids, pnes):
+            key = tuple(getattr(rup, param) for param in params)
+            stacks[key].append((rup, sctx, dctx))
+        eff_ruptures = 0
+        with self.poe_mon:
+            for triples in stacks.values():
+                eff_ruptures += len(triples)
+                for sids, pnes in self._gen_pnes(
+                        triples, params, imtls, trunclevel):
+                    idx = numpy.searchsorted(sites.sids, sids)
                     if rup_indep:
-                        pmap[sid].array *= pne
+                        numpy.multiply.at(array, idx, pnes)
                     else:
-                        pmap[sid].array += pne * rup.weight
-        pmap = ~pmap
-        pmap.eff_ruptures = eff_ruptures
-        return pmap
+                        numpy.add.at(array, idx, pnes * weight)
+        return array, eff_ruptures
+
+    def _gen_pnes(self, triples, params, imtls, trunclevel):
+        # yield pairs (sids, pnes) for a stack of ruptures; if a GSIM
+        # reads an attribute of the rupture which is not a declared rupture
+        # parameter, the ruptures are computed one by one, for this stack
+        # and all the following ones
+        if self.stackable:
+            rupts, sctx, dctx = stack_contexts(triples, params)
+            try:
+                pnes = self._make_pnes(rupts, sctx, dctx, imtls, trunclevel)
+            except NotStackable as exc:
+                self.stackable = False
+                logging.warning('Cannot stack the ruptures for %s (%s): '
+                                'computing them one by one', self.gsims, exc)
+            else:
+                yield sctx.sids, pnes
+                return
+        for rup, sctx, dctx in triples:
+            yield sctx.sids, self._make_pnes(
+                rup, sctx, dctx, imtls, trunclevel)
 
     # NB: it is important for this to be fast since it is inside an inner loop
     def _make_pnes(self, rupture, sctx, dctx, imtls, trunclevel):
         pne_array = numpy.zeros(
             (len(sctx.sids), len(imtls.array), len(self.gsims)))
+        dctxs = {}  # minimum_distance -> rounded distances context
         for i, gsim in enumerate(self.gsims):
-            dctx_ = dctx.roundup(gsim.minimum_distance)
-            pnos = []  # list of arrays nsites x nlevels
-            for imt in imtls:
-                poes = gsim.get_poes(
-                    sctx, rupture, dctx_,
-                    imt_module.from_string(imt), imtls[imt], trunclevel)
-                pnos.append(rupture.get_probability_no_exceedance(poes))
-            pne_array[:, :, i] = numpy.concatenate(pnos, axis=1)
+            dctx_ = dctx.roundup(gsim.minimum_distance, dctxs)
+            poes = gsim.get_poes_multi(sctx, rupture, dctx_, imtls,
+                                       trunclevel, self.sf_accuracy)
+            pne_array[:, :, i] = get_pnos(rupture, poes)
         return pne_array
 
     def disaggregate(self, sitecol, ruptures, iml4, truncnorm, epsilons,
@@ -280,8 +477,9 @@ class ContextMaker(object):
             with clo_mon:  # this is faster than computing orig_dctx
                 closest_points = rupture.surface.get_closest_points(sitecol)
             cache = {}
+            dctxs = {}  # minimum_distance -> rounded distances context
             for r, gsim in self.gsim_by_rlzi.items():
-                dctx = orig_dctx.roundup(gsim.minimum_distance)
+                dctx = orig_dctx.roundup(gsim.minimum_distance, dctxs)
                 for m, imt in enumerate(iml4.imts):
                     for p, poe in enumerate(iml4.poes_disagg):
                         iml = tuple(iml4.array[:, r, m, p])
@@ -362,22 +560,29 @@ class DistancesContext(BaseContext):
         for param, dist in param_dist_pairs:
             setattr(self, param, dist)
 
-    def roundup(self, minimum_distance):
+    def roundup(self, minimum_distance, cache=None):
         """
         If the minimum_distance is nonzero, returns a copy of the
         DistancesContext with updated distances, i.e. the ones below
         minimum_distance are rounded up to the minimum_distance. Otherwise,
         returns the original DistancesContext unchanged.
+
+        If a cache dictionary is passed, the copies are stored there
+        and shared by all the GSIMs with the same minimum_distance.
         """
         if not minimum_distance:
             return self
+        if cache is not None and minimum_distance in cache:
+            return cache[minimum_distance]
         ctx = DistancesContext()
         for dist, array in vars(self).items():
             small_distances = array < minimum_distance
             if small_distances.any():
-                array = array[:]  # make a copy first
+                array = array.copy()  # the original array can be shared
                 array[small_distances] = minimum_distance
             setattr(ctx, dist, array)
+        if cache is not None:
+            cache[minimum_distance] = ctx
         return ctx
 
 
@@ -228,6 +228,29 @@ class GroundShakingIntensityModel(metaclass=MetaGSIM):
         compute interim steps).
         """
 
+    def get_mean_and_stddevs_multi(self, sites, rup, dists, imts,
+                                   stddev_types):
+        """
+        Calculate and return the mean values and the standard deviations
+        for several intensity measure types at once.
+
+        This generic implementation calls :meth:`get_mean_and_stddevs`
+        once per IMT. Subclasses can override it to compute only once
+        the terms which do not depend on the IMT.
+
+        :param sites: as in :meth:`get_mean_and_stddevs`
+        :param rup: as in :meth:`get_mean_and_stddevs`
+        :param dists: as in :meth:`get_mean_and_stddevs`
+        :param imts: a list of M intensity measure types
+        :param stddev_types: a list of S standard deviation types
+        :returns:
+            an array of means of shape (M, N) and an array of standard
+            deviations of shape (S, M, N), N being the number of sites
+        """
+        return stack_mean_and_stddevs(
+            self.get_mean_and_stddevs(sites, rup, dists, imt, stddev_types)
+            for imt in imts)
+
     def get_poes(self, sctx, rctx, dctx, imt, imls, truncation_level):
         """
         Calculate and return probabilities of exceedance (PoEs) of one or more
@@ -290,24 +313,77 @@ class GroundShakingIntensityModel(metaclass=MetaGSIM):
 
         if truncation_level == 0:
             # zero truncation mode, just compare imls to mean
-            imls = self.to_distribution_values(imls)
             mean, _ = self.get_mean_and_stddevs(sctx, rctx, dctx, imt, [])
-            mean = mean.reshape(mean.shape + (1, ))
-            return (imls <= mean).astype(float)
+            return self._get_poes(mean, None, imls, truncation_level)
         else:
             # use real normal distribution
             assert (const.StdDev.TOTAL
                     in self.DEFINED_FOR_STANDARD_DEVIATION_TYPES)
-            imls = self.to_distribution_values(imls)
             mean, [stddev] = self.get_mean_and_stddevs(sctx, rctx, dctx, imt,
                                                        [const.StdDev.TOTAL])
-            mean = mean.reshape(mean.shape + (1, ))
-            stddev = stddev.reshape(stddev.shape + (1, ))
-            values = (imls - mean) / stddev
-            if truncation_level is None:
-                return _norm_sf(values)
-            else:
-                return _truncnorm_sf(truncation_level, values)
+            return self._get_poes(mean, stddev, imls, truncation_level)
+
+    def get_poes_multi(self, sctx, rctx, dctx, imtls, truncation_level,
+                       sf_accuracy=None):
+        """
+        Calculate and return the PoEs of the intensity measure levels of
+        all the IMTs in ``imtls``, by calling
+        :meth:`get_mean_and_stddevs_multi` once.
+
+        :param sctx: as in :meth:`get_poes`
+        :param rctx: as in :meth:`get_poes`
+        :param dctx: as in :meth:`get_poes`
+        :param imtls: a dictionary-like object IMT string -> levels
+        :param truncation_level: as in :meth:`get_poes`
+        :param sf_accuracy:
+            if given, use a :class:`SFTable` with this accuracy instead of
+            the exact survival function; the accuracy is an absolute error,
+            so the small PoEs (the ones relevant for low probabilities of
+            exceedance) can have an arbitrarily large relative error
+        :returns:
+            an array of PoEs of shape (N, L), L being the total number
+            of levels
+        """
+        imts = [imt_module.from_string(imt) for imt in imtls]
+        if type(self).get_poes is not GroundShakingIntensityModel.get_poes:
+            # the subclass has its own get_poes, to be called for each IMT
+            return numpy.concatenate(
+                [self.get_poes(sctx, rctx, dctx, imt, imtls[str(imt)],
+                               truncation_level) for imt in imts], axis=1)
+        if truncation_level is not None and truncation_level < 0:
+            raise ValueError('truncation level must be zero, positive number '
+                             'or None')
+        for imt in imts:
+            self._check_imt(imt)
+        if truncation_level == 0:
+            mean, _ = self.get_mean_and_stddevs_multi(
+                sctx, rctx, dctx, imts, [])
+            stddev = [None] * len(imts)
+        else:
+            assert (const.StdDev.TOTAL
+                    in self.DEFINED_FOR_STANDARD_DEVIATION_TYPES)
+            mean, [stddev] = self.get_mean_and_stddevs_multi(
+                sctx, rctx, dctx, imts, [const.StdDev.TOTAL])
+        return numpy.concatenate(
+            [self._get_poes(mean[m], stddev[m], imtls[str(imt)],
+                            truncation_level, sf_accuracy)
+             for m, imt in enumerate(imts)], axis=1)
+
+    def _get_poes(self, mean, stddev, imls, truncation_level,
+                  sf_accuracy=None):
+        # PoEs of shape (N, L) from mean and stddev arrays of shape N
+        imls = self.to_distribution_values(imls)
+        mean = mean.reshape(mean.shape + (1, ))
+        if truncation_level == 0:
+            return (imls <= mean).astype(float)
+        stddev = stddev.reshape(stddev.shape + (1, ))
+        values = (imls - mean) / stddev
+        if sf_accuracy:  # use the tabulated survival function
+            return get_sf_table(truncation_level, sf_accuracy)(values)
+        elif truncation_level is None:
+            return _norm_sf(values)
+        else:
+            return _truncnorm_sf(truncation_level, values)
 
     def disaggregate_pne(self, rupture, sctx, dctx, imt, iml,
                          truncnorm, epsilons):
@@ -425,6 +501,30 @@ class GroundShakingIntensityModel(metaclass=MetaGSIM):
         return repr(str(self))
 
 
+def stack_mean_and_stddevs(mean_stddevs):
+    """
+    :param mean_stddevs:
+        an iterable of M pairs (mean, stddevs) as returned by
+        :meth:`GroundShakingIntensityModel.get_mean_and_stddevs`, with
+        mean an array of shape N and stddevs a list of S arrays of shape N
+    :returns:
+        an array of means of shape (M, N) and an array of standard
+        deviations of shape (S, M, N)
+
+    >>> mean, stddevs = stack_mean_and_stddevs(
+    ...     [(numpy.zeros(3), [numpy.ones(3)]),
+    ...      (numpy.ones(3), [numpy.ones(3)])])
+    >>> mean.shape, stddevs.shape
+    ((2, 3), (1, 2, 3))
+    """
+    means, stddevs = zip(*mean_stddevs)
+    means = numpy.array(means)
+    M, N = means.shape
+    S = len(stddevs[0])
+    stddevs = numpy.array(stddevs).reshape(M, S, N)
+    return means, stddevs.transpose(1, 0, 2)
+
+
 def _truncnorm_sf(truncation_level, values):
     """
     Survival function for truncated normal distribution.
@@ -494,6 +594,75 @@ def _norm_sf(values):
     return ndtr(- values)
 
 
+class SFTable(object):
+    """
+    Tabulated survival function for the normal distribution (or the
+    truncated normal distribution, if a truncation level is given),
+    assuming zero mean and standard deviation equal to one. The function
+    is linearly interpolated on a regular grid, with a step chosen so that
+    the absolute error is below the given accuracy. Here is an example:
+
+    >>> sf = SFTable(3, accuracy=1E-6)
+    >>> values = numpy.array([-3.5, -1.2, 0, 0.12345, 2.9, 4])
+    >>> err = sf(values) - _truncnorm_sf(3, values)
+    >>> bool(numpy.abs(err).max() < 1E-6)
+    True
+
+    :param truncation_level: None or a positive number
+    :param accuracy: the maximum absolute error on the PoEs
+    """
+    # the maximum of |SF''(x)| = |x phi(x)| for the standard normal
+    # distribution, i.e. the value at x=1 of the probability density
+    MAX_D2 = math.exp(-.5) / math.sqrt(2 * math.pi)
+    XMAX = 9.  # beyond 9 sigmas the normal SF is below 1E-18
+
+    def __init__(self, truncation_level=None, accuracy=1E-5):
+        self.truncation_level = truncation_level
+        self.accuracy = accuracy
+        if truncation_level is None:
+            xmax, z = self.XMAX, 1.
+        else:
+            xmax = min(truncation_level, self.XMAX)
+            z = 2 * ndtr(truncation_level) - 1
+        # the error of a linear interpolation is bounded by step**2 / 8
+        # times the maximum of the second derivative of the function
+        step = math.sqrt(8 * accuracy * z / self.MAX_D2)
+        npoints = int(math.ceil(2 * xmax / step)) + 1
+        self.xmin = -xmax
+        self.step = 2 * xmax / (npoints - 1)
+        xs = numpy.linspace(-xmax, xmax, npoints)
+        if truncation_level is None:
+            sfs = _norm_sf(xs)
+        else:
+            sfs = _truncnorm_sf(truncation_level, xs)
+        # add a copy of the last point, so that the slope is always defined
+        self.sfs = numpy.append(sfs, sfs[-1])
+        self.slopes = numpy.diff(self.sfs)
+
+    def __call__(self, values):
+        """
+        :param values: an array of normalized values
+        :returns: the interpolated survival function on the values
+        """
+        idx = (values - self.xmin) / self.step
+        numpy.clip(idx, 0, len(self.slopes) - 1, out=idx)
+        i = idx.astype(numpy.int32)
+        return self.sfs[i] + self.slopes[i] * (idx - i)
+
+    def __repr__(self):
+        return '<%s truncation_level=%s, accuracy=%s, %d points>' % (
+            self.__class__.__name__, self.truncation_level, self.accuracy,
+            len(self.slopes))
+
+
+@functools.lru_cache()
+def get_sf_table(truncation_level, accuracy):
+    """
+    :returns: a cached :class:`SFTable` instance
+    """
+    return SFTable(truncation_level, accuracy)
+
+
 class GMPE(GroundShakingIntensityModel):
     """
     Ground-Motion Prediction Equation is a subclass of generic
@@ -653,6 +822,13 @@ class CoeffsTable(object):
     ...           imt.PGA(): {"a": 0.1, "b": 1.0},
     ...           imt.PGV(): {"a": 0.5, "b": 10.0}}
     >>> ct = CoeffsTable(sa_damping=5, table=coeffs)
+
+    The coefficients for several IMTs can be retrieved at once as a
+    structured array, which is useful to vectorize over the IMTs:
+
+    >>> C = ct.get_coeffs([imt.PGA(), imt.SA(0.1), imt.SA(0.5)])
+    >>> C['a'].round(5).tolist()
+    [0.1, 1.0, 2.39794]
     """
     def __init__(self, **kwargs):
         if 'table' not in kwargs:
@@ -674,6 +850,22 @@ class CoeffsTable(object):
         else:
             raise TypeError("CoeffsTable cannot be constructed with inputs "
                             "of the form '%s'" % table.__class__.__name__)
+        self._build_sa_array()
+        self._cache = {}  # imt -> coefficients
+
+    def _build_sa_array(self):
+        # store the SA coefficients in a structured array sorted by
+        # damping and period, used to interpolate with searchsorted
+        sa_imts = sorted(self.sa_coeffs, key=lambda im: (im.damping,
+                                                         im.period))
+        names = list(self.sa_coeffs[sa_imts[0]]) if sa_imts else []
+        self._sa_array = numpy.zeros(
+            len(sa_imts), [(name, numpy.float64) for name in names])
+        for i, im in enumerate(sa_imts):
+            coeffs = self.sa_coeffs[im]
+            self._sa_array[i] = tuple(coeffs[name] for name in names)
+        self._sa_periods = numpy.array([im.period for im in sa_imts])
+        self._sa_dampings = numpy.array([im.damping for im in sa_imts])
 
     def _setup_table_from_str(self, table, sa_damping):
         """
@@ -711,7 +903,7 @@ class CoeffsTable(object):
         from this table (if there is a line for requested IMT in it),
         or the dictionary of interpolated coefficients, if ``imt`` is
         of type :class:`~openquake.hazardlib.imt.SA` and interpolation
-        is possible.
+        is possible. The interpolated coefficients are memoized.
 
         :raises KeyError:
             If ``imt`` is not available in the table and no interpolation
@@ -725,26 +917,55 @@ class CoeffsTable(object):
         except KeyError:
             pass
 
-        max_below = min_above = None
-        for unscaled_imt in list(self.sa_coeffs):
-            if unscaled_imt.damping != imt.damping:
-                continue
-            if unscaled_imt.period > imt.period:
-                if min_above is None or unscaled_imt.period < min_above.period:
-                    min_above = unscaled_imt
-            elif unscaled_imt.period < imt.period:
-                if max_below is None or unscaled_imt.period > max_below.period:
-                    max_below = unscaled_imt
-        if max_below is None or min_above is None:
+        try:
+            return self._cache[imt]
+        except KeyError:
+            coeffs = self._cache[imt] = self._interpolate(imt)
+            return coeffs
+
+    def _interpolate(self, imt):
+        # the periods with the same damping are sorted, so the closest
+        # periods below and above can be found with searchsorted
+        start = numpy.searchsorted(self._sa_dampings, imt.damping, 'left')
+        stop = numpy.searchsorted(self._sa_dampings, imt.damping, 'right')
+        periods = self._sa_periods[start:stop]
+        idx = numpy.searchsorted(periods, imt.period)
+        if idx == 0 or idx == len(periods):
             raise KeyError(imt)
+        max_below = self._sa_array[start + idx - 1]
+        min_above = self._sa_array[start + idx]
 
         # ratio tends to 1 when target period tends to a minimum
         # known period above and to 0 if target period is close
         # to maximum period below.
-        ratio = ((math.log(imt.period) - math.log(max_below.period))
-                 / (math.log(min_above.period) - math.log(max_below.period)))
-        max_below = self.sa_coeffs[max_below]
-        min_above = self.sa_coeffs[min_above]
+        ratio = ((math.log(imt.period) - math.log(periods[idx - 1]))
+                 / (math.log(periods[idx]) - math.log(periods[idx - 1])))
         return dict(
             (co, (min_above[co] - max_below[co]) * ratio + max_below[co])
-            for co in max_below)
+            for co in self._sa_array.dtype.names)
+
+    def get_coeffs(self, imts):
+        """
+        Batched lookup of the coefficients for several IMTs.
+
+        :param imts: a sequence of M intensity measure types
+        :returns:
+            a structured array of length M with a field for each
+            coefficient, so that ``C['a']`` is an array of M values
+        :raises KeyError:
+            If an IMT is not available in the table and no interpolation
+            can be done, or if its row misses some of the coefficients.
+        """
+        imts = tuple(imts)
+        try:
+            return self._cache[imts]
+        except KeyError:
+            pass
+        rows = [self[imt] for imt in imts]
+        names = list(rows[0]) if rows else []
+        array = numpy.zeros(
+            len(rows), [(name, numpy.float64) for name in names])
+        for i, row in enumerate(rows):
+            array[i] = tuple(row[name] for name in names)
+        self._cache[imts] = array
+        return array
@@ -38,7 +38,8 @@ Module exports :class:`BooreEtAl2014`,
 """
 import numpy as np
 
-from openquake.hazardlib.gsim.base import GMPE, CoeffsTable
+from openquake.hazardlib.gsim.base import (
+    GMPE, CoeffsTable, stack_mean_and_stddevs)
 from openquake.hazardlib import const
 from openquake.hazardlib.imt import PGA, PGV, SA
 
@@ -88,15 +89,41 @@ class BooreEtAl2014(GMPE):
         <.base.GroundShakingIntensityModel.get_mean_and_stddevs>`
         for spec of input and result values.
         """
+        pga_rock = self._get_pga_on_rock(self.COEFFS[PGA()], rup, dists)
+        return self._get_mean_and_stddevs(
+            sites, rup, dists, imt, stddev_types, pga_rock)
+
+    def get_mean_and_stddevs_multi(self, sites, rup, dists, imts,
+                                   stddev_types):
+        """
+        See :meth:`superclass method
+        <.base.GroundShakingIntensityModel.get_mean_and_stddevs_multi>`
+        for spec of input and result values.
+        """
+        if type(self).get_mean_and_stddevs is not \
+                BooreEtAl2014.get_mean_and_stddevs:  # overridden
+            return super().get_mean_and_stddevs_multi(
+                sites, rup, dists, imts, stddev_types)
+        # the PGA on rock does not depend on the IMT
+        pga_rock = self._get_pga_on_rock(self.COEFFS[PGA()], rup, dists)
+        return stack_mean_and_stddevs(
+            self._get_mean_and_stddevs(
+                sites, rup, dists, imt, stddev_types, pga_rock)
+            for imt in imts)
+
+    def _get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types,
+                              pga_rock):
+        """
+        Returns the mean and standard deviations for the given IMT
+        and PGA on rock
+        """
         # extracting dictionary of coefficients specific to required
         # intensity measure type.
         C = self.COEFFS[imt]
-        C_PGA = self.COEFFS[PGA()]
         if isinstance(imt, (PGA, PGV)):
             imt_per = 0.0
         else:
             imt_per = imt.period
-        pga_rock = self._get_pga_on_rock(C_PGA, rup, dists)
         mean = (self._get_magnitude_scaling_term(C, rup) +
                 self._get_path_scaling(C, dists, rup.mag) +
                 self._get_site_scaling(C, pga_rock, sites, imt_per, dists.rjb))
@@ -26,7 +26,8 @@ Module exports :class:`CampbellBozorgnia2014`
 """
 import numpy as np
 from math import exp, radians, cos
-from openquake.hazardlib.gsim.base import GMPE, CoeffsTable
+from openquake.hazardlib.gsim.base import (
+    GMPE, CoeffsTable, stack_mean_and_stddevs)
 from openquake.hazardlib import const
 from openquake.hazardlib.imt import PGA, PGV, SA
 
@@ -94,20 +95,53 @@ class CampbellBozorgnia2014(GMPE):
         <.base.GroundShakingIntensityModel.get_mean_and_stddevs>`
         for spec of input and result values.
         """
+        C_PGA = self.COEFFS[PGA()]
+        # Get mean and standard deviation of PGA on rock (Vs30 1100 m/s^2)
+        pga1100 = np.exp(self.get_mean_values(C_PGA, sites, rup, dists, None))
+        return self._get_mean_and_stddevs(
+            sites, rup, dists, imt, stddev_types, pga1100, {})
+
+    def get_mean_and_stddevs_multi(self, sites, rup, dists, imts,
+                                   stddev_types):
+        """
+        See :meth:`superclass method
+        <.base.GroundShakingIntensityModel.get_mean_and_stddevs_multi>`
+        for spec of input and result values.
+        """
+        if type(self).get_mean_and_stddevs is not \
+                CampbellBozorgnia2014.get_mean_and_stddevs:  # overridden
+            return super().get_mean_and_stddevs_multi(
+                sites, rup, dists, imts, stddev_types)
+        # the PGA on rock and on soil do not depend on the IMT
+        C_PGA = self.COEFFS[PGA()]
+        pga1100 = np.exp(self.get_mean_values(C_PGA, sites, rup, dists, None))
+        cache = {}
+        return stack_mean_and_stddevs(
+            self._get_mean_and_stddevs(
+                sites, rup, dists, imt, stddev_types, pga1100, cache)
+            for imt in imts)
+
+    def _get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types,
+                              pga1100, cache):
+        """
+        Returns the mean and standard deviations for the given IMT and
+        PGA on rock; the PGA on soil is stored in the cache dictionary
+        """
         # extract dictionaries of coefficients specific to required
         # intensity measure type and for PGA
         C = self.COEFFS[imt]
         C_PGA = self.COEFFS[PGA()]
 
-        # Get mean and standard deviation of PGA on rock (Vs30 1100 m/s^2)
-        pga1100 = np.exp(self.get_mean_values(C_PGA, sites, rup, dists, None))
         # Get mean and standard deviations for IMT
         mean = self.get_mean_values(C, sites, rup, dists, pga1100)
         if isinstance(imt, SA) and (imt.period <= 0.25):
             # According to Campbell & Bozorgnia (2013) [NGA West 2 Report]
             # If Sa (T) < PGA for T < 0.25 then set mean Sa(T) to mean PGA
             # Get PGA on soil
-            pga = self.get_mean_values(C_PGA, sites, rup, dists, pga1100)
+            if 'pga' not in cache:
+                cache['pga'] = self.get_mean_values(
+                    C_PGA, sites, rup, dists, pga1100)
+            pga = cache['pga']
             idx = mean <= pga
             mean[idx] = pga[idx]
         # Get standard deviations
@@ -22,7 +22,8 @@ Module exports :class:`ChiouYoungs2014`.
 import numpy as np
 import math
 
-from openquake.hazardlib.gsim.base import GMPE, CoeffsTable
+from openquake.hazardlib.gsim.base import (
+    GMPE, CoeffsTable, stack_mean_and_stddevs)
 from openquake.hazardlib import const
 from openquake.hazardlib.imt import PGA, PGV, SA
 
@@ -74,12 +75,40 @@ class ChiouYoungs2014(GMPE):
         <.base.GroundShakingIntensityModel.get_mean_and_stddevs>`
         for spec of input and result values.
         """
+        return self._get_mean_and_stddevs(
+            sites, rup, dists, imt, stddev_types,
+            self._get_rupture_terms(rup, dists))
+
+    def get_mean_and_stddevs_multi(self, sites, rup, dists, imts,
+                                   stddev_types):
+        """
+        See :meth:`superclass method
+        <.base.GroundShakingIntensityModel.get_mean_and_stddevs_multi>`
+        for spec of input and result values.
+        """
+        if type(self).get_mean_and_stddevs is not \
+                ChiouYoungs2014.get_mean_and_stddevs:  # overridden
+            return super().get_mean_and_stddevs_multi(
+                sites, rup, dists, imts, stddev_types)
+        # the rupture and distance terms do not depend on the IMT
+        terms = self._get_rupture_terms(rup, dists)
+        return stack_mean_and_stddevs(
+            self._get_mean_and_stddevs(
+                sites, rup, dists, imt, stddev_types, terms)
+            for imt in imts)
+
+    def _get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types,
+                              terms):
+        """
+        Returns the mean and standard deviations for the given IMT and
+        dictionary of IMT-independent terms
+        """
         # extracting dictionary of coefficients specific to required
         # intensity measure type.
         C = self.COEFFS[imt]
         # intensity on a reference soil is used for both mean
         # and stddev calculations.
-        ln_y_ref = self._get_ln_y_ref(rup, dists, C)
+        ln_y_ref = self._get_ln_y_ref(rup, dists, C, terms)
         # exp1 and exp2 are parts of eq. 12 and eq. 13,
         # calculate it once for both.
         exp1 = np.exp(C['phi3'] * (sites.vs30.clip(-np.inf, 1130) - 360))
@@ -159,11 +188,10 @@ class ChiouYoungs2014(GMPE):
                 ret.append(np.abs((1 + NL) * tau))
         return ret
 
-    def _get_ln_y_ref(self, rup, dists, C):
+    def _get_rupture_terms(self, rup, dists):
         """
-        Get an intensity on a reference soil.
-
-        Implements eq. 13a.
+        Get the terms of eq. 13a which do not depend on the IMT, as
+        a dictionary.
         """
         # reverse faulting flag
         Frv = 1. if 30 <= rup.rake <= 150 else 0.
@@ -187,6 +215,23 @@ class ChiouYoungs2014(GMPE):
                                   np.zeros_like(dists)) / 30.),
                              np.zeros_like(dists))
         dist_taper = dist_taper.astype(np.float64)
+        return dict(Frv=Frv, Fnm=Fnm, Fhw=Fhw, mag_test1=mag_test1,
+                    centered_dpp=centered_dpp, centered_ztor=centered_ztor,
+                    dist_taper=dist_taper)
+
+    def _get_ln_y_ref(self, rup, dists, C, terms):
+        """
+        Get an intensity on a reference soil.
+
+        Implements eq. 13a.
+        """
+        Frv = terms['Frv']
+        Fnm = terms['Fnm']
+        Fhw = terms['Fhw']
+        mag_test1 = terms['mag_test1']
+        centered_dpp = terms['centered_dpp']
+        centered_ztor = terms['centered_ztor']
+        dist_taper = terms['dist_taper']
         ln_y_ref = (
             # first part of eq. 11
             C['c1']
@@ -223,6 +223,88 @@ def get_source_model_05(node, fname, converter=default):
     return SourceModel(sorted(groups), node.get('name'), itime, stime)
 
 
+def get_source_tags(converter):
+    """
+    :returns: the tags of the source nodes understood by the converter
+    """
+    # the converter can be extended, like in the case of UCERFSource
+    return {name[8:] for name in dir(converter)
+            if name.startswith('convert_') and name.endswith('Source')}
+
+
+def iter_source_groups(fname, converter=default, smodel=None):
+    """
+    Parse a NRML source model file in streaming mode, by converting each
+    source as soon as its node is closed, and yield SourceGroup objects.
+    The memory occupation is given by the converted sources and not
+    by the full node tree, as in :func:`to_python`.
+
+    :param fname: the path to a source model file, in NRML 0.4 or 0.5
+    :param converter: a SourceConverter instance
+    :param smodel: if given, a dictionary to fill with the attributes
+                   of the sourceModel node
+    """
+    converter.fname = fname
+    vparser = ValidatingXmlParser(validators)
+    sources = []
+    source_ids = set()
+    found = False
+    source_tags = get_source_tags(converter)
+    release = source_tags | {'sourceGroup', 'sourceModel'}
+    for node in vparser.iterparse(fname, release):
+        tag, version = get_tag_version(node)
+        if tag in source_tags:
+            src = converter.convert_node(node)
+            if version == 'nrml/0.4':
+                if src.source_id in source_ids:
+                    raise DuplicatedID(
+                        'The source ID %s is duplicated!' % src.source_id)
+                source_ids.add(src.source_id)
+            sources.append(src)
+        elif tag == 'sourceGroup':
+            # the subnodes left are not sources, the converter will fail
+            sources.extend(map(converter.convert_node, node))
+            yield converter.build_source_group(node, sources)
+            sources = []
+        else:  # sourceModel
+            found = True
+            if smodel is not None:
+                smodel.update(node.attrib)
+            if version == 'nrml/0.4':
+                sources.extend(map(converter.convert_node, node))
+                groups = groupby(
+                    sources, operator.attrgetter('tectonic_region_type'))
+                for trt, srcs in groups.items():
+                    yield sourceconverter.SourceGroup(trt, srcs)
+            elif sources or len(node):
+                raise InvalidFile(
+                    '%s: you have an incorrect declaration '
+                    'xmlns="http://openquake.org/xmlns/nrml/0.5"; it should '
+                    'be xmlns="http://openquake.org/xmlns/nrml/0.4"' % fname)
+    if not found:
+        raise InvalidFile('%s: there is no sourceModel node' % fname)
+
+
+def read_source_model(fname, converter=default):
+    """
+    Streaming equivalent of `to_python(fname, converter)` for source
+    model files.
+
+    :param fname: the path to a source model file, in NRML 0.4 or 0.5
+    :param converter: a SourceConverter instance
+    :returns: a :class:`SourceModel` instance
+    """
+    attrs = {}
+    groups = sorted(iter_source_groups(fname, converter, attrs))
+    itime = attrs.get('investigation_time')
+    if itime is not None:
+        itime = valid.positivefloat(itime)
+    stime = attrs.get('start_time')
+    if stime is not None:
+        stime = valid.positivefloat(stime)
+    return SourceModel(groups, attrs.get('name'), itime, stime)
+
+
 validators = {
     'backarc': valid.boolean,
     'strike': valid.strike_range,
@@ -318,7 +400,7 @@ def pickle_source_models(fnames, converter,  monitor):
     fname2pik = {}
     for fname in fnames:
         if fname.endswith(('.xml', '.nrml')):
-            sm = to_python(fname, converter)
+            sm = read_source_model(fname, converter)
         elif fname.endswith('.hdf5'):
             sm = sourceconverter.to_python(fname, converter)
         else:
@@ -20,6 +20,7 @@ import numpy
 
 F32 = numpy.float32
 F64 = numpy.float64
+U32 = numpy.uint32
 BYTES_PER_FLOAT = 8
 
 
@@ -318,6 +319,258 @@ class ProbabilityMap(dict):
             self[sid] = ProbabilityCurve(prob)
 
 
+class DenseProbabilityMap(object):
+    """
+    An alternative to :class:`ProbabilityMap` with the same API, storing
+    the probabilities in a single array of shape (N, L, I) and the site IDs
+    in an ordered array of length N. The composition operators are
+    implemented with whole-array operations, without looping on the sites.
+
+    >>> pmap = DenseProbabilityMap.build(3, 1, [2, 0], initvalue=.1)
+    >>> pmap |= ProbabilityMap.build(3, 1, [1, 2], initvalue=.5)
+    >>> pmap.sids
+    array([0, 1, 2], dtype=uint32)
+    >>> pmap[2]
+    <ProbabilityCurve
+    [[0.55]
+     [0.55]
+     [0.55]]>
+    """
+    @classmethod
+    def build(cls, shape_y, shape_z, sids, initvalue=0.):
+        """
+        :param shape_y: the total number of intensity measure levels
+        :param shape_z: the number of inner levels
+        :param sids: a set of site indices
+        :param initvalue: the initial value of the probability (default 0)
+        :returns: a DenseProbabilityMap
+        """
+        sids = numpy.unique(numpy.array(list(sids), U32))
+        array = numpy.empty((len(sids), shape_y, shape_z), F64)
+        array.fill(initvalue)
+        return cls(shape_y, shape_z, sids, array)
+
+    @classmethod
+    def from_array(cls, array, sids):
+        """
+        :param array: array of shape (N, L) or (N, L, I)
+        :param sids: array of N site IDs
+        """
+        n_sites = len(sids)
+        n = len(array)
+        if n_sites != n:
+            raise ValueError('Passed %d site IDs, but the array has length %d'
+                             % (n_sites, n))
+        if len(array.shape) == 2:  # shape (N, L) -> (N, L, 1)
+            array = array.reshape(array.shape + (1,))
+        sids = numpy.array(sids, U32)
+        order = numpy.argsort(sids)
+        return cls(array.shape[1], array.shape[2], sids[order], array[order])
+
+    @classmethod
+    def from_pmap(cls, pmap):
+        """
+        :param pmap: a ProbabilityMap or a DenseProbabilityMap
+        :returns: a DenseProbabilityMap with the same content
+        """
+        if isinstance(pmap, cls):
+            return pmap
+        self = cls(pmap.shape_y, pmap.shape_z)
+        if pmap:
+            self.sids, self.array = pmap.sids, pmap.array
+        return self
+
+    def __init__(self, shape_y, shape_z=1, sids=(), array=None):
+        self.shape_y = shape_y
+        self.shape_z = shape_z
+        self.sids = numpy.array(sids, U32)
+        if array is None:
+            array = numpy.zeros((len(self.sids), shape_y, shape_z), F64)
+        self.array = array
+
+    def _indices(self, sids):
+        # returns the indices of the given sids and a mask of the known ones
+        idx = numpy.searchsorted(self.sids, sids)
+        found = idx < len(self.sids)
+        found[found] = self.sids[idx[found]] == sids[found]
+        return idx, found
+
+    def _index(self, sid):
+        idx = numpy.searchsorted(self.sids, sid)
+        if idx == len(self.sids) or self.sids[idx] != sid:
+            raise KeyError(sid)
+        return idx
+
+    def _add(self, sids, array):
+        # add new sites, keeping the site IDs ordered
+        sids = numpy.concatenate([self.sids, sids])
+        order = numpy.argsort(sids, kind='mergesort')
+        self.sids = sids[order]
+        self.array = numpy.concatenate([self.array, array])[order]
+
+    def __len__(self):
+        return len(self.sids)
+
+    def __bool__(self):
+        return len(self.sids) > 0
+
+    def __iter__(self):
+        return iter(self.sids.tolist())
+
+    def __contains__(self, sid):
+        try:
+            self._index(sid)
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, sid):
+        # NB: the returned curve is a view over the underlying array
+        return ProbabilityCurve(self.array[self._index(sid)])
+
+    def __setitem__(self, sid, pcurve):
+        try:
+            self.array[self._index(sid)] = pcurve.array
+        except KeyError:
+            self._add(numpy.array([sid], U32), pcurve.array[None])
+
+    def get(self, sid, default=None):
+        try:
+            return self[sid]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(sid, self[sid]) for sid in self]
+
+    def setdefault(self, sid, value):
+        """
+        Works like `dict.setdefault`: if the `sid` key is missing, it fills
+        it with an array and returns the associate ProbabilityCurve
+
+        :param sid: site ID
+        :param value: value used to fill the returned ProbabilityCurve
+        """
+        try:
+            return self[sid]
+        except KeyError:
+            array = numpy.empty((1, self.shape_y, self.shape_z), F64)
+            array.fill(value)
+            self._add(numpy.array([sid], U32), array)
+            return self[sid]
+
+    @property
+    def nbytes(self):
+        """The size of the underlying array"""
+        return BYTES_PER_FLOAT * self.array.size
+
+    # used when exporting to HDF5
+    def convert(self, imtls, nsites, idx=0):
+        """
+        Convert a probability map into a composite array of length `nsites`
+        and dtype `imtls.dt`.
+
+        :param imtls:
+            DictArray instance
+        :param nsites:
+            the total number of sites
+        :param idx:
+            index on the z-axis (default 0)
+        """
+        curves = numpy.zeros(nsites, imtls.dt)
+        for imt in curves.dtype.names:
+            curves[imt][self.sids] = self.array[:, imtls(imt), idx]
+        return curves
+
+    def convert2(self, imtls, sids):
+        """
+        Convert a probability map into a composite array of shape (N,)
+        and dtype `imtls.dt`.
+
+        :param imtls:
+            DictArray instance
+        :param sids:
+            the IDs of the sites we are interested in
+        :returns:
+            an array of curves of shape (N,)
+        """
+        assert self.shape_z == 1, self.shape_z
+        sids = numpy.array(sids, U32)
+        idx, found = self._indices(sids)
+        curves = numpy.zeros(len(sids), imtls.dt)
+        for imt in curves.dtype.names:  # the missing poes will be zeros
+            curves[imt][found] = self.array[idx[found], imtls(imt), 0]
+        return curves
+
+    def filter(self, sids):
+        """
+        Extracs a submap of self for the given sids.
+        """
+        idx, found = self._indices(numpy.unique(numpy.array(sids, U32)))
+        idx = idx[found]
+        return self.__class__(self.shape_y, self.shape_z,
+                              self.sids[idx], self.array[idx])
+
+    def extract(self, inner_idx):
+        """
+        Extracts a component of the underlying array, specified by the
+        index `inner_idx`.
+        """
+        return self.__class__(self.shape_y, 1, self.sids,
+                              self.array[:, :, [inner_idx]])
+
+    def __ior__(self, other):
+        other = self.from_pmap(other)
+        if not other:
+            return self
+        idx, found = self._indices(other.sids)
+        i = idx[found]
+        self.array[i] = 1. - (1. - self.array[i]) * (1. - other.array[found])
+        if not found.all():
+            self._add(other.sids[~found], other.array[~found])
+        return self
+
+    def __or__(self, other):
+        new = self.__class__(self.shape_y, self.shape_z,
+                             self.sids, self.array.copy())
+        new |= other
+        return new
+
+    __ror__ = __or__
+
+    def __mul__(self, other):
+        if hasattr(other, 'get'):  # a probability map
+            other = self.from_pmap(other)
+            new = self.__class__(self.shape_y, self.shape_z,
+                                 self.sids, self.array.copy())
+            idx, found = self._indices(other.sids)
+            new.array[idx[found]] *= other.array[found]
+            new._add(other.sids[~found], other.array[~found])
+            return new
+        assert 0. <= other <= 1., other  # must be a probability
+        return self.__class__(self.shape_y, self.shape_z,
+                              self.sids, self.array * other)
+
+    def __invert__(self):
+        ok = (self.array != 1.).any(axis=(1, 2))
+        # store only nonzero probabilities
+        return self.__class__(self.shape_y, self.shape_z,
+                              self.sids[ok], 1. - self.array[ok])
+
+    def __toh5__(self):
+        return dict(array=self.array, sids=self.sids), {}
+
+    def __fromh5__(self, dic, attrs):
+        self.array = dic['array'][()]
+        self.sids = dic['sids'][()]
+        self.shape_y = self.array.shape[1]
+        self.shape_z = self.array.shape[2]
+
+    def __repr__(self):
+        return '<%s N=%d, L=%d, I=%d>' % (
+            self.__class__.__name__, len(self), self.shape_y, self.shape_z)
+
+
 def get_shape(pmaps):
     """
     :param pmaps: a set of homogenous ProbabilityMaps
@@ -20,9 +20,12 @@
 Module :mod:`openquake.hazardlib.site` defines :class:`Site`.
 """
 import numpy
+from scipy.spatial import cKDTree
 from shapely import geometry
 from openquake.baselib.general import split_in_blocks, not_equal
-from openquake.hazardlib.geo.utils import fix_lon, cross_idl
+from openquake.baselib.parallel import share
+from openquake.hazardlib.geo.utils import (
+    fix_lon, cross_idl, spherical_to_cartesian)
 from openquake.hazardlib.geo.mesh import Mesh
 
 
@@ -109,6 +112,84 @@ def _extract(array_or_float, indices):
         return array_or_float
 
 
+class SiteIndex(object):
+    """
+    A spatial index for the sites of a :class:`SiteCollection`, i.e. a
+    :class:`scipy.spatial.cKDTree` built on the Cartesian coordinates of
+    the sites, in km. The queries by bounding box are exact, while the
+    queries by distance from a rupture return a superset of the sites
+    within the given distance, to be refined by computing the distances.
+
+    :param lons: longitudes of the sites
+    :param lats: latitudes of the sites
+    :param depths: depths of the sites
+    """
+    def __init__(self, lons, lats, depths):
+        self.lons = lons
+        self.lats = lats
+        self.idl = cross_idl(lons.min(), lons.max())
+        self.max_depth = numpy.abs(depths).max()  # distance from the surface
+        self.kdtree = cKDTree(spherical_to_cartesian(lons, lats, depths))
+
+    def _within_ball(self, center, radius):
+        idxs = self.kdtree.query_ball_point(center, radius * (1 + 1E-6))
+        return numpy.sort(numpy.array(idxs, dtype=numpy.intp))
+
+    def within_bbox(self, bbox):
+        """
+        :param bbox:
+            a quartet (min_lon, min_lat, max_lon, max_lat)
+        :returns:
+            the indices of the sites within the bounding box
+        """
+        min_lon, min_lat, max_lon, max_lat = bbox
+        idl = self.idl or cross_idl(min_lon, max_lon)
+        if idl:
+            min_lon, max_lon = min_lon % 360, max_lon % 360
+        if min_lon >= max_lon or min_lat >= max_lat:
+            return numpy.array([], numpy.intp)
+        delta = (max_lon - min_lon) / 2
+        lat1, lat2 = max(min_lat, -90), min(max_lat, 90)
+        if delta > 90:  # the ball would cover most of the Earth
+            idxs = numpy.arange(len(self.lons))
+        else:
+            # the farthest points of the box from its center are the corners
+            center = spherical_to_cartesian(min_lon + delta, (lat1 + lat2) / 2)
+            corners = spherical_to_cartesian([min_lon] * 2, [lat1, lat2])
+            radius = numpy.sqrt(((corners - center) ** 2).sum(axis=1)).max()
+            idxs = self._within_ball(center, radius + self.max_depth)
+        lons, lats = self.lons[idxs], self.lats[idxs]
+        if idl:
+            lons = lons % 360
+        mask = (min_lon < lons) * (lons < max_lon) * \
+               (min_lat < lats) * (lats < max_lat)
+        return idxs[mask]
+
+    def within_distance(self, mesh, distance, kind):
+        """
+        :param mesh:
+            the mesh of a rupture surface
+        :param distance:
+            the maximum distance in km
+        :param kind:
+            'rrup' or 'rjb'
+        :returns:
+            the indices of the sites which could be within the distance
+        """
+        if kind == 'rrup':  # Euclidean distance from the points of the mesh
+            xyz, radius = mesh.xyz, distance
+        elif kind == 'rjb':  # distance from the projection of the mesh
+            xyz = spherical_to_cartesian(mesh.lons.flat, mesh.lats.flat)
+            radius = distance + self.max_depth
+        else:
+            raise ValueError('Cannot filter on %s' % kind)
+        center = xyz.mean(axis=0)
+        rho = numpy.sqrt(((xyz - center) ** 2).sum(axis=1)).max()
+        # the 1 km of tolerance accounts for the distances on the
+        # projection plane computed by Mesh.get_joyner_boore_distance
+        return self._within_ball(center, rho + radius + 1)
+
+
 # dtype of each valid site parameter
 site_param_dt = {
     'sids': numpy.uint32,
@@ -251,7 +332,7 @@ class SiteCollection(object):
         if len(indices) == len(self):
             return self
         new = object.__new__(self.__class__)
-        indices = numpy.uint32(sorted(indices))
+        indices = numpy.uint32(numpy.sort(indices))
         new.array = self.array[indices]
         new.complete = self.complete
         return new
@@ -375,6 +456,22 @@ class SiteCollection(object):
             for rec in self.array])
         return self.filter(mask)
 
+    @property
+    def index(self):
+        """
+        A :class:`SiteIndex` built lazily on the current array; it is not
+        pickled, so it is rebuilt in the workers when needed
+        """
+        try:
+            array, index = self._index
+        except AttributeError:
+            array = None
+        if array is not self.array:
+            index = SiteIndex(self.array['lons'], self.array['lats'],
+                              self.array['depths'])
+            self._index = self.array, index
+        return index
+
     def within_bbox(self, bbox):
         """
         :param bbox:
@@ -382,17 +479,11 @@ class SiteCollection(object):
         :returns:
             site IDs within the bounding box
         """
-        min_lon, min_lat, max_lon, max_lat = bbox
-        lons, lats = self.array['lons'], self.array['lats']
-        if cross_idl(lons.min(), lons.max()) or cross_idl(min_lon, max_lon):
-            lons = lons % 360
-            min_lon, max_lon = min_lon % 360, max_lon % 360
-        mask = (min_lon < lons) * (lons < max_lon) * \
-               (min_lat < lats) * (lats < max_lat)
-        return mask.nonzero()[0]
+        return self.index.within_bbox(bbox)
 
     def __getstate__(self):
-        return dict(array=self.array, complete=self.complete)
+        # when sent to the workers the array is shared, not copied
+        return dict(array=share(self.array), complete=self.complete)
 
     def __getitem__(self, sid):
         """
@@ -18,6 +18,7 @@ Module :mod:`openquake.hazardlib.source.area` defines :class:`AreaSource`.
 """
 import math
 from copy import deepcopy
+import numpy
 from openquake.hazardlib import geo, mfd
 from openquake.hazardlib.source.point import PointSource
 from openquake.hazardlib.source.base import ParametricSeismicSource
@@ -129,6 +130,41 @@ class AreaSource(ParametricSeismicSource):
                     surface, occ_rate, self.temporal_occurrence_model)
                 yield rupture
 
+    def get_occurrence_rates(self):
+        """
+        :returns:
+            the occurrence rates of the ruptures, in the same order as
+            :meth:`iter_ruptures`, without building the ruptures
+        """
+        polygon_mesh = self.polygon.discretize(self.area_discretization)
+        rates = PointSource._get_rates(self, 1.0 / len(polygon_mesh))
+        return numpy.tile(rates.flatten(), len(polygon_mesh))
+
+    def get_ruptures(self, indices):
+        """
+        :param indices: sorted indices of the ruptures in iter_ruptures
+        :returns: the list of the corresponding ruptures
+        """
+        polygon_mesh = self.polygon.discretize(self.area_discretization)
+        rate_scaling_factor = 1.0 / len(polygon_mesh)
+        num_ref = PointSource._get_rates(self, rate_scaling_factor).size
+        [epicenter0] = polygon_mesh[0:1]
+        ref_ruptures = PointSource._get_ruptures_at_location(
+            self, epicenter0, [idx % num_ref for idx in indices],
+            rate_scaling_factor)
+        ruptures = []
+        for idx, rup in zip(indices, ref_ruptures):
+            # translate the reference rupture to its epicenter
+            p = idx // num_ref
+            [epicenter] = polygon_mesh[p:p + 1]
+            hypocenter = deepcopy(epicenter)
+            hypocenter.depth = rup.hypocenter.depth
+            ruptures.append(ParametricProbabilisticRupture(
+                rup.mag, rup.rake, self.tectonic_region_type, hypocenter,
+                rup.surface.translate(epicenter0, epicenter),
+                rup.occurrence_rate, self.temporal_occurrence_model))
+        return ruptures
+
     def count_ruptures(self):
         """
         See
@@ -88,6 +88,31 @@ class MultiPointSource(ParametricSeismicSource):
             for rupture in ps.iter_ruptures():
                 yield rupture
 
+    def get_occurrence_rates(self):
+        """
+        :returns:
+            the occurrence rates of the ruptures, in the same order as
+            :meth:`iter_ruptures`, without building the ruptures
+        """
+        return numpy.concatenate(
+            [ps.get_occurrence_rates() for ps in self])
+
+    def get_ruptures(self, indices):
+        """
+        :param indices: sorted indices of the ruptures in iter_ruptures
+        :returns: the list of the corresponding ruptures
+        """
+        indices = numpy.array(indices)
+        ruptures = []
+        start = 0
+        for ps in self:
+            stop = start + ps.num_ruptures
+            ok = (indices >= start) & (indices < stop)
+            if ok.any():
+                ruptures.extend(ps.get_ruptures(indices[ok] - start))
+            start = stop
+        return ruptures
+
     def count_ruptures(self):
         """
         See
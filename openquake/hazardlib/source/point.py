@@ -16,8 +16,12 @@
 """
 Module :mod:`openquake.hazardlib.source.point` defines :class:`PointSource`.
 """
+import copy
 import math
+import operator
+import numpy
 from openquake.baselib.slots import with_slots
+from openquake.hazardlib.pmf import PMF
 from openquake.hazardlib.geo import Point, geodetic
 from openquake.hazardlib.geo.surface.planar import PlanarSurface
 from openquake.hazardlib.source.base import ParametricSeismicSource
@@ -164,6 +168,24 @@ class PointSource(ParametricSeismicSource):
                 self.max_radius = radius
         return self.max_radius
 
+    def collapsed(self):
+        """
+        :returns:
+            a copy of the source with a single nodal plane, the most likely
+            one, and a single hypocenter, at the average depth, generating
+            a single rupture per magnitude with the total occurrence rate
+        """
+        src = copy.copy(self)
+        _prob, np = max(self.nodal_plane_distribution.data,
+                        key=operator.itemgetter(0))
+        depth = sum(prob * depth
+                    for prob, depth in self.hypocenter_distribution.data)
+        depth = min(max(depth, self.upper_seismogenic_depth),
+                    self.lower_seismogenic_depth)  # avoid rounding issues
+        src.nodal_plane_distribution = PMF([(1, np)])
+        src.hypocenter_distribution = PMF([(1, depth)])
+        return src
+
     def iter_ruptures(self):
         """
         See :meth:
@@ -213,6 +235,54 @@ class PointSource(ParametricSeismicSource):
                         surface, occurrence_rate,
                         self.temporal_occurrence_model)
 
+    def _get_rates(self, rate_scaling_factor=1):
+        # array of rates of shape (num_mags, num_planes, num_depths)
+        mag_rates = numpy.array(
+            [rate for mag, rate in self.get_annual_occurrence_rates()])
+        np_probs = numpy.array(
+            [prob for prob, np in self.nodal_plane_distribution.data])
+        hc_probs = numpy.array(
+            [prob for prob, depth in self.hypocenter_distribution.data])
+        return (mag_rates[:, None, None] * np_probs[None, :, None] *
+                hc_probs[None, None, :] * rate_scaling_factor)
+
+    def get_occurrence_rates(self):
+        """
+        :returns:
+            the occurrence rates of the ruptures, in the same order as
+            :meth:`iter_ruptures`, without building the ruptures
+        """
+        return self._get_rates().flatten()
+
+    def get_ruptures(self, indices):
+        """
+        :param indices: sorted indices of the ruptures in iter_ruptures
+        :returns: the list of the corresponding ruptures
+        """
+        return self._get_ruptures_at_location(self.location, indices)
+
+    def _get_ruptures_at_location(self, location, indices,
+                                  rate_scaling_factor=1):
+        # NB: this is called also by AreaSource, hence the explicit
+        # PointSource._get_rates and PointSource._get_rupture_surface
+        rates = PointSource._get_rates(self, rate_scaling_factor)
+        mags = self.get_annual_occurrence_rates()
+        nps = self.nodal_plane_distribution.data
+        hcs = self.hypocenter_distribution.data
+        ruptures = []
+        for idx in indices:
+            m, n, h = numpy.unravel_index(idx, rates.shape)
+            mag, np, hc_depth = mags[m][0], nps[n][1], hcs[h][1]
+            hypocenter = Point(latitude=location.latitude,
+                               longitude=location.longitude,
+                               depth=hc_depth)
+            surface = PointSource._get_rupture_surface(
+                self, mag, np, hypocenter)
+            ruptures.append(ParametricProbabilisticRupture(
+                mag, np.rake, self.tectonic_region_type, hypocenter,
+                surface, rates[m, n, h], self.temporal_occurrence_model))
+        return ruptures
+
     def count_ruptures(self):
         """
         See :meth:
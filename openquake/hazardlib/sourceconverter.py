@@ -758,6 +758,21 @@ class SourceConverter(RuptureConverter):
         :returns:
             a :class:`SourceGroup` instance
         """
+        return self.build_source_group(node, map(self.convert_node, node))
+
+    def build_source_group(self, node, sources):
+        """
+        Build a SourceGroup object from the given sources; this is used
+        also when streaming, when the sources are converted before the
+        sourceGroup node is closed.
+
+        :param node:
+            a node with tag sourceGroup (the subnodes are ignored)
+        :param sources:
+            an iterable over the already converted sources of the group
+        :returns:
+            a :class:`SourceGroup` instance
+        """
         trt = node['tectonicRegion']
         srcs_weights = node.attrib.get('srcs_weights')
         grp_probability = node.attrib.get('grp_probability')
@@ -765,8 +780,9 @@ class SourceConverter(RuptureConverter):
                      if k not in ('name', 'src_interdep', 'rup_interdep',
                                   'srcs_weights')}
         sg = SourceGroup(trt)
-        for src_node in node:
-            src = self.convert_node(src_node)
+        num_sources = 0
+        for src in sources:
+            num_sources += 1
             # transmit the group attributes to the underlying source
             for attr, value in grp_attrs.items():
                 if attr == 'tectonicRegion':
@@ -777,9 +793,9 @@ class SourceConverter(RuptureConverter):
                     setattr(src, attr, node[attr])
             sg.update(src)
         if srcs_weights is not None:
-            if len(srcs_weights) != len(node):
+            if len(srcs_weights) != num_sources:
                 raise ValueError('There are %d srcs_weights but %d source(s)'
-                                 % (len(srcs_weights), len(node)))
+                                 % (len(srcs_weights), num_sources))
         sg.name = node.attrib.get('name')
         sg.src_interdep = node.attrib.get('src_interdep', 'indep')
         sg.rup_interdep = node.attrib.get('rup_interdep', 'indep')
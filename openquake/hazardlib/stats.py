@@ -18,6 +18,7 @@
 """
 Utilities to compute mean and quantile curves
 """
+import functools
 import numpy
 
 _mean = None  # set by mean_curve and std_curve
@@ -67,16 +68,26 @@ def quantile_curve(quantile, curves, weights=None):
     else:
         weights = numpy.array(weights)
         assert len(weights) == R, (len(weights), R)
-    result = numpy.zeros(curves.shape[1:])
-    for idx, _ in numpy.ndenumerate(result):
-        data = numpy.array([a[idx] for a in curves])
-        sorted_idxs = numpy.argsort(data)
-        sorted_weights = weights[sorted_idxs]
-        sorted_data = data[sorted_idxs]
-        cum_weights = numpy.cumsum(sorted_weights)
-        # get the quantile from the interpolated CDF
-        result[idx] = numpy.interp(quantile, cum_weights, sorted_data)
-    return result
+    # work on all the elements of the curves at once, column by column
+    data = curves.reshape(R, -1)
+    cols = numpy.arange(data.shape[1])
+    sorted_idxs = numpy.argsort(data, axis=0)
+    sorted_data = data[sorted_idxs, cols].astype(float)
+    cum_weights = numpy.cumsum(weights[sorted_idxs], axis=0)
+    # get the quantile from the interpolated CDF, i.e. compute
+    # numpy.interp(quantile, cum_weights, sorted_data) for each column
+    j = (cum_weights <= quantile).sum(axis=0) - 1
+    k = numpy.clip(j, 0, max(R - 2, 0))
+    x0, y0 = cum_weights[k, cols], sorted_data[k, cols]
+    if R > 1:
+        x1, y1 = cum_weights[k + 1, cols], sorted_data[k + 1, cols]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            result = (y1 - y0) / (x1 - x0) * (quantile - x0) + y0
+    else:
+        result = y0.copy()
+    result[j == -1] = sorted_data[0, j == -1]
+    result[j == R - 1] = sorted_data[-1, j == R - 1]
+    return result.reshape(curves.shape[1:])
 
 
 def max_curve(values, weights=None):
@@ -193,6 +204,184 @@ def apply_stat(f, arraylist, *extra, **kw):
         return f(arraylist, *extra, **kw)
 
 
+def get_quantile(func):
+    """
+    :returns: the quantile of a function quantile_curve or None
+    """
+    if isinstance(func, functools.partial) and func.func is quantile_curve:
+        return func.args[0]
+
+
+def _streamable(stats):
+    # True if all the statistics can be computed by StreamingStats
+    return all(func in (mean_curve, std_curve, max_curve) or
+               get_quantile(func) is not None for func in stats)
+
+
+def _log_gamma(quantile_error):
+    # logarithm of the ratio between the bounds of the bins of the sketch
+    return numpy.log((1 + quantile_error) / (1 - quantile_error))
+
+
+def get_stats_nbytes(stats, num_values, quantile_error, minval=1E-16):
+    """
+    :param stats: a sequence of S statistic functions
+    :param num_values: the number of values per element (realizations)
+    :param quantile_error: the relative error on the quantiles
+    :returns: the bytes per element needed by :class:`StreamingStats`
+    """
+    exact = num_values * 8
+    if not _streamable(stats):
+        return exact
+    streaming = 3 * 8  # mean, M2, max
+    if any(get_quantile(func) is not None for func in stats):
+        kmin = int(numpy.ceil(numpy.log(minval) / _log_gamma(quantile_error)))
+        # the histogram and the temporary array used to update it
+        streaming += 2 * (2 - kmin) * 8
+    return min(exact, streaming)
+
+
+class StreamingStats(object):
+    """
+    Compute statistics on values of shape `shape` coming in blocks of
+    realizations, without keeping all of them in memory. As long as the
+    received values take less than `maxbytes` bytes, they are kept and
+    the statistics are computed exactly with :func:`compute_stats`.
+    Then, if all the statistics are supported (mean, std, max and
+    quantiles), they are computed in streaming: the mean and the standard
+    deviation are exact (up to rounding errors), while the quantiles are
+    read from a sketch, i.e. a weighted histogram of the values with
+    logarithmic bins. The sketch returns a value within a relative error
+    `quantile_error` from the value at the requested weighted rank,
+    without interpolating between consecutive values as
+    :func:`quantile_curve` does. Values smaller than `minval` are counted
+    as zeros and the values are expected not to be larger than 1, as for
+    PoEs.
+
+    >>> ss = StreamingStats([mean_curve, max_curve], (2,), maxbytes=16)
+    >>> ss.update([[.1, .2]], [.5])
+    >>> ss.update([[.3, .4]], [.5])  # the limit is exceeded
+    >>> ss.streaming
+    True
+    >>> ss.get()
+    array([[0.2, 0.3],
+           [0.3, 0.4]])
+    """
+    def __init__(self, stats, shape, maxbytes=None, quantile_error=.01,
+                 minval=1E-16):
+        self.stats = stats
+        self.shape = tuple(shape)
+        self.maxbytes = maxbytes
+        self.log_gamma = _log_gamma(quantile_error)
+        self.kmin = int(numpy.ceil(numpy.log(minval) / self.log_gamma))
+        self.values = []
+        self.weights = []
+        self.nbytes = 0
+        self.streaming = False
+        self.quantiles = [get_quantile(func) for func in stats]
+
+    @property
+    def num_bins(self):
+        """
+        The number of bins of the sketch, i.e. the keys from kmin to 0
+        plus the bin for the values smaller than minval
+        """
+        return 2 - self.kmin
+
+    def update(self, values, weights):
+        """
+        :param values: an array of shape (R,) + shape
+        :param weights: R weights
+        """
+        values = numpy.array(values, float)
+        if self.streaming:
+            self._stream(values, numpy.array(weights, float))
+            return
+        self.values.append(values)
+        self.weights.extend(weights)
+        self.nbytes += values.nbytes
+        if (self.maxbytes and self.nbytes > self.maxbytes and
+                _streamable(self.stats)):
+            # switch to streaming mode
+            self.streaming = True
+            self.W = 0
+            self.mean = numpy.zeros(self.shape)
+            self.M2 = numpy.zeros(self.shape)
+            self.max = numpy.full(self.shape, -numpy.inf)
+            if any(q is not None for q in self.quantiles):
+                self.hist = numpy.zeros(
+                    (self.num_bins, numpy.prod(self.shape, dtype=int)))
+            else:
+                self.hist = None
+            self._stream(numpy.concatenate(self.values),
+                         numpy.array(self.weights))
+            self.values = []
+            self.weights = []
+
+    def _stream(self, values, weights):
+        # merge the weighted mean and M2 of the block with the accumulated
+        # ones, with the parallel algorithm by Chan et al. generalized by
+        # West to the weighted case
+        Wb = weights.sum()
+        mean = numpy.einsum('i,i...', weights, values) / Wb
+        M2 = numpy.einsum('i,i...', weights, (values - mean) ** 2)
+        W = self.W + Wb
+        delta = mean - self.mean
+        self.mean += delta * Wb / W
+        self.M2 += M2 + delta ** 2 * self.W * Wb / W
+        self.W = W
+        numpy.maximum(self.max, values.max(axis=0), out=self.max)
+        if self.hist is not None:
+            # keys such that gamma ** (key - 1) < value <= gamma ** key
+            values = values.reshape(len(values), -1)
+            with numpy.errstate(divide='ignore'):
+                keys = numpy.ceil(numpy.log(values) / self.log_gamma)
+            bins = numpy.clip(keys - self.kmin + 1, 0, self.num_bins - 1)
+            bins[keys < self.kmin] = 0
+            nb, nc = self.hist.shape
+            idx = bins.astype(numpy.int64) * nc + numpy.arange(nc)
+            self.hist += numpy.bincount(
+                idx.flat, numpy.repeat(weights, nc), nb * nc).reshape(nb, nc)
+
+    def _quantiles(self):
+        # yield the quantiles from the sketch
+        cum = numpy.cumsum(self.hist, axis=0)
+        gamma = numpy.exp(self.log_gamma)
+        for q in self.quantiles:
+            if q is None:
+                yield
+                continue
+            # the first nonempty bin where the cumulative weight reaches q * W
+            j = numpy.minimum(((cum < q * self.W) | (cum <= 0)).sum(axis=0),
+                              self.num_bins - 1)
+            keys = j - 1 + self.kmin
+            yield numpy.where(j == 0, 0, 2 * gamma ** keys / (gamma + 1)
+                              ).reshape(self.shape)
+
+    def get(self):
+        """
+        :returns: an array of shape (S,) + shape, with S the number of stats
+        """
+        if not self.streaming:
+            return compute_stats(numpy.concatenate(self.values),
+                                 self.stats, self.weights)
+        result = numpy.zeros((len(self.stats),) + self.shape)
+        if self.hist is None:
+            quantiles = self.quantiles  # all None
+        else:
+            quantiles = self._quantiles()
+        for i, (func, quantile) in enumerate(zip(self.stats, quantiles)):
+            if func is mean_curve:
+                result[i] = self.mean
+            elif func is std_curve:
+                result[i] = numpy.sqrt(self.M2)
+            elif func is max_curve:
+                result[i] = self.max
+            else:
+                result[i] = quantile
+        return result
+
+
 def set_rlzs_stats(dstore, prefix, arrayNR=None):
     """
     :param dstore: a DataStore object
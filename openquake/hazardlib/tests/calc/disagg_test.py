@@ -47,6 +47,33 @@ class DigitizeLonsTestCase(unittest.TestCase):
         numpy.testing.assert_equal(idx, expected)
 
 
+class SparseMatrixTestCase(unittest.TestCase):
+
+    def test_multiply_at(self):
+        shape = (2, 3, 1, 2, 2)
+        bins = numpy.array([5, 0, 5, 3])
+        pnes = numpy.array([[.9, .8], [.5, .5], [.9, .1], [.2, .3]])
+        mat = disagg.SparseMatrix(shape, fill=1.)
+        mat.multiply_at(bins[:2], pnes[:2])
+        mat.multiply_at(bins[2:], pnes[2:])
+        self.assertEqual(list(mat.bins), [0, 3, 5])
+
+        # same as the loop on a dense matrix
+        dense = numpy.ones(shape)
+        for b, pne in zip(bins, pnes):
+            dense.reshape(-1, 2)[b] *= pne
+        numpy.testing.assert_equal(mat.todense(), dense)
+        numpy.testing.assert_equal(mat.complement().todense(), 1. - dense)
+
+    def test_agg(self):
+        shape = (1, 2, 1, 1, 1)
+        m1 = disagg.SparseMatrix(shape, [0], numpy.array([[.5]]))
+        m2 = disagg.SparseMatrix(shape, [1], numpy.array([[.2]]))
+        m3 = disagg.SparseMatrix(shape, [0], numpy.array([[.5]]))
+        agg = m1.agg(m2).agg(m3)
+        numpy.testing.assert_allclose(agg.todense().ravel(), [.75, .2])
+
+
 class DisaggregateTestCase(unittest.TestCase):
     def setUp(self):
         d = os.path.dirname(os.path.dirname(__file__))
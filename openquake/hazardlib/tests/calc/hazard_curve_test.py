@@ -22,8 +22,11 @@ from openquake.baselib.parallel import Starmap, sequential_apply
 from openquake.hazardlib import const
 from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.tom import PoissonTOM
-from openquake.hazardlib.calc.hazard_curve import calc_hazard_curves
+from openquake.baselib.general import DictArray
+from openquake.hazardlib.calc.hazard_curve import (
+    calc_hazard_curves, classical)
 from openquake.hazardlib.calc.filters import SourceFilter, IntegrationDistance
+from openquake.hazardlib.contexts import ContextMaker
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.gsim import akkar_bommer_2010
 from openquake.hazardlib.pmf import PMF
@@ -173,3 +176,122 @@ class HazardCurvesParallelTestCase(unittest.TestCase):
         for name in curves_par.dtype.names:
             numpy.testing.assert_almost_equal(
                 curves_seq[name], curves_par[name])
+
+
+class HypocentralSadigh(SadighEtAl1997):
+    # a GSIM reading the hypocenter, which is not a declared rupture parameter
+    def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
+        mean, stddevs = super().get_mean_and_stddevs(
+            sites, rup, dists, imt, stddev_types)
+        return mean + rup.hypocenter.depth / 10., stddevs
+
+
+class BrokenSadigh(SadighEtAl1997):
+    # a GSIM with a bug raising an AttributeError
+    def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
+        return sites.missing_param, []
+
+
+class VectorizedRupturesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sitecol = SiteCollection([
+            Site(Point(30.0, 30.0), 760., True, 1.0, 1.0),
+            Site(Point(30.25, 30.25), 760., True, 1.0, 1.0),
+            Site(Point(30.4, 30.4), 760., True, 1.0, 1.0)])
+        # two nodal planes with the same rake and two hypocenters, so that
+        # there are stacks of 4 ruptures with the same rupture parameters
+        npd = PMF([(0.5, NodalPlane(0.0, 90.0, 0.0)),
+                   (0.5, NodalPlane(45.0, 60.0, 0.0))])
+        hdd = PMF([(0.5, 5.0), (0.5, 10.0)])
+        self.src = PointSource('001', 'Point1', 'Active Shallow Crust',
+                               TruncatedGRMFD(4.5, 8.0, 0.1, 4.0, 1.0), 1.0,
+                               WC1994(), 1.0, PoissonTOM(50.0), 0.0, 30.0,
+                               Point(30.0, 30.5), npd, hdd)
+        self.src.src_group_id = 0
+        self.src.num_ruptures = self.src.count_ruptures()
+        self.imtls = DictArray({'PGA': [0.01, 0.1, 0.2, 0.5, 0.8],
+                                'SA(0.5)': [0.01, 0.1, 0.2, 0.5, 0.8]})
+
+    def test_same_curves_as_rupture_by_rupture(self):
+        self.check([akkar_bommer_2010.AkkarBommer2010(), SadighEtAl1997()])
+
+    def test_undeclared_rupture_attribute(self):
+        # the stacks are computed rupture by rupture, since the hypocenter
+        # is different for each rupture of the stack; this is logged once
+        with self.assertLogs(level='WARNING') as cm:
+            self.check([HypocentralSadigh()])
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn('hypocenter is not a rupture parameter', cm.output[0])
+
+    def test_attribute_error_in_gsim(self):
+        # an AttributeError in the GSIM is not hidden by the stacking
+        cmaker = ContextMaker([BrokenSadigh()],
+                              param=dict(vectorize_ruptures=True))
+        with self.assertRaises(AttributeError) as ctx:
+            cmaker.poe_map(self.src, self.sitecol, self.imtls, 3)
+        self.assertIn('missing_param', str(ctx.exception))
+        self.assertTrue(cmaker.stackable)
+
+    def check(self, gsims):
+        srcfilter = SourceFilter(self.sitecol, {'default': 200})
+        param = dict(imtls=self.imtls, truncation_level=3,
+                     filter_distance='rrup')
+        res = classical([self.src], srcfilter, gsims, param)
+        param['vectorize_ruptures'] = True
+        vres = classical([self.src], srcfilter, gsims, param)
+        self.assertEqual(res.eff_ruptures, vres.eff_ruptures)
+        pmap, vmap = res[0], vres[0]
+        self.assertEqual(sorted(pmap), sorted(vmap))
+        for sid in pmap:
+            numpy.testing.assert_allclose(
+                pmap[sid].array, vmap[sid].array, rtol=1E-12)
+
+
+class CollapsedPointSourceTestCase(unittest.TestCase):
+    def setUp(self):
+        # a close site and two sites far from the point source
+        self.sitecol = SiteCollection([
+            Site(Point(30.0, 30.45), 760., True, 1.0, 1.0),
+            Site(Point(31.5, 30.5), 760., True, 1.0, 1.0),
+            Site(Point(32.0, 30.5), 760., True, 1.0, 1.0)])
+        # a single nodal plane, so that the collapsed source differs from
+        # the original one only in the hypocentral depth
+        npd = PMF([(1.0, NodalPlane(0.0, 90.0, 0.0))])
+        hdd = PMF([(0.5, 5.0), (0.5, 10.0)])
+        self.src = PointSource('001', 'Point1', 'Active Shallow Crust',
+                               TruncatedGRMFD(4.5, 6.5, 0.5, 4.0, 1.0), 1.0,
+                               WC1994(), 1.0, PoissonTOM(50.0), 0.0, 30.0,
+                               Point(30.0, 30.5), npd, hdd)
+        self.src.num_ruptures = self.src.count_ruptures()  # 4 mags x 2 depths
+        self.imtls = DictArray({'PGA': [0.001, 0.01, 0.05, 0.1, 0.2]})
+
+    def poe_map(self, sites, **param):
+        cmaker = ContextMaker([SadighEtAl1997()], param=param)
+        return cmaker.poe_map(self.src, sites, self.imtls, 3)
+
+    def test_same_curves_as_uncollapsed(self):
+        pmap = self.poe_map(self.sitecol)
+        self.assertEqual(pmap.eff_ruptures, 8)
+        for vectorize in (False, True):
+            cmap = self.poe_map(self.sitecol, pointsource_collapse_factor=3,
+                                vectorize_ruptures=vectorize)
+            # 8 ruptures for the close site + 1 rupture per magnitude
+            # for the far sites
+            self.assertEqual(cmap.eff_ruptures, 12)
+            self.assertEqual(sorted(cmap), [0, 1, 2])
+            numpy.testing.assert_allclose(  # the close site is unaffected
+                cmap[0].array, pmap[0].array, rtol=1E-12)
+            for sid in (1, 2):
+                numpy.testing.assert_allclose(
+                    cmap[sid].array, pmap[sid].array, rtol=1E-2)
+
+    def test_far_sites_only(self):
+        far = self.sitecol.filter(numpy.array([False, True, True]))
+        pmap = self.poe_map(far)
+        cmap = self.poe_map(far, pointsource_collapse_factor=3)
+        self.assertEqual(pmap.eff_ruptures, 8)
+        self.assertEqual(cmap.eff_ruptures, 4)
+        self.assertEqual(sorted(cmap), [1, 2])
+        for sid in cmap:
+            numpy.testing.assert_allclose(
+                cmap[sid].array, pmap[sid].array, rtol=1E-2)
@@ -22,6 +22,8 @@ from openquake.hazardlib.calc.stochastic import (
     stochastic_event_set, sample_ruptures)
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.gsim.si_midorikawa_1999 import SiMidorikawa1999SInter
+from openquake.hazardlib.mfd import TruncatedGRMFD
+from openquake.hazardlib.tests.source.area_test import make_area_source
 
 aae = numpy.testing.assert_almost_equal
 
@@ -67,3 +69,43 @@ class StochasticEventSetTestCase(unittest.TestCase):
         # test no filtering 2
         ruptures = sample_ruptures(group)['eb_ruptures']
         self.assertEqual(len(ruptures), 2)
+
+    def test_vectorized_sampling(self):
+        polygon = geo.Polygon([geo.Point(0, 0), geo.Point(0, 1),
+                               geo.Point(1, 1), geo.Point(1, 0)])
+        mfd = TruncatedGRMFD(a_val=4, b_val=1, min_mag=5, max_mag=7,
+                             bin_width=.5)
+        src = make_area_source(polygon, 20., mfd=mfd)
+        src.src_group_id = 0
+        src.num_ruptures = src.count_ruptures()
+        src.serial = numpy.arange(src.num_ruptures, dtype=numpy.uint32)
+
+        # the rates and the ruptures can be built without iter_ruptures
+        ruptures = list(src.iter_ruptures())
+        aae(src.get_occurrence_rates(),
+            [rup.occurrence_rate for rup in ruptures])
+        indices = [1, 10, len(ruptures) - 1]
+        for idx, rup in zip(indices, src.get_ruptures(indices)):
+            self.assertEqual(rup.mag, ruptures[idx].mag)
+            self.assertEqual(rup.hypocenter, ruptures[idx].hypocenter)
+            aae(rup.surface.corner_lons, ruptures[idx].surface.corner_lons)
+
+        # the number of events is the expected one
+        param = dict(ses_per_logic_tree_path=100, samples=2, seed=42,
+                     vectorized_sampling=True)
+        dic = sample_ruptures([src], param=param)
+        rate = src.get_occurrence_rates().sum() * 50 * 100 * 2
+        self.assertLess(abs(dic['num_events'] - rate), 4 * rate ** .5)
+
+        # the sampling does not depend on the splitting of the source
+        points = list(src)
+        start = 0
+        for point in points:
+            point.src_group_id = 0
+            point.num_ruptures = point.count_ruptures()
+            point.serial = src.serial[start:start + point.num_ruptures]
+            start += point.num_ruptures
+        dic2 = sample_ruptures(points, param=param)
+        self.assertEqual([ebr.serial for ebr in dic['eb_ruptures']],
+                         [ebr.serial for ebr in dic2['eb_ruptures']])
+        self.assertEqual(dic['num_events'], dic2['num_events'])
@@ -138,6 +138,30 @@ class GetPoEsTestCase(_FakeGSIMTestCase):
         self.assertEqual(poe3, 0)
         self.assertAlmostEqual(poe2, 0.43432352175355504, places=6)
 
+    def test_tabulated_sf(self):
+        self.gsim_class.DEFINED_FOR_STANDARD_DEVIATION_TYPES.add(
+            const.StdDev.TOTAL)
+
+        def get_mean_and_stddevs(sites, rup, dists, imt, stddev_types):
+            return numpy.array([-0.7872268528578843]), \
+                [numpy.array([0.5962393527251486])]
+
+        self.gsim.get_mean_and_stddevs = get_mean_and_stddevs
+        imls = [-2.995732273553991, -0.6931471805599453, 0.6931471805599453]
+        imtls = {str(self.DEFAULT_IMT()): imls}
+        for trunclevel in (2.0, None):
+            poes = self.gsim.get_poes_multi(
+                SitesContext(), RuptureContext(), DistancesContext(), imtls,
+                trunclevel, sf_accuracy=1E-6)
+            expected = self._get_poes(imt=self.DEFAULT_IMT(), imls=imls,
+                                      truncation_level=trunclevel)
+            numpy.testing.assert_allclose(poes, expected, atol=1E-6)
+
+        # the ContextMaker does not change the GSIM
+        cmaker = ContextMaker([self.gsim], param=dict(sf_accuracy=1E-6))
+        self.assertEqual(cmaker.sf_accuracy, 1E-6)
+        self.assertFalse(hasattr(self.gsim, 'sf_accuracy'))
+
     def test_several_contexts(self):
         self.gsim_class.DEFINED_FOR_STANDARD_DEVIATION_TYPES.add(
             const.StdDev.TOTAL)
@@ -355,6 +379,78 @@ class MakeContextsTestCase(_FakeGSIMTestCase):
                           'get_strike': 1})
 
 
+class GetMeanAndStddevsMultiTestCase(unittest.TestCase):
+    def setUp(self):
+        n = 10
+        self.sctx = SitesContext()
+        self.sctx.vs30 = numpy.linspace(200., 1200., n)
+        self.sctx.vs30measured = numpy.arange(n) % 2
+        self.sctx.z1pt0 = numpy.linspace(10., 500., n)
+        self.sctx.z2pt5 = numpy.linspace(.5, 3., n)
+        self.rctx = RuptureContext()
+        self.rctx.mag = 6.5
+        self.rctx.rake = 90.
+        self.rctx.dip = 45.
+        self.rctx.ztor = 2.
+        self.rctx.width = 15.
+        self.rctx.hypo_depth = 10.
+        self.dctx = DistancesContext()
+        self.dctx.rrup = numpy.linspace(1., 200., n)
+        self.dctx.rjb = self.dctx.rrup - .5
+        self.dctx.rx = numpy.linspace(-50., 150., n)
+        self.imts = [PGA(), PGV()] + [
+            SA(period, 5) for period in (0.05, 0.1, 0.22, 0.5, 1.3, 3.)]
+        self.stddev_types = [const.StdDev.TOTAL, const.StdDev.INTER_EVENT,
+                             const.StdDev.INTRA_EVENT]
+
+    def check(self, gsim):
+        mean, stddevs = gsim.get_mean_and_stddevs_multi(
+            self.sctx, self.rctx, self.dctx, self.imts, self.stddev_types)
+        self.assertEqual(mean.shape, (len(self.imts), 10))
+        self.assertEqual(stddevs.shape, (3, len(self.imts), 10))
+        for m, imt in enumerate(self.imts):
+            mea, stds = gsim.get_mean_and_stddevs(
+                self.sctx, self.rctx, self.dctx, imt, self.stddev_types)
+            aac(mean[m], mea)
+            for s, std in enumerate(stds):
+                aac(stddevs[s, m], std)
+
+    def test_native(self):
+        from openquake.hazardlib.gsim.boore_2014 import (
+            BooreEtAl2014, BooreEtAl2014CaliforniaBasin)
+        from openquake.hazardlib.gsim.campbell_bozorgnia_2014 import (
+            CampbellBozorgnia2014)
+        from openquake.hazardlib.gsim.chiou_youngs_2014 import (
+            ChiouYoungs2014)
+        for cls in (BooreEtAl2014, BooreEtAl2014CaliforniaBasin,
+                    CampbellBozorgnia2014, ChiouYoungs2014):
+            self.check(cls())
+
+    def test_generic(self):
+        from openquake.hazardlib.gsim.abrahamson_2014 import (
+            AbrahamsonEtAl2014)
+        from openquake.hazardlib.gsim.nshmp_2014 import (
+            BooreEtAl2014NSHMPUpper)
+        self.dctx.ry0 = self.dctx.rjb
+        self.check(AbrahamsonEtAl2014())
+        self.check(BooreEtAl2014NSHMPUpper())
+
+    def test_get_poes_multi(self):
+        from openquake.hazardlib.gsim.chiou_youngs_2014 import (
+            ChiouYoungs2014)
+        gsim = ChiouYoungs2014()
+        imtls = collections.OrderedDict(
+            (str(imt), [.01, .1, .5]) for imt in self.imts)
+        for trunclevel in (None, 0, 3):
+            poes = gsim.get_poes_multi(
+                self.sctx, self.rctx, self.dctx, imtls, trunclevel)
+            expected = numpy.concatenate(
+                [gsim.get_poes(self.sctx, self.rctx, self.dctx, imt,
+                               imtls[str(imt)], trunclevel)
+                 for imt in self.imts], axis=1)
+            aac(poes, expected)
+
+
 class ContextTestCase(unittest.TestCase):
     def test_equality(self):
         sctx1 = SitesContext()
@@ -494,3 +590,24 @@ class CoeffsTableTestCase(unittest.TestCase):
         self.assertEqual(str(te.exception),
                          "CoeffsTable cannot be constructed with "
                          "inputs of the form 'int'")
+
+    def test_interpolation_is_memoized(self):
+        table = CoeffsTable(sa_damping=5, table=self.coefficient_string)
+        coeffs = table[SA(period=0.5, damping=5)]
+        ratio = (numpy.log(0.5) - numpy.log(0.1)) / numpy.log(10.)
+        aac(coeffs['a'], 1.0 + 4.0 * ratio)
+        aac(coeffs['b'], 2.0 + 8.0 * ratio)
+        self.assertIs(table[SA(period=0.5, damping=5)], coeffs)
+        with self.assertRaises(KeyError):
+            table[SA(period=20., damping=5)]
+        with self.assertRaises(KeyError):
+            table[SA(period=0.5, damping=10)]
+
+    def test_get_coeffs(self):
+        table = CoeffsTable(sa_damping=5, table=self.coefficient_string)
+        imts = [PGA(), SA(period=0.1, damping=5), SA(period=3.0, damping=5)]
+        coeffs = table.get_coeffs(imts)
+        self.assertEqual(coeffs.dtype.names, ('a', 'b'))
+        for imt, row in zip(imts, coeffs):
+            self.assertEqual(dict(a=row['a'], b=row['b']), table[imt])
+        self.assertIs(table.get_coeffs(imts), coeffs)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2018 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the time spent computing the means and standard deviations
+for many IMTs by calling get_mean_and_stddevs once per IMT and by calling
+get_mean_and_stddevs_multi once.
+"""
+import time
+
+import numpy
+
+from openquake.hazardlib import const
+from openquake.hazardlib.contexts import (SitesContext, RuptureContext,
+                                          DistancesContext)
+from openquake.hazardlib.imt import PGA, PGV, SA
+from openquake.hazardlib.gsim.boore_2014 import BooreEtAl2014
+from openquake.hazardlib.gsim.campbell_bozorgnia_2014 import (
+    CampbellBozorgnia2014)
+from openquake.hazardlib.gsim.chiou_youngs_2014 import ChiouYoungs2014
+
+STDDEV_TYPES = [const.StdDev.TOTAL]
+
+
+def make_contexts(num_sites):
+    """
+    :returns: a triple (sctx, rctx, dctx) with num_sites sites
+    """
+    sctx = SitesContext()
+    sctx.vs30 = numpy.linspace(200., 1200., num_sites)
+    sctx.vs30measured = numpy.arange(num_sites) % 2
+    sctx.z1pt0 = numpy.linspace(10., 500., num_sites)
+    sctx.z2pt5 = numpy.linspace(.5, 3., num_sites)
+    rctx = RuptureContext()
+    rctx.mag = 6.5
+    rctx.rake = 90.
+    rctx.dip = 45.
+    rctx.ztor = 2.
+    rctx.width = 15.
+    rctx.hypo_depth = 10.
+    dctx = DistancesContext()
+    dctx.rrup = numpy.linspace(1., 300., num_sites)
+    dctx.rjb = dctx.rrup - .5
+    dctx.rx = numpy.linspace(-50., 250., num_sites)
+    return sctx, rctx, dctx
+
+
+def make_imts(num_imts):
+    """
+    :returns: PGA, PGV and num_imts - 2 SA periods between 0.01 and 10 s
+    """
+    periods = numpy.logspace(-2, 1, num_imts - 2)
+    return [PGA(), PGV()] + [SA(period, 5) for period in periods]
+
+
+def benchmark(gsim, ctxs, imts, num_runs):
+    """
+    :returns: the seconds spent with the per-IMT and the multi-IMT API
+    """
+    t0 = time.time()
+    for _ in range(num_runs):
+        for imt in imts:
+            gsim.get_mean_and_stddevs(*ctxs, imt, STDDEV_TYPES)
+    t1 = time.time()
+    for _ in range(num_runs):
+        gsim.get_mean_and_stddevs_multi(*ctxs, imts, STDDEV_TYPES)
+    t2 = time.time()
+    return t1 - t0, t2 - t1
+
+
+def main(num_imts=20, num_sites=1000, num_runs=100):
+    ctxs = make_contexts(num_sites)
+    imts = make_imts(num_imts)
+    print('%d IMTs, %d sites, %d runs' % (num_imts, num_sites, num_runs))
+    print('%-24s %10s %10s %8s' % ('gsim', 'per_imt', 'multi', 'speedup'))
+    for cls in (BooreEtAl2014, CampbellBozorgnia2014, ChiouYoungs2014):
+        gsim = cls()
+        benchmark(gsim, ctxs, imts, 1)  # warm up the coefficients cache
+        t_single, t_multi = benchmark(gsim, ctxs, imts, num_runs)
+        print('%-24s %10.4f %10.4f %8.2f' % (
+            cls.__name__, t_single, t_multi, t_single / t_multi))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=' '.join(__doc__.split()))
+    parser.add_argument('--imts', type=int, default=20,
+                        help='number of IMTs (default 20)')
+    parser.add_argument('--sites', type=int, default=1000,
+                        help='number of sites (default 1000)')
+    parser.add_argument('--runs', type=int, default=100,
+                        help='number of repetitions (default 100)')
+    args = parser.parse_args()
+    main(args.imts, args.sites, args.runs)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2018 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import numpy
+from openquake.baselib.general import DictArray
+from openquake.hazardlib.probability_map import (
+    ProbabilityMap, ProbabilityCurve, DenseProbabilityMap)
+
+aae = numpy.testing.assert_almost_equal
+
+
+def make_pmap(sids, array):
+    # a ProbabilityMap with the same content of the dense one
+    pmap = ProbabilityMap(array.shape[1], array.shape[2])
+    for sid, arr in zip(sids, array):
+        pmap[sid] = ProbabilityCurve(arr.copy())
+    return pmap
+
+
+class DenseProbabilityMapTestCase(unittest.TestCase):
+    # the DenseProbabilityMap must behave like the ProbabilityMap
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.sids = numpy.array([7, 2, 5])  # unsorted
+        self.array = rng.random_sample((3, 4, 2))
+        self.dense = DenseProbabilityMap.from_array(self.array, self.sids)
+        self.pmap = make_pmap(self.sids, self.array)
+
+    def assert_same(self, dense, pmap):
+        self.assertIsInstance(dense, DenseProbabilityMap)
+        numpy.testing.assert_equal(dense.sids, pmap.sids)
+        aae(dense.array, pmap.array)
+
+    def test_from_array(self):
+        numpy.testing.assert_equal(self.dense.sids, [2, 5, 7])
+        aae(self.dense[7].array, self.array[0])
+        aae(self.dense[2].array, self.array[1])
+        self.assert_same(self.dense, self.pmap)
+
+        # arrays of shape (N, L) become arrays of shape (N, L, 1)
+        dense = DenseProbabilityMap.from_array(self.array[:, :, 0], [1, 0, 2])
+        self.assertEqual(dense.array.shape, (3, 4, 1))
+        aae(dense[0].array[:, 0], self.array[1, :, 0])
+
+        with self.assertRaises(ValueError):
+            DenseProbabilityMap.from_array(self.array, [1, 2])
+
+    def test_ior(self):
+        other = numpy.full((3, 4, 2), .5)
+        for sids in ([5, 1, 9], [2, 5, 7]):  # partially and fully overlapping
+            dense = DenseProbabilityMap.from_array(self.array, self.sids)
+            pmap = make_pmap(self.sids, self.array)
+            dense |= make_pmap(sids, other)
+            pmap |= make_pmap(sids, other)
+            self.assert_same(dense, pmap)
+
+            # composition with another DenseProbabilityMap
+            dense = DenseProbabilityMap.from_array(self.array, self.sids)
+            dense |= DenseProbabilityMap.from_array(other, sids)
+            self.assert_same(dense, pmap)
+
+        # composition with an empty map
+        dense = DenseProbabilityMap.from_array(self.array, self.sids)
+        dense |= ProbabilityMap(4, 2)
+        self.assert_same(dense, self.pmap)
+
+        # the non-inplace composition does not change the original
+        new = self.dense | DenseProbabilityMap.build(4, 2, [3], .1)
+        numpy.testing.assert_equal(new.sids, [2, 3, 5, 7])
+        self.assert_same(self.dense, self.pmap)
+
+    def test_invert(self):
+        self.array[1] = 1.  # site 2 has zero probabilities of no exceedence
+        dense = ~DenseProbabilityMap.from_array(self.array, self.sids)
+        pmap = ~make_pmap(self.sids, self.array)
+        numpy.testing.assert_equal(dense.sids, [5, 7])
+        self.assert_same(dense, pmap)
+
+    def test_extract(self):
+        for inner_idx in (0, 1):
+            dense = self.dense.extract(inner_idx)
+            self.assertEqual(dense.shape_z, 1)
+            self.assert_same(dense, self.pmap.extract(inner_idx))
+
+    def test_missing_sids(self):
+        self.assertNotIn(3, self.dense)
+        self.assertIn(5, self.dense)
+        self.assertIsNone(self.dense.get(3))
+        self.assertIsNone(self.dense.get(100))
+        with self.assertRaises(KeyError):
+            self.dense[100]
+
+        # unsorted site IDs with missing sites
+        sub = self.dense.filter([7, 3, 2, 100])
+        numpy.testing.assert_equal(sub.sids, [2, 7])
+        self.assert_same(sub, self.pmap.filter([2, 7]))
+
+        imtls = DictArray({'PGA': [.1, .2], 'PGV': [1, 2]})
+        curves = self.dense.extract(0).convert2(imtls, [7, 3, 2])
+        aae(curves['PGA'], [self.array[0, :2, 0], [0, 0],
+                            self.array[1, :2, 0]])
+
+        # setting a missing site keeps the site IDs sorted
+        self.dense[3] = ProbabilityCurve(numpy.ones((4, 2)))
+        numpy.testing.assert_equal(self.dense.sids, [2, 3, 5, 7])
+        aae(self.dense[3].array, 1.)
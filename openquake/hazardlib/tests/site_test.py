@@ -24,6 +24,7 @@ from shapely import wkt
 from openquake.baselib import hdf5
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.geo.point import Point
+from openquake.hazardlib.geo.surface import PlanarSurface
 
 assert_eq = numpy.testing.assert_equal
 
@@ -237,6 +238,42 @@ class WithinBBoxTestCase(unittest.TestCase):
         assert_eq(self.sites.within_bbox((-182, -28, -178, -26)), [0])
 
 
+class SiteIndexTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        numpy.random.seed(42)
+        lons = numpy.random.uniform(-2, 2, 1000)
+        lats = numpy.random.uniform(-2, 2, 1000)
+        depths = numpy.random.uniform(0, 2, 1000)
+        cls.sites = SiteCollection.from_points(lons, lats, depths)
+
+    def test_within_bbox(self):
+        # the KD-tree gives the same sites of a linear scan
+        lons, lats = self.sites.lons, self.sites.lats
+        bbox = (-1, -.5, 1.5, .5)
+        mask = (-1 < lons) & (lons < 1.5) & (-.5 < lats) & (lats < .5)
+        assert_eq(self.sites.within_bbox(bbox), mask.nonzero()[0])
+
+    def test_within_distance(self):
+        # the sites within the distance are a subset of the candidates
+        surface = PlanarSurface.from_corner_points(
+            Point(0, 0, 5), Point(.3, .3, 5), Point(.3, .3, 20),
+            Point(0, 0, 20))
+        for kind, dist in [
+                ('rrup', surface.get_min_distance(self.sites)),
+                ('rjb', surface.get_joyner_boore_distance(self.sites))]:
+            idxs = self.sites.index.within_distance(surface.mesh, 50, kind)
+            self.assertTrue(set((dist <= 50).nonzero()[0]) <= set(idxs))
+            self.assertLess(len(idxs), len(self.sites) / 2)
+
+    def test_pickle(self):
+        self.sites.within_bbox((-1, -1, 1, 1))  # build the index
+        sites = pickle.loads(pickle.dumps(self.sites))
+        self.assertNotIn('_index', vars(sites))
+        assert_eq(sites.within_bbox((-1, -1, 1, 1)),
+                  self.sites.within_bbox((-1, -1, 1, 1)))
+
+
 class SiteCollectionIterTestCase(unittest.TestCase):
 
     def test(self):
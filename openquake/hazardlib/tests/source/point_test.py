@@ -421,3 +421,23 @@ class PointSourceMaxRupProjRadiusTestCase(unittest.TestCase):
         source = make_point_source(nodal_plane_distribution=np_dist, mfd=mfd)
         radius = source._get_max_rupture_projection_radius()
         self.assertAlmostEqual(radius, 3.8712214)
+
+
+class PointSourceCollapsedTestCase(unittest.TestCase):
+    def test(self):
+        np_dist = PMF([(0.3, NodalPlane(1, 20, 3)),
+                       (0.7, NodalPlane(2, 2, 4))])
+        hc_dist = PMF([(0.5, 2), (0.5, 4)])
+        source = make_point_source(nodal_plane_distribution=np_dist,
+                                   hypocenter_distribution=hc_dist)
+        collapsed = source.collapsed()
+        self.assertEqual(source.count_ruptures(), 8)
+        self.assertEqual(collapsed.count_ruptures(), 2)
+        rup = list(collapsed.iter_ruptures())[0]
+        self.assertEqual(rup.rake, 4)  # from the most likely nodal plane
+        self.assertEqual(rup.hypocenter.depth, 3)  # average depth
+        # the total occurrence rate is preserved
+        self.assertAlmostEqual(sum(source.get_occurrence_rates()),
+                               sum(collapsed.get_occurrence_rates()))
+        # the original source is unchanged
+        self.assertIs(source.nodal_plane_distribution, np_dist)
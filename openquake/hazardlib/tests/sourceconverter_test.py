@@ -17,9 +17,13 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import io
+import re
+import pickle
 import unittest
-from openquake.hazardlib import nrml
-from openquake.hazardlib.sourceconverter import update_source_model
+from openquake.baselib.general import gettemp
+from openquake.hazardlib import nrml, InvalidFile
+from openquake.hazardlib.sourceconverter import (
+    update_source_model, SourceConverter)
 
 testdir = os.path.join(os.path.dirname(__file__), 'source_model')
 
@@ -96,3 +100,28 @@ class PointToMultiPointTestCase(unittest.TestCase):
             got = f.getvalue().decode('utf-8')
             print(got)
             self.assertEqual(got, expected)
+
+
+class ReadSourceModelTestCase(unittest.TestCase):
+    conv = SourceConverter(50., 1., 10, 0.1, 10.)
+
+    def check_same(self, fname):
+        expected = nrml.to_python(fname, self.conv)
+        got = nrml.read_source_model(fname, self.conv)
+        self.assertEqual(pickle.dumps(got), pickle.dumps(expected))
+
+    def test_nrml05(self):
+        for fname in sorted(os.listdir(testdir)):
+            with self.subTest(fname=fname):
+                self.check_same(os.path.join(testdir, fname))
+
+    def test_nrml04(self):
+        # remove the sourceGroup nodes from a NRML 0.5 source model
+        with open(os.path.join(testdir, 'mixed.xml')) as f:
+            xml = re.sub(r'\s*</?sourceGroup[^>]*>', '', f.read())
+        self.check_same(gettemp(xml.replace('nrml/0.5', 'nrml/0.4')))
+        fname = gettemp(xml)  # sources without group in NRML 0.5
+        with self.assertRaises(InvalidFile):
+            nrml.to_python(fname, self.conv)
+        with self.assertRaises(InvalidFile):
+            nrml.read_source_model(fname, self.conv)
@@ -1,7 +1,9 @@
 import unittest
+import functools
 import numpy
 from openquake.hazardlib.stats import (
-    mean_curve, quantile_curve, std_curve)
+    mean_curve, quantile_curve, std_curve, max_curve, compute_stats,
+    StreamingStats)
 
 aaae = numpy.testing.assert_array_almost_equal
 
@@ -124,3 +126,43 @@ class QuantileCurveTestCase(unittest.TestCase):
         actual_curve = quantile_curve(quantile, curves, weights)
 
         numpy.testing.assert_allclose(expected_curve, actual_curve)
+
+
+class StreamingStatsTestCase(unittest.TestCase):
+    stats = [mean_curve, std_curve, functools.partial(quantile_curve, .1),
+             functools.partial(quantile_curve, .9), max_curve]
+
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.values = numpy.minimum(rng.lognormal(-4, 2, (200, 3, 4)), 1)
+        self.weights = rng.random_sample(200)
+        self.weights /= self.weights.sum()
+
+    def run_stats(self, maxbytes):
+        sstats = StreamingStats(self.stats, (3, 4), maxbytes)
+        for i in range(0, 200, 30):
+            sstats.update(self.values[i:i + 30], self.weights[i:i + 30])
+        return sstats
+
+    def test_exact(self):
+        sstats = self.run_stats(maxbytes=None)
+        self.assertFalse(sstats.streaming)
+        expected = compute_stats(self.values, self.stats, self.weights)
+        numpy.testing.assert_equal(sstats.get(), expected)
+
+    def test_streaming(self):
+        sstats = self.run_stats(maxbytes=1000)
+        self.assertTrue(sstats.streaming)
+        got = sstats.get()
+        expected = compute_stats(self.values, self.stats, self.weights)
+        for i in (0, 1, 4):  # mean, std, max
+            numpy.testing.assert_allclose(got[i], expected[i], rtol=1E-12)
+        # the quantiles are within 1% from the values at the given rank
+        order = numpy.argsort(self.values, axis=0)
+        cum_weights = numpy.cumsum(self.weights[order], axis=0)
+        sorted_values = numpy.sort(self.values, axis=0)
+        for i, q in ((2, .1), (3, .9)):
+            idx = (cum_weights < q).sum(axis=0)
+            ranked = numpy.take(sorted_values, idx * 12 + numpy.arange(12)
+                                .reshape(3, 4))
+            numpy.testing.assert_allclose(got[i], ranked, rtol=.01)
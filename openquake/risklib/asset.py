@@ -24,6 +24,7 @@ from shapely import wkt, geometry
 
 from openquake.baselib import hdf5, general
 from openquake.baselib.node import Node, context
+from openquake.baselib.parallel import share
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib import valid, nrml, geo, InvalidFile
 
@@ -495,6 +496,10 @@ class AssetCollection(object):
     def __len__(self):
         return len(self.array)
 
+    def __getstate__(self):
+        # when sent to the workers the array is shared, not copied
+        return dict(vars(self), array=share(self.array))
+
     def __toh5__(self):
         # NB: the loss types do not contain spaces, so we can store them
         # together as a single space-separated string
@@ -24,6 +24,7 @@ import numpy
 
 from openquake.baselib import hdf5, performance
 from openquake.baselib.general import groupby, AccumDict
+from openquake.hazardlib.calc.stochastic import counter_random
 from openquake.risklib import scientific, riskmodels
 
 
@@ -33,6 +34,7 @@ class ValidationError(Exception):
 
 U32 = numpy.uint32
 F32 = numpy.float32
+U64 = numpy.uint64
 by_taxonomy = operator.attrgetter('taxonomy')
 
 
@@ -137,6 +139,24 @@ class CompositeRiskModel(collections.Mapping):
                     'Missing vulnerability function for taxonomy %s and loss'
                     ' type %s' % (taxonomy, ', '.join(missing)))
         self.taxonomies = sorted(taxonomies)
+        self.vtable, self.vidx = self.make_vulnerability_table()
+
+    def make_vulnerability_table(self):
+        """
+        Pack the vulnerability functions of all the taxonomies and loss
+        types in a single :class:`openquake.risklib.scientific.\
+VulnerabilityTable`; the functions with PMF are excluded.
+
+        :returns: the table (or None) and a dict (taxonomy, loss_type) -> row
+        """
+        vfs, vidx = [], {}
+        for taxonomy, riskmodel in sorted(self._riskmodels.items()):
+            for lt, rf in sorted(riskmodel.risk_functions.items()):
+                if (type(rf) is scientific.VulnerabilityFunction and
+                        len(rf.imls) > 1):
+                    vidx[taxonomy, lt] = len(vfs)
+                    vfs.append(rf)
+        return (scientific.VulnerabilityTable(vfs) if vfs else None), vidx
 
     def get_extra_imts(self, imts):
         """
@@ -252,6 +272,7 @@ class CompositeRiskModel(collections.Mapping):
             hazard = hazard_getter.get_hazard()
         imti = {imt: i for i, imt in enumerate(hazard_getter.imtls)}
         with self.monitor('computing risk'):
+            items = []  # (riskmodel, sid, assets, epsgetter, rlzi, eids, data)
             for taxonomy in sorted(dic):
                 riskmodel = self[taxonomy]
                 imts = [riskmodel.risk_functions[lt].imt
@@ -283,11 +304,42 @@ class CompositeRiskModel(collections.Mapping):
                         else:  # classical
                             eids = hazard_getter.eids
                             data = [haz[imti[imt]] for imt in imt_lt]
-                        out = riskmodel.get_output(assets, data, epsgetter)
-                        out.sid = sid
-                        out.rlzi = rlzi
-                        out.eids = eids
-                        yield out
+                        items.append(
+                            (riskmodel, sid, assets, epsgetter, rlzi, eids,
+                             data))
+            self._interpolate(items)
+            for riskmodel, sid, assets, epsgetter, rlzi, eids, data in items:
+                out = riskmodel.get_output(assets, data, epsgetter)
+                out.sid = sid
+                out.rlzi = rlzi
+                out.eids = eids
+                yield out
+
+    def _interpolate(self, items):
+        # interpolate the vulnerability functions of all the taxonomies
+        # on their ground motion values with a single call to the
+        # vulnerability table (one per dtype of the gmvs, since the
+        # comparisons with the IMLs are done with the precision of the
+        # gmvs); the triples (means, covs, idxs) are added to the pairs
+        # (gmvs, eids) passed to the riskmodels
+        blocks = AccumDict(accum=[])  # dtype -> (data, lti, vidx, gmvs)
+        for riskmodel, _sid, _assets, _eps, _rlzi, _eids, data in items:
+            for lti, (lt, dat) in enumerate(zip(riskmodel.loss_types, data)):
+                vidx = self.vidx.get((riskmodel.taxonomy, lt))
+                if vidx is not None and isinstance(dat, tuple):
+                    gmvs = numpy.asarray(dat[0])
+                    blocks[gmvs.dtype].append((data, lti, vidx, gmvs))
+        for block in blocks.values():
+            means, covs, idxs = self.vtable.interpolate(
+                numpy.concatenate([numpy.repeat(vidx, len(gmvs))
+                                   for _, _, vidx, gmvs in block]),
+                numpy.concatenate([gmvs for _, _, _, gmvs in block]))
+            stop = 0
+            for data, lti, _vidx, gmvs in block:
+                start, stop = stop, stop + len(gmvs)
+                ok = idxs[start:stop]
+                data[lti] += (
+                    (means[start:stop][ok], covs[start:stop][ok], ok),)
 
     def __toh5__(self):
         loss_types = hdf5.array_of_vstr(self._get_loss_types())
@@ -312,7 +364,7 @@ class RiskInput(object):
     :param assets_by_site:
         array of assets, one per site
     :param eps_dict:
-        dictionary of epsilons (can be None)
+        dictionary of epsilons or lazy EpsilonMatrix0 (can be None)
     """
     def __init__(self, hazard_getter, assets_by_site, eps_dict=None):
         self.hazard_getter = hazard_getter
@@ -336,11 +388,13 @@ class RiskInput(object):
     def epsilon_getter(self, aid, eids):
         """
         :param aid: asset ordinal
-        :param eids: ignored
+        :param eids: event IDs
         :returns: an array of E epsilons
         """
         if len(self.eps) == 0:
             return
+        elif isinstance(self.eps, EpsilonMatrix0):
+            return self.eps.make_eps([aid], eids)[0]
         eid2idx = self.hazard_getter.eid2idx
         idx = [eid2idx[eid] for eid in eids]
         try:  # from ruptures
@@ -356,31 +410,32 @@ class RiskInput(object):
 
 class EpsilonMatrix0(object):
     """
-    Mock-up for a matrix of epsilons of size N x E,
-    used when asset_correlation=0.
-
-    :param num_assets: N assets
-    :param seeds: E seeds, set before calling numpy.random.normal
+    Lazy matrix of epsilons of size A x E, used when asset_correlation=0.
+    The epsilons are never stored: they are generated on demand with a
+    counter-based generator keyed by the master seed, the asset ordinal
+    and the event ID, so they do not depend on how the assets and the
+    events are split across tasks.
+
+    :param num_assets: A assets
+    :param seed: the master seed
     """
-    def __init__(self, num_assets, seeds):
+    def __init__(self, num_assets, seed):
         self.num_assets = num_assets
-        self.seeds = seeds
-        self.eps = None
+        self.seed = seed
 
-    def make_eps(self):
-        """
-        Builds a matrix of A x E epsilons
+    def make_eps(self, aids, eids):
         """
-        eps = numpy.zeros((self.num_assets, len(self.seeds)), F32)
-        for i, seed in enumerate(self.seeds):
-            numpy.random.seed(seed)
-            eps[:, i] = numpy.random.normal(size=self.num_assets)
-        return eps
+        Builds a matrix of A' x E' epsilons with the Box-Muller transform
 
-    def __getitem__(self, aid):
-        if self.eps is None:
-            self.eps = self.make_eps()
-        return self.eps[aid]
+        :param aids: A' asset ordinals
+        :param eids: E' event IDs
+        """
+        aids = numpy.asarray(aids, U64)[:, None]
+        eids = numpy.asarray(eids, U64)[None, :]
+        u1 = 1. - counter_random(self.seed, aids, eids, 0)  # in (0, 1]
+        u2 = counter_random(self.seed, aids, eids, 1)
+        eps = numpy.sqrt(-2. * numpy.log(u1)) * numpy.cos(2. * numpy.pi * u2)
+        return eps.astype(F32)
 
     def __len__(self):
         return self.num_assets
@@ -419,13 +474,15 @@ class EpsilonMatrix1(object):
 def make_epsilon_getter(n_assets, n_events, correlation, master_seed, no_eps):
     """
     :returns: a function (start, stop) -> matrix of shape (n_assets, n_events)
+
+    NB: for correlation=0 the matrix is lazy and does not depend on the
+    slice, since the epsilons are keyed by the event IDs
     """
     assert n_assets > 0, n_assets
     assert n_events > 0, n_events
     assert correlation in (0, 1), correlation
     assert master_seed >= 0, master_seed
     assert no_eps in (True, False), no_eps
-    seeds = master_seed + numpy.arange(n_events)
 
     def get_eps(start=0, stop=n_events):
         if no_eps:
@@ -433,7 +490,7 @@ def make_epsilon_getter(n_assets, n_events, correlation, master_seed, no_eps):
         elif correlation:
             eps = EpsilonMatrix1(n_assets, stop - start, master_seed)
         else:
-            eps = EpsilonMatrix0(n_assets, seeds[start:stop])
+            eps = EpsilonMatrix0(n_assets, master_seed)
         return eps
 
     return get_eps
@@ -192,6 +192,30 @@ class RiskModel(object):
         return [lt for lt in self.loss_types
                 if self.risk_functions[lt].imt == imt]
 
+    def interpolate(self, loss_type, gmvs_eids):
+        """
+        Interpolate the vulnerability function of the given loss type.
+        The CompositeRiskModel interpolates the functions of all the
+        taxonomies in a single call and passes the results as a third
+        element of `gmvs_eids`; otherwise the table precompiled by the
+        composite model is used if possible.
+
+        :param loss_type: the loss type
+        :param gmvs_eids: a pair (gmvs, eids), possibly with a third element
+        :returns: (loss ratios, covs, indices >= min) as in
+                  :meth:`openquake.risklib.scientific.\
+VulnerabilityFunction.interpolate`
+        """
+        if len(gmvs_eids) > 2:  # already interpolated
+            return gmvs_eids[2]
+        gmvs = gmvs_eids[0]
+        cm = self.compositemodel
+        vidx = cm.vidx.get((self.taxonomy, loss_type)) if cm else None
+        if vidx is None:
+            return self.risk_functions[loss_type].interpolate(gmvs)
+        means, covs, idxs = cm.vtable.interpolate(vidx, gmvs)
+        return means[idxs], covs[idxs], idxs
+
     def get_output(self, assets, data_by_lt, epsgetter):
         """
         :param assets: a list of assets with the same taxonomy
@@ -334,7 +358,8 @@ class ProbabilisticEventBased(RiskModel):
         :param assets:
            a list of assets on the same site and with the same taxonomy
         :param gmvs_eids:
-           a pair (gmvs, eids) with E values each
+           a pair (gmvs, eids) with E values each, possibly with a third
+           element, the interpolated values (see :meth:`interpolate`)
         :param epsgetter:
            a callable returning the correct epsilons for the given gmvs
         :returns:
@@ -342,13 +367,13 @@ class ProbabilisticEventBased(RiskModel):
             `openquake.risklib.scientific.ProbabilisticEventBased.Output`
             instance.
         """
-        gmvs, eids = gmvs_eids
+        gmvs, eids = gmvs_eids[:2]
         E = len(gmvs)
         I = self.insured_losses + 1
         A = len(assets)
         loss_ratios = numpy.zeros((A, E, I), F32)
         vf = self.risk_functions[loss_type]
-        means, covs, idxs = vf.interpolate(gmvs)
+        means, covs, idxs = self.interpolate(loss_type, gmvs_eids)
         for i, asset in enumerate(assets):
             epsilons = epsgetter(asset.ordinal, eids)
             ratios = vf.sample(means, covs, idxs, epsilons)
@@ -434,7 +459,7 @@ class Scenario(RiskModel):
         self.time_event = time_event
 
     def __call__(self, loss_type, assets, gmvs_eids, epsgetter):
-        gmvs, eids = gmvs_eids
+        eids = gmvs_eids[1]
         epsilons = [epsgetter(asset.ordinal, eids) for asset in assets]
         values = get_values(loss_type, assets, self.time_event)
         ok = ~numpy.isnan(values)
@@ -455,7 +480,7 @@ class Scenario(RiskModel):
         loss_matrix.fill(numpy.nan)
 
         vf = self.risk_functions[loss_type]
-        means, covs, idxs = vf.interpolate(gmvs)
+        means, covs, idxs = self.interpolate(loss_type, gmvs_eids)
         loss_ratio_matrix = numpy.zeros((len(assets), E))
         for i, eps in enumerate(epsilons):
             loss_ratio_matrix[i, idxs] = vf.sample(means, covs, idxs, eps)
@@ -453,6 +453,89 @@ class VulnerabilityFunctionWithPMF(VulnerabilityFunction):
         return '<VulnerabilityFunctionWithPMF(%s, %s)>' % (self.id, self.imt)
 
 
+class VulnerabilityTable(object):
+    """
+    A set of V vulnerability functions packed into arrays of shape (V, M),
+    M being the maximum number of IMLs; shorter functions are padded with
+    infinite IMLs. It interpolates all the functions on a block of ground
+    motion values in a single vectorized call, with the same numbers as
+    :meth:`VulnerabilityFunction.interpolate`.
+
+    :param vfs: a list of VulnerabilityFunction instances with 2+ IMLs
+    """
+    def __init__(self, vfs):
+        V = len(vfs)
+        self.num_imls = numpy.array([len(vf.imls) for vf in vfs])
+        assert (self.num_imls > 1).all(), self.num_imls
+        M = self.num_imls.max()
+        self.imls = numpy.full((V, M), numpy.inf)
+        self.mean_loss_ratios = numpy.zeros((V, M))
+        self.covs = numpy.zeros((V, M))
+        for v, vf in enumerate(vfs):
+            n = self.num_imls[v]
+            self.imls[v, :n] = vf.imls
+            self.mean_loss_ratios[v, :n] = vf.mean_loss_ratios
+            self.covs[v, :n] = vf.covs
+        self.min_iml = self.imls[:, 0]
+        self.max_iml = self.imls[numpy.arange(V), self.num_imls - 1]
+
+    def __len__(self):
+        return len(self.num_imls)
+
+    def interpolate(self, vidx, gmvs):
+        """
+        :param vidx:
+           indices of the vulnerability functions
+        :param gmvs:
+           array of intensity measure levels, broadcastable with vidx
+        :returns:
+           (interpolated loss ratios, interpolated covs, indices >= min)
+           with the broadcast shape; the loss ratios and covs are zero
+           below the minimum IML
+        """
+        gmvs = numpy.asarray(gmvs)
+        shape = numpy.broadcast(vidx, gmvs).shape
+        means = numpy.zeros(shape)
+        covs = numpy.zeros(shape)
+        # gmvs are clipped to max(iml); the comparisons are done with
+        # the precision of the gmvs, as numpy.piecewise does
+        dt = gmvs.dtype
+        max_iml = self.max_iml[vidx].astype(dt)
+        gmvs = numpy.where(gmvs > max_iml, max_iml, gmvs)
+        idxs = gmvs >= self.min_iml[vidx].astype(dt)
+        if numpy.ndim(vidx) == 0:  # a single function
+            groups = [(vidx, slice(None))]
+            x = gmvs[idxs]
+        else:
+            v, x = numpy.broadcast_to(vidx, shape)[idxs], gmvs[idxs]
+            groups = self._groupby(v)
+        m, c = numpy.zeros(len(x)), numpy.zeros(len(x))
+        for row, idx in groups:
+            n = self.num_imls[row]
+            # numpy.interp is what scipy's interp1d uses internally
+            m[idx] = numpy.interp(x[idx], self.imls[row, :n],
+                                  self.mean_loss_ratios[row, :n])
+            c[idx] = numpy.interp(x[idx], self.imls[row, :n],
+                                  self.covs[row, :n])
+        means[idxs] = m
+        covs[idxs] = c
+        return means, covs, idxs
+
+    def _groupby(self, v):
+        # yield pairs (row, indices of the elements of v equal to row)
+        order = numpy.argsort(v, kind='mergesort')
+        vs = v[order]
+        starts = numpy.flatnonzero(numpy.diff(vs)) + 1
+        for start, stop in zip(numpy.append(0, starts),
+                               numpy.append(starts, len(vs))):
+            if start < stop:
+                yield vs[start], order[start:stop]
+
+    def __repr__(self):
+        return '<%s %d functions, %d IMLs>' % (
+            self.__class__.__name__, len(self), self.imls.shape[1])
+
+
 # this is meant to be instantiated by riskmodels.get_risk_models
 class VulnerabilityModel(dict):
     """
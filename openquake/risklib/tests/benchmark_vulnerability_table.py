@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2018 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the time spent interpolating many vulnerability functions on
+a block of ground motion values by calling VulnerabilityFunction.interpolate
+once per function, VulnerabilityTable.interpolate once per function and
+VulnerabilityTable.interpolate once for all functions.
+"""
+import time
+
+import numpy
+from numpy.testing import assert_equal
+
+from openquake.risklib.scientific import (
+    VulnerabilityFunction, VulnerabilityTable)
+
+
+def make_vfs(num_vfs, num_imls):
+    """
+    :returns: a list of vulnerability functions with random IMLs
+    """
+    vfs = []
+    for i in range(num_vfs):
+        n = numpy.random.randint(2, num_imls + 1)
+        imls = numpy.sort(numpy.random.uniform(.01, 2., n))
+        lrs = numpy.sort(numpy.random.uniform(.01, 1., n))
+        covs = numpy.random.uniform(0, .5, n)
+        vfs.append(VulnerabilityFunction('vf%d' % i, 'PGA', imls, lrs, covs))
+    return vfs
+
+
+def benchmark(vfs, gmvs, num_runs):
+    """
+    :returns: the seconds spent with the three approaches
+    """
+    table = VulnerabilityTable(vfs)
+    vidx = numpy.arange(len(vfs))
+    t0 = time.time()
+    for _ in range(num_runs):
+        expected = [vf.interpolate(gmvs) for vf in vfs]
+    t1 = time.time()
+    for _ in range(num_runs):
+        got = [table.interpolate(v, gmvs) for v in vidx]
+    t2 = time.time()
+    for _ in range(num_runs):
+        means, covs, idxs = table.interpolate(vidx[:, None], gmvs)
+    t3 = time.time()
+    for (m, c, i), (m2, c2, i2) in zip(expected, got):
+        assert_equal(m, m2[i2])
+        assert_equal(c, c2[i2])
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+def main(num_vfs=100, num_imls=20, num_gmvs=1000, num_runs=10):
+    numpy.random.seed(42)
+    vfs = make_vfs(num_vfs, num_imls)
+    gmvs = numpy.random.lognormal(-1.5, 1., num_gmvs).astype(numpy.float32)
+    print('%d functions, up to %d IMLs, %d gmvs, %d runs' % (
+        num_vfs, num_imls, num_gmvs, num_runs))
+    t_vf, t_row, t_block = benchmark(vfs, gmvs, num_runs)
+    print('%-24s %10s' % ('approach', 'seconds'))
+    print('%-24s %10.4f' % ('function.interpolate', t_vf))
+    print('%-24s %10.4f' % ('table.interpolate', t_row))
+    print('%-24s %10.4f' % ('table.interpolate block', t_block))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=' '.join(__doc__.split()))
+    parser.add_argument('--functions', type=int, default=100,
+                        help='number of vulnerability functions (default 100)')
+    parser.add_argument('--imls', type=int, default=20,
+                        help='maximum number of IMLs (default 20)')
+    parser.add_argument('--gmvs', type=int, default=1000,
+                        help='number of ground motion values (default 1000)')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='number of repetitions (default 10)')
+    args = parser.parse_args()
+    main(args.functions, args.imls, args.gmvs, args.runs)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2018 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import unittest
+import mock
+import numpy
+from numpy.testing import assert_equal
+from openquake.commonlib import readinput
+from openquake.risklib.riskinput import EpsilonMatrix0
+from openquake.risklib.scientific import VulnerabilityTable
+from openquake.qa_tests_data.event_based_risk import case_master
+
+
+class EpsilonMatrix0TestCase(unittest.TestCase):
+
+    def test_independent_from_blocks(self):
+        eps = EpsilonMatrix0(100, seed=42)
+        aids = numpy.arange(100)
+        eids = numpy.arange(1000) * 7 + 2 ** 40
+        full = eps.make_eps(aids, eids)
+        self.assertEqual(full.shape, (100, 1000))
+        self.assertEqual(full.dtype, numpy.float32)
+        # the epsilons of a block do not depend on the rest of the matrix
+        assert_equal(eps.make_eps(aids[10:20], eids[500:600]),
+                     full[10:20, 500:600])
+        assert_equal(eps.make_eps([33], eids[::-1])[0], full[33, ::-1])
+
+        # the epsilons are (approximately) standard normal
+        self.assertLess(abs(full.mean()), .01)
+        self.assertLess(abs(full.std() - 1), .01)
+
+        # and they change with the seed
+        other = EpsilonMatrix0(100, seed=43).make_eps(aids, eids)
+        self.assertLess(abs(numpy.corrcoef(full.ravel(), other.ravel())[0, 1]),
+                        .01)
+
+
+class FakeAsset(object):
+    def __init__(self, ordinal, taxonomy):
+        self.ordinal = ordinal
+        self.taxonomy = taxonomy
+
+    def deductible(self, loss_type):
+        return .1
+
+    def insurance_limit(self, loss_type):
+        return .8
+
+
+class FakeHazardGetter(object):
+    def __init__(self, imtls, hazard):
+        self.imtls = imtls
+        self.sids = sorted(hazard)
+        self.hazard = hazard
+
+    def init(self):
+        pass
+
+    def get_hazard(self):
+        return self.hazard
+
+
+class FakeRiskInput(object):
+    def __init__(self, hazard_getter, assets_by_site):
+        self.hazard_getter = hazard_getter
+        self.assets_by_site = assets_by_site
+
+    def epsilon_getter(self, aid, eids):
+        return numpy.linspace(-1, 1, len(eids)) * (aid + 1) / 10
+
+
+class CompositeRiskModelTestCase(unittest.TestCase):
+    def test_interpolate_block(self):
+        # the vulnerability functions of all the taxonomies are
+        # interpolated with a single call to the vulnerability table
+        job_ini = os.path.join(os.path.dirname(case_master.__file__),
+                               'job.ini')
+        oq = readinput.get_oqparam(job_ini)
+        crm = readinput.get_risk_model(oq)
+        self.assertEqual(crm.taxonomies, ['tax1', 'tax2', 'tax3'])
+        rng = numpy.random.RandomState(42)
+        M, E = len(oq.imtls), 20
+        gmf_dt = numpy.dtype([('eid', numpy.uint64),
+                              ('gmv', (numpy.float32, M))])
+        hazard = {}
+        for sid in range(3):
+            gmfs = numpy.zeros(E, gmf_dt)
+            gmfs['eid'] = rng.permutation(E)
+            gmfs['gmv'] = rng.random_sample((E, M)) * 2
+            hazard[sid] = {0: gmfs}
+        assets_by_site = [[FakeAsset(3 * sid + i, taxonomy)
+                           for i, taxonomy in enumerate(crm.taxonomies)]
+                          for sid in range(3)]
+        ri = FakeRiskInput(FakeHazardGetter(oq.imtls, hazard), assets_by_site)
+        interpolate = VulnerabilityTable.interpolate
+        with mock.patch.object(VulnerabilityTable, 'interpolate',
+                               autospec=True,
+                               side_effect=interpolate) as interp:
+            outs = list(crm.gen_outputs(ri))
+        self.assertEqual(interp.call_count, 1)
+        self.assertEqual(len(outs), 9)  # 3 sites x 3 taxonomies
+
+        # same results as interpolating one function at the time
+        imti = {imt: m for m, imt in enumerate(oq.imtls)}
+        for out in outs:
+            [asset] = out.assets
+            riskmodel = crm[asset.taxonomy]
+            haz = hazard[out.sid][out.rlzi]  # sorted by eid by gen_outputs
+            data = [(haz['gmv'][:, imti[riskmodel.risk_functions[lt].imt]],
+                     haz['eid']) for lt in riskmodel.loss_types]
+            expected = riskmodel.get_output(
+                out.assets, data, ri.epsilon_getter)
+            assert_equal(out.array, expected.array)
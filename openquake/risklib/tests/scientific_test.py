@@ -299,6 +299,44 @@ class VulnerabilityFunctionBlockSizeTestCase(unittest.TestCase):
         self.assertEqual(singleblock, multiblock)
 
 
+class VulnerabilityTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.vfs = [
+            scientific.VulnerabilityFunction(
+                'RM', 'PGA', [0.02, 0.3, 0.5, 0.9, 1.2],
+                [0.05, 0.1, 0.2, 0.4, 0.8], [0.1, 0.1, 0.2, 0.2, 0.3]),
+            scientific.VulnerabilityFunction(
+                'RC', 'PGA', [0.1, 0.6], [0.01, 0.5], [0.3, 0.3]),
+            scientific.VulnerabilityFunction(
+                'W', 'PGA', [0.005, 0.007, 0.0098, 0.0137, 0.0192, 0.0269],
+                [0.01, 0.1, 0.3, 0.5, 0.6, 1.0],
+                [0.3, 0.1, 0.3, 0.0, 0.3, 10])]
+        self.table = scientific.VulnerabilityTable(self.vfs)
+        # values below the minimum, above the maximum and on the IMLs
+        self.gmvs = numpy.array(
+            [0, 0.005, 0.006, 0.01, 0.02, 0.0269, 0.1, 0.25, 0.3, 0.45, 0.6,
+             0.9, 1.1, 1.2, 3.], numpy.float32)
+
+    def test_same_as_function(self):
+        for v, vf in enumerate(self.vfs):
+            means, covs, idxs = self.table.interpolate(v, self.gmvs)
+            expected = vf.interpolate(self.gmvs)
+            numpy.testing.assert_equal(means[idxs], expected[0])
+            numpy.testing.assert_equal(covs[idxs], expected[1])
+            numpy.testing.assert_equal(idxs, expected[2])
+            self.assertFalse(means[~idxs].any())
+
+    def test_block(self):
+        vidx = numpy.arange(len(self.vfs))[:, None]
+        means, covs, idxs = self.table.interpolate(vidx, self.gmvs)
+        self.assertEqual(means.shape, (3, len(self.gmvs)))
+        for v in range(len(self.vfs)):
+            m, c, i = self.table.interpolate(v, self.gmvs)
+            numpy.testing.assert_equal(means[v], m)
+            numpy.testing.assert_equal(covs[v], c)
+            numpy.testing.assert_equal(idxs[v], i)
+
+
 class MeanLossTestCase(unittest.TestCase):
     def test_mean_loss(self):
         vf = scientific.VulnerabilityFunction(